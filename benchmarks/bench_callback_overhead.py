@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark the per-subtask overhead of the API crew task callback.
+
+Runs `create_crew_task_callback` against a fake TaskOutput with a large raw LLM
+payload under each logging profile (each in its own process, since the profile
+is chosen when `api` is imported) and prints machine-readable JSON.
+
+Usage:
+    python benchmarks/bench_callback_overhead.py [--iterations N] [--payload-kb K] [--level LEVEL]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import uuid4
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SUBTASKS = ("medical_diagnosis_task", "validation_task", "reporting_task")
+
+
+def measure(iterations: int, payload_kb: int) -> dict:
+    """Time the callback in-process for the profile selected by LOG_PROFILE."""
+    sys.path.insert(0, str(PROJECT_ROOT / "src"))
+    for var in ("AZURE_API_KEY", "AZURE_API_BASE", "AZURE_API_VERSION"):
+        os.environ.setdefault(var, "benchmark")
+
+    import logging
+    import api
+    import logging_config
+
+    # Keep the formatting/handler cost but discard the bytes
+    devnull = open(os.devnull, "w")
+    if logging_config._listener is not None:
+        for handler in logging_config._listener.handlers:
+            handler.setStream(devnull)
+    else:
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(devnull)
+
+    payload = "x" * (payload_kb * 1024)
+    timings = []
+    for i in range(iterations):
+        if i % len(SUBTASKS) == 0:
+            task_id = str(uuid4())
+            api.update_task_status(task_id, {"status": "running"})
+            callback = api.create_crew_task_callback(task_id)
+        result = SimpleNamespace(name=SUBTASKS[i % len(SUBTASKS)], raw=payload, json_dict=None)
+        start = time.perf_counter()
+        callback(result)
+        timings.append(time.perf_counter() - start)
+
+    logging_config.shutdown_logging()
+    timings.sort()
+    return {
+        "profile": logging_config.get_profile(),
+        "iterations": iterations,
+        "payload_kb": payload_kb,
+        "mean_us": sum(timings) / len(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark crew task callback overhead")
+    parser.add_argument("--iterations", type=int, default=3000)
+    parser.add_argument("--payload-kb", type=int, default=64, help="Size of the fake raw LLM output")
+    parser.add_argument("--level", default="INFO", help="LOG_LEVEL used for both profiles")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.iterations, args.payload_kb)))
+        return 0
+
+    results = []
+    for profile in ("development", "production"):
+        env = dict(os.environ, LOG_PROFILE=profile, LOG_LEVEL=args.level)
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker",
+             "--iterations", str(args.iterations), "--payload-kb", str(args.payload_kb)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({"benchmark": "callback_overhead", "level": args.level, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
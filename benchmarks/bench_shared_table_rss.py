@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Benchmark per-worker memory of the ICD-10 table: pandas copy vs shared snapshot.
+
+Starts N spawned worker processes that each load the WHO table either the old
+way (`pandas.read_csv` + `ICD10Hierarchy.from_dataframe`) or attached from the
+shared mmap snapshot (`SharedICD10Table.attach` + `from_shared_table`), runs a
+few lookups, and measures RSS, PSS and USS of every worker while all of them are
+alive (Linux /proc/<pid>/smaps_rollup). PSS splits shared pages between the
+processes mapping them, so it is the number that shows the saving. Prints
+machine-readable JSON.
+
+Usage:
+    python benchmarks/bench_shared_table_rss.py [--workers 1 4 16] [--modes baseline pandas shared]
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TOOLS_DIR = PROJECT_ROOT / "src" / "tools"
+ICD10_PATH = PROJECT_ROOT / "src" / "icd10_2019.csv"
+MODES = ("baseline", "pandas", "shared")
+PROBE_CODES = ("E11", "J45.9", "I10", "A17.0", "Z99.99")
+
+
+def _load_table_modules():
+    """Import the hierarchy/snapshot modules without running tools/__init__ (which builds the crew tools)."""
+    package = types.ModuleType("icd10_tools")
+    package.__path__ = [str(TOOLS_DIR)]
+    sys.modules["icd10_tools"] = package
+    modules = {}
+    for name in ("icd10_hierarchy", "icd10_shared_table"):
+        spec = importlib.util.spec_from_file_location(f"icd10_tools.{name}", TOOLS_DIR / f"{name}.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+        modules[name] = module
+    return modules["icd10_hierarchy"], modules["icd10_shared_table"]
+
+
+def worker(mode: str, ready, release) -> None:
+    """Load the table in the given mode, touch it, then stay alive until measured."""
+    hierarchy_module, shared_module = _load_table_modules()
+    if mode == "pandas":
+        import pandas as pd
+        database = pd.read_csv(ICD10_PATH)
+        hierarchy = hierarchy_module.ICD10Hierarchy.from_dataframe(database)
+        for code in PROBE_CODES:
+            row = hierarchy.row_of(code)
+            if row is not None:
+                database.iloc[row]["definition"]
+    elif mode == "shared":
+        table = shared_module.SharedICD10Table.attach(str(ICD10_PATH))
+        hierarchy = hierarchy_module.ICD10Hierarchy.from_shared_table(table)
+        for code in PROBE_CODES:
+            row = hierarchy.row_of(code)
+            if row is not None:
+                table.row(row)
+    ready.release()
+    release.wait()
+
+
+def memory_kb(pid: int) -> Optional[Dict[str, int]]:
+    """RSS, PSS and USS (private clean + dirty) of a process, in kB."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    values[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def run(mode: str, workers: int) -> dict:
+    """Start `workers` processes in one mode and measure them together."""
+    context = mp.get_context("spawn")
+    ready = context.Semaphore(0)
+    release = context.Event()
+    processes = [context.Process(target=worker, args=(mode, ready, release)) for _ in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    startup = time.perf_counter() - start
+
+    samples: List[Dict[str, int]] = [m for m in (memory_kb(p.pid) for p in processes) if m]
+    release.set()
+    for process in processes:
+        process.join()
+
+    def total(key: str) -> float:
+        return round(sum(sample[key] for sample in samples) / 1024, 1)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "startup_s": round(startup, 3),
+        "total_rss_mb": total("rss"),
+        "total_pss_mb": total("pss"),
+        "total_uss_mb": total("uss"),
+        "pss_per_worker_mb": round(total("pss") / max(len(samples), 1), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        sys.exit("This benchmark needs Linux /proc/<pid>/smaps_rollup")
+
+    # Build the snapshot once up front so "shared" measures attaching, not building
+    _, shared_module = _load_table_modules()
+    snapshot = shared_module.ensure_snapshot(str(ICD10_PATH))
+
+    results = [run(mode, workers) for workers in args.workers for mode in args.modes]
+    print(json.dumps({
+        "snapshot": snapshot,
+        "snapshot_mb": round(os.path.getsize(snapshot) / 2**20, 2),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Benchmark /status requests per second and the memory held by task state.
+
+Fills the API's task store with finished tasks (three subtask partials with
+a raw LLM payload each, plus a final report) and polls /status through the
+ASGI app in-process, so no network stack is measured. Three variants:
+
+    model       tasks kept as pydantic TaskStatus and returned through FastAPI's
+                response validation and serialization (the former /status)
+    rendered    compact records, body rendered on every poll (cache disabled)
+    cached      compact records, pre-rendered body reused until the task changes
+
+Memory is reported for the task state after filling and, since the cached
+variant keeps uncompressed bodies, for the response cache after polling.
+
+Usage:
+    python benchmarks/bench_status_rps.py [--tasks N] [--requests N] [--concurrency N] [--payload-kb K]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SUBTASKS = ("medical_diagnosis_task", "validation_task", "reporting_task")
+
+
+def fake_output(payload_kb: int, seed: int) -> str:
+    """JSON-looking LLM output of about `payload_kb` KB (repetitive like real reports, so it compresses)."""
+    rng = random.Random(seed)
+    entry_bytes = 210  # one indented entry below
+    entries = [{
+        "code": f"{rng.choice('JMRZ')}{rng.randint(10, 99)}.{rng.randint(0, 9)}",
+        "description": "Low back pain with radiculopathy, unspecified site",
+        "rationale": "The diagnosis text describes localized lumbar pain without trauma history.",
+    } for _ in range(max(1, payload_kb * 1024 // entry_bytes))]
+    return json.dumps({"icd10_suggestions": entries}, indent=2)
+
+
+def fill(api, variant: str, tasks: int, payload_kb: int) -> tuple:
+    """Populate the store; returns (task ids, bytes allocated for task state)."""
+    from api import PartialResult, TaskStatus
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ids = []
+    for i in range(tasks):
+        task_id = str(uuid4())
+        outputs = [fake_output(payload_kb, i * 3 + n) for n in range(len(SUBTASKS))]
+        timestamp = datetime.utcnow().isoformat()
+        if variant == "model":
+            api.tasks[task_id] = TaskStatus(
+                status="completed", result=outputs[-1], error=None, progress_summary="3/3 subtasks completed",
+                partials=[PartialResult(subtask_name=name, output=output, details=None, timestamp=timestamp)
+                          for name, output in zip(SUBTASKS, outputs)],
+            )
+        else:
+            for name, output in zip(SUBTASKS, outputs):
+                api.update_task_status(task_id, {})
+                api.add_partial(task_id, api.PartialRecord(name, output, None, timestamp))
+            api.update_task_status(task_id, {"status": "completed", "result": outputs[-1]})
+        del outputs
+        ids.append(task_id)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return ids, allocated
+
+
+def measure(variant: str, tasks: int, requests: int, concurrency: int, payload_kb: int) -> dict:
+    sys.path.insert(0, str(PROJECT_ROOT / "src"))
+    for var in ("AZURE_API_KEY", "AZURE_API_BASE", "AZURE_API_VERSION"):
+        os.environ.setdefault(var, "benchmark")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SEMANTIC_CACHE", "false")
+
+    import httpx
+    import api
+    from api import TaskStatus
+
+    if variant == "model":
+        # The former endpoint: the stored model goes through FastAPI's response handling
+        api.app.router.routes = [r for r in api.app.router.routes if getattr(r, "path", None) != "/status/{task_id}"]
+
+        async def former_status(task_id: str) -> TaskStatus:
+            return api.tasks[task_id]
+        api.app.add_api_route("/status/{task_id}", former_status, methods=["GET"], response_model=TaskStatus)
+    elif variant == "rendered":
+        api.status_responses.max_bytes = 0
+
+    ids, allocated = fill(api, variant, tasks, payload_kb)
+    order = [ids[i % len(ids)] for i in range(requests)]
+    random.Random(0).shuffle(order)
+
+    async def run() -> list:
+        latencies = []
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            queue = iter(order)
+
+            async def worker():
+                for task_id in queue:
+                    start = time.perf_counter()
+                    response = await client.get(f"/status/{task_id}")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.text
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "variant": variant,
+        "tasks": tasks,
+        "requests": requests,
+        "payload_kb": payload_kb,
+        "requests_per_s": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+        "task_state_mb": allocated / 2 ** 20,
+        "response_cache_mb": api.status_responses.size / 2 ** 20,
+        "after_polling_mb": (allocated + api.status_responses.size) / 2 ** 20,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark /status requests per second")
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--payload-kb", type=int, default=4, help="Size of each subtask's raw output")
+    parser.add_argument("--variant", choices=("model", "rendered", "cached"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = ["--tasks", str(args.tasks), "--requests", str(args.requests),
+             "--concurrency", str(args.concurrency), "--payload-kb", str(args.payload_kb)]
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.tasks, args.requests, args.concurrency, args.payload_kb)))
+        return 0
+
+    # Each variant in its own process, so the stores and caches don't share a heap
+    results = []
+    for variant in ("model", "rendered", "cached"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--variant", variant, *sizes],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({"benchmark": "status_rps", "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Golden-corpus accuracy + latency evaluation.
+
+Runs a labeled JSONL corpus through the crew in parallel worker processes and
+prints one table with, per item and in total:
+
+- precision / recall of the reported ICD-10 codes against the expected codes,
+- validation agreement: how often the report's valid/invalid status for a code
+  agrees with ICD10DatabaseTool,
+- latency and LLM tokens.
+
+Corpus lines look like:
+    {"id": "lbp-1", "diagnosis_text": "Lower Back Pain", "expected_codes": ["M54.5"]}
+
+LLM modes:
+    --mode live     Use the configured Azure deployment (or AZURE_API_BASE of a stub).
+    --mode mock     Start the local mock LLM server (mock_llm_server.py) for the run.
+    --mode replay   Serve each item from <recordings-dir>/<id>.jsonl.gz (see src/recording.py).
+
+Live and mock runs can save recordings with --record-dir for later replay.
+Finished items are cached in --cache (JSONL) keyed by diagnosis text, mode,
+--tag, ICD-10 reference data version and a fingerprint of the crew's code,
+prompts and model routes (plus the item's recording in replay mode). Reruns
+only evaluate new items; any edit to src/, committed or not, or switching the
+table version invalidates them. Use --tag for changes outside those files
+(e.g. a different Azure deployment) and --refresh to ignore the cache.
+
+Usage:
+    python benchmarks/evaluate.py benchmarks/golden_corpus.jsonl --mode mock --workers 4
+    python benchmarks/evaluate.py corpus.jsonl --mode replay --recordings-dir recordings/ --json report.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = PROJECT_ROOT / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from load_test import git_commit, percentiles  # noqa: E402
+
+
+# ------------------------------------------------------------------------------
+# Corpus, cache and report parsing
+# ------------------------------------------------------------------------------
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", f"item-{line_number}")
+            item["expected_codes"] = [normalize_code(c) for c in item.get("expected_codes", [])]
+            items.append(item)
+    return items
+
+
+def normalize_code(code: Any) -> str:
+    return str(code).strip().upper()
+
+
+def code_fingerprint() -> str:
+    """Hash of the crew's code, prompts and model routes (working tree, so uncommitted edits count)."""
+    paths = sorted(path for pattern in ("**/*.py", "config/*.yaml") for path in SRC_DIR.glob(pattern)
+                   if "__pycache__" not in path.parts)
+    if os.getenv("MODEL_ROUTES_FILE"):
+        paths.append(Path(os.environ["MODEL_ROUTES_FILE"]))
+    digest = hashlib.sha256(os.getenv("MODEL_ROUTING", "true").encode())
+    for path in paths:
+        digest.update(path.as_posix().encode())
+        digest.update(path.read_bytes() if path.exists() else b"")
+    return digest.hexdigest()[:16]
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16] if path.exists() else ""
+
+
+def cache_key(item: Dict[str, Any], mode: str, tag: str, data_version: str, fingerprint: str) -> str:
+    raw = json.dumps([item["diagnosis_text"], mode, tag, data_version, fingerprint], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+
+def load_cache(path: Path) -> Dict[str, Dict[str, Any]]:
+    cache = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cache[entry["key"]] = entry
+    return cache
+
+
+def extract_report(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse the reporting agent's JSON, tolerating code fences and stray text."""
+    if not raw:
+        return None
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+def reported_codes(report: Optional[Dict[str, Any]]) -> List[Tuple[str, Optional[str]]]:
+    """(code, status) pairs from final_report.diagnoses_report[].codes[]."""
+    if not report:
+        return []
+    body = report.get("final_report", report)
+    pairs = []
+    for diagnosis in body.get("diagnoses_report", []) or []:
+        for entry in diagnosis.get("codes", []) or []:
+            if entry.get("code"):
+                pairs.append((normalize_code(entry["code"]), entry.get("status")))
+    return pairs
+
+
+# ------------------------------------------------------------------------------
+# Worker (runs in a separate process: recorder patches are process-global)
+# ------------------------------------------------------------------------------
+def evaluate_item(item: Dict[str, Any], mode: str, recordings_dir: Optional[str],
+                  record_dir: Optional[str]) -> Dict[str, Any]:
+    from recording import CrewRecorder, Recording, replay_run, run_crew
+
+    inputs = {"diagnosis_text": item["diagnosis_text"]}
+    start = time.perf_counter()
+    try:
+        if mode == "replay":
+            recording = Recording.load(str(Path(recordings_dir) / f"{item['id']}.jsonl.gz"))
+            output = replay_run(recording)["output"]
+        else:
+            recording = Recording(inputs=inputs)
+            with CrewRecorder(recording, mode="record"):
+                output = run_crew(inputs)
+            recording.final_output = output
+            if record_dir:
+                recording.save(str(Path(record_dir) / f"{item['id']}.jsonl.gz"))
+        error = None
+    except Exception as e:
+        output, recording, error = None, None, str(e)
+
+    tokens = 0
+    if recording is not None:
+        for entry in recording.entries:
+            if entry["kind"] == "llm":
+                tokens += ((entry["response"] or {}).get("usage") or {}).get("total_tokens") or 0
+    return {
+        "output": output,
+        "error": error,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+        "tokens": tokens,
+    }
+
+
+# ------------------------------------------------------------------------------
+# Scoring
+# ------------------------------------------------------------------------------
+def score_item(item: Dict[str, Any], run: Dict[str, Any], validate) -> Dict[str, Any]:
+    pairs = reported_codes(extract_report(run.get("output")))
+    predicted: Set[str] = {code for code, _ in pairs}
+    expected: Set[str] = set(item["expected_codes"])
+    true_positives = len(predicted & expected)
+
+    agreements = 0
+    for code, status in pairs:
+        database_valid = bool(validate(code).get("valid"))
+        agreements += int((str(status).lower() == "valid") == database_valid)
+
+    return {
+        "id": item["id"],
+        "predicted": sorted(predicted),
+        "expected": sorted(expected),
+        "true_positives": true_positives,
+        "precision": true_positives / len(predicted) if predicted else 0.0,
+        "recall": true_positives / len(expected) if expected else 0.0,
+        "validation_agreement": agreements / len(pairs) if pairs else None,
+        "latency_ms": run["latency_ms"],
+        "tokens": run["tokens"],
+        "error": run.get("error"),
+        "cached": run.get("cached", False),
+    }
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    predicted = sum(len(r["predicted"]) for r in rows)
+    expected = sum(len(r["expected"]) for r in rows)
+    true_positives = sum(r["true_positives"] for r in rows)
+    agreement = [r["validation_agreement"] for r in rows if r["validation_agreement"] is not None]
+    fresh = [r["latency_ms"] for r in rows if not r["cached"]]
+    return {
+        "items": len(rows),
+        "errors": sum(1 for r in rows if r["error"]),
+        "cached": sum(1 for r in rows if r["cached"]),
+        "micro_precision": true_positives / predicted if predicted else 0.0,
+        "micro_recall": true_positives / expected if expected else 0.0,
+        "validation_agreement": sum(agreement) / len(agreement) if agreement else None,
+        "latency_ms": percentiles([r["latency_ms"] for r in rows]),
+        "fresh_latency_ms": percentiles(fresh),
+        "tokens_total": sum(r["tokens"] for r in rows),
+    }
+
+
+def print_table(rows: List[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+    def fmt(value: Optional[float], pattern: str = "{:.2f}") -> str:
+        return "-" if value is None else pattern.format(value)
+
+    header = f"{'id':<24} {'prec':>6} {'recall':>6} {'agree':>6} {'ms':>9} {'tokens':>7}  note"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        note = "cached" if r["cached"] else ""
+        if r["error"]:
+            note = f"error: {r['error'][:40]}"
+        print(f"{r['id'][:24]:<24} {fmt(r['precision']):>6} {fmt(r['recall']):>6} "
+              f"{fmt(r['validation_agreement']):>6} {fmt(r['latency_ms'], '{:.0f}'):>9} {r['tokens']:>7}  {note}")
+    print("-" * len(header))
+    print(f"{'TOTAL (micro)':<24} {fmt(summary['micro_precision']):>6} {fmt(summary['micro_recall']):>6} "
+          f"{fmt(summary['validation_agreement']):>6} {fmt(summary['latency_ms']['p50'], '{:.0f}'):>9} "
+          f"{summary['tokens_total']:>7}  p50 ms; {summary['cached']}/{summary['items']} cached")
+
+
+# ------------------------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate coding accuracy and latency on a golden corpus")
+    parser.add_argument("corpus", help="JSONL corpus of diagnosis_text -> expected_codes")
+    parser.add_argument("--mode", choices=["live", "mock", "replay"], default="mock")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel worker processes")
+    parser.add_argument("--recordings-dir", help="Recordings to serve in replay mode")
+    parser.add_argument("--record-dir", help="Save live/mock runs as recordings here")
+    parser.add_argument("--mock-latency-ms", type=float, default=50.0, help="Mock LLM latency")
+    parser.add_argument("--cache", default=".eval_cache.jsonl", help="Cache of finished items")
+    parser.add_argument("--tag", default="", help="Cache namespace (e.g. a prompt or model variant)")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached items")
+    parser.add_argument("--json", dest="json_path", help="Also write the full report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.mode == "replay" and not args.recordings_dir:
+        raise SystemExit("--recordings-dir is required in replay mode")
+    if args.record_dir:
+        Path(args.record_dir).mkdir(parents=True, exist_ok=True)
+
+    # Offline modes must never reach Azure or crewai telemetry
+    if args.mode != "live":
+        os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+        for var in ("AZURE_API_KEY", "AZURE_API_VERSION"):
+            os.environ.setdefault(var, "offline")
+        os.environ.setdefault("AZURE_API_BASE", "http://127.0.0.1:9")
+
+    llm = None
+    if args.mode == "mock":
+        from mock_llm_server import MockLLMConfig, start_server
+        llm = start_server(config=MockLLMConfig(latency_ms=args.mock_latency_ms))
+        os.environ["AZURE_API_BASE"] = f"http://127.0.0.1:{llm.server_address[1]}"
+
+    import tools
+    data_version = tools.reference_data.active_version
+
+    items = load_corpus(args.corpus)
+    cache_path = Path(args.cache)
+    cache = {} if args.refresh else load_cache(cache_path)
+    fingerprint = code_fingerprint()
+    keys = {}
+    for item in items:
+        item_fingerprint = fingerprint
+        if args.mode == "replay":
+            item_fingerprint += file_digest(Path(args.recordings_dir) / f"{item['id']}.jsonl.gz")
+        keys[item["id"]] = cache_key(item, args.mode, args.tag, data_version, item_fingerprint)
+    pending = [item for item in items if keys[item["id"]] not in cache]
+
+    runs: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        if keys[item["id"]] in cache:
+            runs[item["id"]] = dict(cache[keys[item["id"]]], cached=True)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor, open(cache_path, "a") as cache_file:
+            futures = {
+                executor.submit(evaluate_item, item, args.mode, args.recordings_dir, args.record_dir): item
+                for item in pending
+            }
+            for future, item in futures.items():
+                run = future.result()
+                runs[item["id"]] = run
+                if not run["error"]:
+                    cache_file.write(json.dumps({"key": keys[item["id"]], **run}) + "\n")
+                    cache_file.flush()
+
+    if llm:
+        llm.shutdown()
+
+    validate = lambda code: tools.icd10_database_tool._run(code=code)  # noqa: E731
+    rows = [score_item(item, runs[item["id"]], validate) for item in items]
+    summary = summarize(rows)
+    print_table(rows, summary)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({
+            "benchmark": "evaluate",
+            "commit": git_commit(),
+            "code_fingerprint": fingerprint,
+            "mode": args.mode,
+            "tag": args.tag,
+            "data_version": data_version,
+            "summary": summary,
+            "items": rows,
+        }, indent=2))
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+Load test for the crew pipeline against a local mock LLM.
+
+Targets:
+    api   Drives POST /run + GET /status on a uvicorn server (started automatically
+          unless --api-url is given) at the requested concurrency.
+    crew  Runs AstackcrewCrew().crew().kickoff() in-process, the same call main.run makes.
+
+--mode pipeline runs the speculative validation pipeline (src/pipeline.py) instead
+of the three-agent crew, for comparing time to first validated code.
+
+The report includes the model routing metrics (src/routing.py): escalation
+rate, latency and estimated cost per request. --cheap-invalid-rate makes the
+mock's cheap model suggest an invalid code in that fraction of replies.
+
+A local OpenAI/Azure-compatible stub (mock_llm_server.py) is started with the
+configured latency and error rate, and telemetry is stubbed out
+(TELEMETRY_SAMPLE_RATE=0, TELEMETRY_SINK=memory), so no external service is touched.
+
+Results are printed (and optionally written) as JSON: throughput, p50/p95/p99
+latency, time to first validated code, peak RSS and per-stage timings, tagged with the current git commit so
+runs can be compared between commits.
+
+Usage:
+    python benchmarks/load_test.py --target api --requests 50 --concurrency 10 --latency-ms 100
+    python benchmarks/load_test.py --target crew --requests 10 --concurrency 2 --output crew.json
+    python benchmarks/load_test.py --target api --mode pipeline --requests 50 --concurrency 10
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from mock_llm_server import MockLLMConfig, start_server
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = PROJECT_ROOT / "src"
+DEFAULT_DIAGNOSES = [
+    "Lower Back Pain, Osteoarthritis, Fibromyalgia",
+    "Fever, Cough, Fatigue",
+    "Seizures, Depression, Migraine",
+    "Urinary Tract Infection (UTI)",
+]
+
+
+# ------------------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------------------
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Current RSS of a process (Linux /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Samples the peak RSS of a process in the background."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, rss_mb(self.pid) or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def stub_env(llm_url: str) -> Dict[str, str]:
+    """Environment that points the crew at the mock LLM and disables live telemetry."""
+    return {
+        "AZURE_API_BASE": llm_url,
+        "AZURE_API_KEY": "mock",
+        "AZURE_API_VERSION": "2024-02-01",
+        "TELEMETRY_SAMPLE_RATE": "0",
+        "TELEMETRY_SINK": "memory",
+        "LOG_PROFILE": "production",
+        "LOG_LEVEL": "WARNING",
+        "SEMANTIC_CACHE": "false",  # repeated diagnoses would otherwise be served without a crew
+        "CHECKPOINTS": "false",  # a failed run's retry would otherwise skip its finished subtasks
+    }
+
+
+def stage_timings(submitted_at: datetime, partials: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Per-subtask durations derived from partial timestamps (first partial of each name)."""
+    timings = {}
+    previous = submitted_at
+    for partial in partials:
+        if partial["subtask_name"] in timings:
+            continue
+        finished = datetime.fromisoformat(partial["timestamp"])
+        timings[partial["subtask_name"]] = (finished - previous).total_seconds()
+        previous = finished
+    return timings
+
+
+# Partials that carry validated codes: per code in pipeline mode, all at once in crew mode
+VALIDATED_STAGES = ("validated_code", "validation_task")
+
+
+def first_validated(submitted_at: datetime, partials: List[Dict[str, Any]]) -> Optional[float]:
+    """Seconds from submission to the first partial with a validated code."""
+    for partial in partials:
+        if partial["subtask_name"] in VALIDATED_STAGES:
+            return (datetime.fromisoformat(partial["timestamp"]) - submitted_at).total_seconds()
+    return None
+
+
+# ------------------------------------------------------------------------------
+# API target
+# ------------------------------------------------------------------------------
+def _http_json(method: str, url: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def wait_for_api(api_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{api_url}/docs", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API at {api_url} did not start within {timeout}s")
+
+
+def run_api_request(api_url: str, diagnosis: str, poll_interval: float, timeout: float,
+                    mode: str = "crew") -> Dict[str, Any]:
+    submitted_at = datetime.utcnow()
+    start = time.perf_counter()
+    task_id = _http_json("POST", f"{api_url}/run", {"diagnosis_text": diagnosis, "mode": mode})["task_id"]
+    submit_latency = time.perf_counter() - start
+
+    polls = 0
+    status: Dict[str, Any] = {"status": "running", "partials": []}
+    while status["status"] == "running" and time.perf_counter() - start < timeout:
+        time.sleep(poll_interval)
+        status = _http_json("GET", f"{api_url}/status/{task_id}")
+        polls += 1
+
+    return {
+        "ok": status["status"] == "completed",
+        "latency": time.perf_counter() - start,
+        "submit_latency": submit_latency,
+        "polls": polls,
+        "first_validated": first_validated(submitted_at, status.get("partials", [])),
+        "stages": stage_timings(submitted_at, status.get("partials", [])),
+    }
+
+
+def run_api_target(args, llm_url: str) -> Dict[str, Any]:
+    server = None
+    api_url = args.api_url
+    if not api_url:
+        port = free_port()
+        api_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=SRC_DIR, env=dict(os.environ, **stub_env(llm_url)),
+        )
+    try:
+        wait_for_api(api_url)
+        sampler = RssSampler(server.pid) if server else None
+        if sampler:
+            sampler.__enter__()
+        try:
+            results, duration = drive(
+                lambda diagnosis: run_api_request(api_url, diagnosis, args.poll_interval, args.timeout, args.mode),
+                args,
+            )
+        finally:
+            if sampler:
+                sampler.__exit__(None, None, None)
+        report = summarize(results, duration)
+        report["memory"] = {"server_peak_rss_mb": sampler.peak_mb if sampler else None}
+        report["status_polls"] = sum(r.get("polls", 0) for r in results)
+        report["submit_latency_s"] = percentiles([r["submit_latency"] for r in results if "submit_latency" in r])
+        report["routing"] = _http_json("GET", f"{api_url}/metrics/routing")
+        return report
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+# ------------------------------------------------------------------------------
+# In-process crew target (same call as main.run)
+# ------------------------------------------------------------------------------
+def run_crew_target(args, llm_url: str) -> Dict[str, Any]:
+    os.environ.update(stub_env(llm_url))
+    sys.path.insert(0, str(SRC_DIR))
+    import routing
+    from crew import AstackcrewCrew
+
+    def run_one(diagnosis: str) -> Dict[str, Any]:
+        submitted_at = datetime.utcnow()
+        partials = []
+        start = time.perf_counter()
+        crew_obj = AstackcrewCrew().pipeline() if args.mode == "pipeline" else AstackcrewCrew().crew()
+        crew_obj.task_callback = lambda output: partials.append({
+            "subtask_name": getattr(output, "name", "unknown_task"),
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+        route_state = routing.RunRouting()
+        with routing.bind(route_state):
+            crew_obj.kickoff(inputs={"diagnosis_text": diagnosis})
+        routing.metrics.record(route_state)
+        return {
+            "ok": True,
+            "latency": time.perf_counter() - start,
+            "first_validated": first_validated(submitted_at, partials),
+            "stages": stage_timings(submitted_at, partials),
+        }
+
+    results, duration = drive(run_one, args)
+    report = summarize(results, duration)
+    # ru_maxrss is reported in KiB on Linux
+    report["memory"] = {"process_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    report["routing"] = routing.metrics.snapshot()
+    return report
+
+
+# ------------------------------------------------------------------------------
+# Driver and summary
+# ------------------------------------------------------------------------------
+def drive(run_one, args):
+    diagnoses = args.diagnosis or DEFAULT_DIAGNOSES
+
+    def guarded(i: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            return run_one(diagnoses[i % len(diagnoses)])
+        except Exception as e:
+            return {"ok": False, "latency": time.perf_counter() - start, "error": str(e), "stages": {}}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(guarded, range(args.requests)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    completed = [r for r in results if r["ok"]]
+    stages: Dict[str, List[float]] = {}
+    for r in completed:
+        for name, seconds in r["stages"].items():
+            stages.setdefault(name, []).append(seconds)
+    errors = sorted({r["error"] for r in results if r.get("error")})
+    return {
+        "requests": len(results),
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "duration_s": duration,
+        "throughput_rps": len(completed) / duration if duration else 0.0,
+        "latency_s": percentiles([r["latency"] for r in completed]),
+        "first_validated_code_s": percentiles([r["first_validated"] for r in completed
+                                               if r.get("first_validated") is not None]),
+        "stage_latency_s": {name: percentiles(values) for name, values in stages.items()},
+        "errors": errors[:10],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the crew pipeline against a mock LLM")
+    parser.add_argument("--target", choices=["api", "crew"], default="api")
+    parser.add_argument("--mode", choices=["crew", "pipeline"], default="crew",
+                        help="Three-agent crew or the speculative validation pipeline")
+    parser.add_argument("--requests", type=int, default=20, help="Total runs to submit")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrent clients")
+    parser.add_argument("--diagnosis", action="append", help="Diagnosis text (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Mock LLM mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Mock LLM latency standard deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock LLM error rate")
+    parser.add_argument("--cheap-invalid-rate", type=float, default=0.0,
+                        help="Fraction of cheap-model suggestions with an invalid code (forces escalation)")
+    parser.add_argument("--api-url", help="Use an already running API instead of starting uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the API")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Seconds between /status polls")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-run timeout in seconds")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    llm = start_server(config=MockLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                                            cheap_invalid_rate=args.cheap_invalid_rate))
+    llm_url = f"http://127.0.0.1:{llm.server_address[1]}"
+
+    if args.target == "api":
+        report = run_api_target(args, llm_url)
+    else:
+        report = run_crew_target(args, llm_url)
+
+    report = {
+        "benchmark": "load_test",
+        "target": args.target,
+        "mode": args.mode,
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "cheap_invalid_rate": args.cheap_invalid_rate,
+            "workers": args.workers,
+        },
+        "llm_stub": {"requests": llm.config.requests, "errors": llm.config.errors},
+        **report,
+    }
+    llm.shutdown()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Local OpenAI/Azure-compatible chat completions stub for benchmarks.
+
+Serves both
+    POST /openai/deployments/<deployment>/chat/completions   (Azure, used by litellm "azure/...")
+    POST /v1/chat/completions and /chat/completions          (OpenAI)
+
+with configurable latency and error rate. Requests with "stream": true are
+answered as server-sent events, the latency spread evenly over the chunks as
+if the reply were being generated. Responses are shaped so the crew
+runs end to end:
+
+- requests with response_format=json_object (Gpt4SuggestionTool) get an ICD-10
+  suggestion JSON document; for "mini" deployments (the cheap model of a
+  routes.yaml route) it contains an invalid code at --cheap-invalid-rate, to
+  exercise escalation;
+- agent requests whose prompt lists a tool get a ReAct "Action" for that tool,
+  then a "Final Answer" once an Observation is present in the conversation.
+
+Usage:
+    python benchmarks/mock_llm_server.py [--port 8100] [--latency-ms 200] [--jitter-ms 50] [--error-rate 0.0]
+
+Point the crew at it with:
+    AZURE_API_BASE=http://127.0.0.1:8100 AZURE_API_KEY=mock AZURE_API_VERSION=2024-02-01
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+MOCK_SUGGESTIONS = {
+    "icd10_suggestions": [
+        {"code": "M54.5", "description": "Low back pain"},
+        {"code": "M19.9", "description": "Arthrosis, unspecified"},
+        {"code": "M79.7", "description": "Fibromyalgia"},
+    ],
+    "explanation": "Mock suggestions served by the benchmark LLM stub.",
+    "who_database_url": "https://icd.who.int/browse10/2019/en",
+}
+
+MOCK_REPORT = {
+    "final_report": {
+        "diagnoses_report": [
+            {
+                "diagnosis": "Lower Back Pain",
+                "codes": [
+                    {
+                        "code": "M54.5",
+                        "status": "valid",
+                        "explanation": "Code M54.5 is valid for Low back pain.",
+                        "rationale": "Mock rationale.",
+                        "url": "https://icd.who.int/browse10/2019/en#/M50-M54",
+                    }
+                ],
+            }
+        ],
+        "validation_report": [],
+    }
+}
+
+TOOL_NAME = re.compile(r"Tool Name: (\w+)")
+DIAGNOSIS = re.compile(r"<diagnosis_text>(.*?)</diagnosis_text>", re.S)
+
+
+class MockLLMConfig:
+    """Runtime knobs shared by all handler threads."""
+
+    def __init__(self, latency_ms: float = 200.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 completion_tokens: int = 200, cheap_invalid_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.cheap_invalid_rate = cheap_invalid_rate
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+MOCK_INVALID_SUGGESTION = {"code": "M54.99", "description": "Lumbar strain"}  # ICD-10-CM only; description mismatch
+
+
+def build_reply(body: Dict[str, Any], invalid: bool = False) -> str:
+    """Pick a deterministic reply for a chat completions request (`invalid` adds a bad code)."""
+    messages = body.get("messages", [])
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        if invalid:
+            suggestions = MOCK_SUGGESTIONS["icd10_suggestions"] + [MOCK_INVALID_SUGGESTION]
+            return json.dumps(dict(MOCK_SUGGESTIONS, icd10_suggestions=suggestions))
+        return json.dumps(MOCK_SUGGESTIONS)
+
+    text = _message_text(messages)
+    last = messages[-1].get("content", "") if messages else ""
+    tool = TOOL_NAME.search(text)
+    if tool and "Observation:" not in str(last):
+        diagnosis = DIAGNOSIS.search(text)
+        if tool.group(1) == "icd10_database_tool":
+            action_input = {"code": "M54.5", "description": "Low back pain"}
+        else:
+            action_input = {"argument": diagnosis.group(1).strip() if diagnosis else "Lower Back Pain"}
+        return (
+            "Thought: I should use the available tool.\n"
+            f"Action: {tool.group(1)}\n"
+            f"Action Input: {json.dumps(action_input)}"
+        )
+
+    return "Thought: I now know the final answer\nFinal Answer: " + json.dumps(MOCK_REPORT)
+
+
+def completion_payload(body: Dict[str, Any], content: str, completion_tokens: int) -> Dict[str, Any]:
+    prompt_tokens = max(1, len(_message_text(body.get("messages", []))) // 4)
+    return {
+        "id": f"chatcmpl-{uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def stream_chunks(body: Dict[str, Any], content: str, size: int = 8):
+    """Split a reply into chat.completion.chunk payloads of `size` characters."""
+    completion_id = f"chatcmpl-{uuid4().hex}"
+    pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+    for i, piece in enumerate(pieces):
+        delta = {"content": piece}
+        if i == 0:
+            delta["role"] = "assistant"
+        yield {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": "stop" if i == len(pieces) - 1 else None,
+            }],
+        }
+
+
+def make_handler(config: MockLLMConfig):
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # keep benchmark output clean
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, body: Dict[str, Any], content: str, delay_ms: float) -> None:
+            chunks = list(stream_chunks(body, content))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for chunk in chunks:
+                time.sleep(delay_ms / len(chunks) / 1000.0)
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with config.lock:
+                    self._send(200, {"requests": config.requests, "errors": config.errors})
+            else:
+                self._send(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if not path.endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "Not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms) if config.jitter_ms
+                        else config.latency_ms)
+            if not body.get("stream"):
+                time.sleep(delay / 1000.0)
+
+            with config.lock:
+                config.requests += 1
+                failed = random.random() < config.error_rate
+                if failed:
+                    config.errors += 1
+            if failed:
+                self._send(random.choice([429, 500]), {"error": {"message": "Injected mock error", "type": "mock"}})
+                return
+
+            # Azure puts the deployment in the path, OpenAI in the body
+            cheap = "mini" in path or "mini" in str(body.get("model", ""))
+            reply = build_reply(body, invalid=cheap and random.random() < config.cheap_invalid_rate)
+            if body.get("stream"):
+                self._stream(body, reply, delay)
+            else:
+                self._send(200, completion_payload(body, reply, config.completion_tokens))
+
+    return MockLLMHandler
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0,
+                 config: Optional[MockLLMConfig] = None) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; port 0 picks a free port (see server.server_address)."""
+    config = config or MockLLMConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="OpenAI/Azure-compatible LLM stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latency standard deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--cheap-invalid-rate", type=float, default=0.0,
+                        help="Fraction of cheap-model suggestion replies containing an invalid code")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = MockLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                           cheap_invalid_rate=args.cheap_invalid_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,24 @@
+import asyncio
 import logging
 import os
-from typing import Dict, Any, Optional
+import threading
+from typing import Callable, Dict, Any, Optional
 from uuid import uuid4
 from datetime import datetime
 import agentops
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import json
+import routing
+import tools
+from cancellation import CancelToken, RunCancelled, bind, check_cancelled
+from checkpoints import CheckpointStore, RunCheckpoint
 from crew import AstackcrewCrew
-from threading import Lock
+from logging_config import Truncated, configure_logging, log_task_id, shutdown_logging
+from semantic_cache import SemanticCache
+from task_store import PartialRecord, StatusResponses, TaskRecord
+from telemetry import TelemetryPipeline
 
 # Suppress OpenTelemetry warnings
 logging.getLogger("opentelemetry").setLevel(logging.ERROR)
@@ -17,10 +26,8 @@ logging.getLogger("opentelemetry").setLevel(logging.ERROR)
 # ------------------------------------------------------------------------------
 # 1) Configure Logging and FastAPI
 # ------------------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# LOG_PROFILE=production switches to truncated JSON logs written off-thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="AgentStack API")
@@ -75,13 +82,30 @@ def get_or_create_session(multi_session: bool = False) -> Optional[agentops.Sess
         logger.info("Created new session for subsequent single-session mode run")
         return session
 
+# Events are delivered by a background worker so telemetry never blocks a crew run
+telemetry_pipeline = TelemetryPipeline.from_env()
+
+@app.on_event("shutdown")
+def shutdown_background_workers():
+    """Stop in-flight runs, then deliver queued telemetry and log records before the process exits."""
+    for handle in set(runs.values()):
+        handle.token.cancel("Server shutting down")
+        handle.task.cancel()
+    telemetry_pipeline.stop()
+    shutdown_logging()
+
 # ------------------------------------------------------------------------------
 # 3) Pydantic Models
 # ------------------------------------------------------------------------------
 class RunInput(BaseModel):
     """Data required to start the Crew process."""
     diagnosis_text: str
+    reference_version: Optional[str] = None  # ICD-10 table version to pin, default: active
+    mode: Optional[str] = None  # "crew" or "pipeline" (see RUN_MODE), default: RUN_MODE
+    use_cache: bool = True  # serve a cached result of a similar diagnosis, resume from a checkpoint
 
+# PartialResult and TaskStatus document the /status response; tasks are stored
+# as the compact records of task_store.py and their responses are pre-rendered.
 class PartialResult(BaseModel):
     """Partial result of a Crew run."""
     subtask_name: str
@@ -91,7 +115,7 @@ class PartialResult(BaseModel):
 
 class TaskStatus(BaseModel):
     """Track the status of a Crew run: partial results, final result, etc."""
-    status: str  # "running", "completed", or "failed"
+    status: str  # "running", "completed", "failed", or "cancelled"
     result: str | None
     error: str | None
     progress_summary: str
@@ -100,166 +124,432 @@ class TaskStatus(BaseModel):
 # ------------------------------------------------------------------------------
 # 4) In-Memory Task Storage
 # ------------------------------------------------------------------------------
-tasks: Dict[str, TaskStatus] = {}
-tasks_lock = Lock()  # Lock for thread-safe access to tasks dict
+# API runs mutate task state on the event loop thread: crew threads post their
+# updates with `loop.call_soon_threadsafe`. The synchronous `run_crew_task`
+# updates it from its own thread, so writes also take `_tasks_lock`.
+tasks: Dict[str, TaskRecord] = {}
+_tasks_lock = threading.Lock()
+
+# Rendered /status bodies of recently polled tasks, reused until the task changes
+status_responses = StatusResponses()
+
+# Handle of the in-flight run each unfinished task is subscribed to
+runs: Dict[str, "RunHandle"] = {}
+
+# Single-flight: in-flight run per (diagnosis, ICD-10 version), joined by identical requests
+DEDUPLICATE_RUNS = os.getenv("DEDUPLICATE_RUNS", "true").lower() in ("1", "true", "yes")
+inflight: Dict[tuple, "RunHandle"] = {}
 
 # Cache for crew configuration
-TOTAL_SUBTASKS = len(AstackcrewCrew().crew().tasks)
+SUBTASK_NAMES = frozenset(t.name for t in AstackcrewCrew().crew().tasks)
+TOTAL_SUBTASKS = len(SUBTASK_NAMES)
+
+# "crew" runs the three agents; "pipeline" streams suggestions and validates each
+# code locally as it arrives, leaving only the report to an agent (src/pipeline.py)
+RUN_MODES = ("crew", "pipeline")
+RUN_MODE = os.getenv("RUN_MODE", "crew")
+
+# Validated results of completed runs, served for similar diagnoses without running a crew
+semantic_cache: Optional[SemanticCache] = SemanticCache.from_env()
+
+# Outputs of finished subtasks, so a retried or interrupted run resumes at its first unfinished subtask
+checkpoints: Optional[CheckpointStore] = CheckpointStore.from_env()
+
+# Crews running at once; further runs wait as coroutines, not as blocked threads
+MAX_CONCURRENT_CREWS = int(os.getenv("MAX_CONCURRENT_CREWS", "16"))
+_crew_slots: Optional[asyncio.Semaphore] = None
+
+def crew_slots() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent crew runs (created on the running loop)."""
+    global _crew_slots
+    if _crew_slots is None:
+        _crew_slots = asyncio.Semaphore(MAX_CONCURRENT_CREWS)
+    return _crew_slots
+
+class RunHandle:
+    """
+    An in-flight crew run: the coroutine awaiting it, its cancellation token and
+    the tasks subscribed to it (the task that started it plus identical requests
+    that joined while it was running).
+    """
+    __slots__ = ("task", "token", "key", "subscribers")
+
+    def __init__(self, token: CancelToken, key: Optional[tuple], task_id: str):
+        self.task: Optional[asyncio.Task] = None
+        self.token = token
+        self.key = key
+        self.subscribers: list[str] = [task_id]
+
+    def fan_out(self, fn: Callable, _task_id: str, *args) -> None:
+        """Apply a per-task status update to every subscriber (on the event loop)."""
+        for task_id in list(self.subscribers):
+            fn(task_id, *args)
+
+def dedup_key(inputs: "RunInput") -> tuple:
+    """Requests with the same diagnosis (ignoring case/whitespace), ICD-10 version and mode share a run."""
+    version = inputs.reference_version or tools.reference_data.active_version
+    return (" ".join(inputs.diagnosis_text.split()).casefold(), version, inputs.mode or RUN_MODE)
 
 def is_task_running(task_id: str) -> bool:
     """Check if a task is currently running."""
-    with tasks_lock:
-        return task_id in tasks and tasks[task_id].status == "running"
+    return task_id in tasks and tasks[task_id].status == "running"
 
 def update_task_status(task_id: str, status_update: Dict[str, Any]) -> None:
-    """Thread-safe update of task status."""
-    with tasks_lock:
+    """Update a task's status (API runs post their updates to the event loop thread)."""
+    with _tasks_lock:
         if task_id not in tasks:
-            tasks[task_id] = TaskStatus(
-                status="running",
-                result=None,
-                error=None,
-                progress_summary="0/0 subtasks completed",
-                partials=[]
-            )
-        task_status = tasks[task_id]
-        for key, value in status_update.items():
-            setattr(task_status, key, value)
+            tasks[task_id] = TaskRecord()
+        tasks[task_id].update(status_update)
+
+def add_partial(task_id: str, partial: PartialRecord) -> None:
+    """Append a subtask result unless the task already finished (e.g. was cancelled)."""
+    with _tasks_lock:
+        task_status = tasks.get(task_id)
+        if task_status is not None and task_status.status == "running":
+            task_status.add_partial(partial)
+            # Pipeline runs also post per-code partials, which are not subtasks
+            if partial.subtask_name in SUBTASK_NAMES:
+                completed_subtasks = sum(1 for p in task_status.partials if p.subtask_name in SUBTASK_NAMES)
+                task_status.update({"progress_summary": f"{completed_subtasks}/{TOTAL_SUBTASKS} subtasks completed"})
+
+def call_directly(fn: Callable, *args) -> None:
+    fn(*args)
 
 # ------------------------------------------------------------------------------
 # 5) Subtask Callback
 # ------------------------------------------------------------------------------
-def create_crew_task_callback(task_id: str, session_id: str | None = None):
+def create_crew_task_callback(task_id: str, session: Optional[agentops.Session] = None,
+                              post: Callable = call_directly):
     """
     Returns a function that CrewAI will call once each subtask finishes,
     allowing us to capture partial results in the global 'tasks' dict.
+    `post(fn, *args)` runs a status update where task state lives (the event loop).
     """
     def crew_task_callback(task_result):
-        if session_id:
-            try:
-                session = agentops.get_session(session_id)
-                record_subtask_event(task_id, "medical_coder", "subtask_complete", task_result.__dict__["raw"])
-            except Exception as e:
-                logger.error(f"[{task_id}] Error recording subtask event: {e}")
-        logger.info(f"[{task_id}] Subtask output: {task_result.__dict__}")
+        # Stop between subtasks if the run was cancelled
+        check_cancelled()
+        if session:
+            record_subtask_event(
+                task_id, "medical_coder", "subtask_complete",
+                getattr(task_result, "raw", ""), session=session
+            )
+        # Lazy %-formatting: payloads are only stringified (and truncated) if emitted
+        logger.debug("[%s] Subtask output: %s", task_id, Truncated(getattr(task_result, "raw", None)))
 
-        update_task_status(task_id, {
-            "partials": tasks[task_id].partials + [
-                PartialResult(
-                    subtask_name=getattr(task_result, "name", "unknown_task"),
-                    output=getattr(task_result, "raw", "No raw output"),
-                    details=getattr(task_result, "json_dict", None),
-                    timestamp=datetime.utcnow().isoformat(),
-                )
-            ]
-        })
-        logger.info(f"[{task_id}] Added partial: {tasks[task_id].partials[-1]}")
+        post(add_partial, task_id, PartialRecord(
+            subtask_name=getattr(task_result, "name", "unknown_task"),
+            output=getattr(task_result, "raw", "No raw output"),
+            details=getattr(task_result, "json_dict", None),
+            timestamp=datetime.utcnow().isoformat(),
+        ))
+        logger.info("[%s] Added partial for subtask %s", task_id, getattr(task_result, "name", "unknown_task"))
 
     return crew_task_callback
 
-def record_subtask_event(task_id: str, agent_name: str, event_type: str, content: str):
-    """Record a subtask event."""
-    try:
-        params = {
-            "task_id": task_id,
-            "agent_name": agent_name,
-            "content": content
-        }
-        event = agentops.Event(
-            event_type=event_type,
-            params=params,
-            returns=None  # No return value for these events
-        )
-        agentops.record(event)
-        logger.info(f"Recorded {event_type} event for task {task_id}")
-    except Exception as e:
-        logger.error(f"[{task_id}] Error recording subtask event: {str(e)}")
+def record_subtask_event(task_id: str, agent_name: str, event_type: str, content: str,
+                         session: Optional[agentops.Session] = None):
+    """Queue a subtask event for background delivery (never blocks the crew thread)."""
+    params = {
+        "task_id": task_id,
+        "agent_name": agent_name,
+        "content": content
+    }
+    # Sessions are only created for sampled runs, so every event of a sampled run is kept
+    # A full queue is counted (and warned about at most once a minute) by the pipeline, not per event here
+    if telemetry_pipeline.emit(event_type, params=params, returns=None, session=session, sampled=True):
+        logger.debug("Queued %s event for task %s", event_type, task_id)
 
 # ------------------------------------------------------------------------------
-# 6) Background Task
+# 6) Crew Execution
 # ------------------------------------------------------------------------------
-def run_crew_task(task_id: str, inputs: Dict[str, Any], multi_session: bool = False):
+def start_run(task_id: str, multi_session: bool, post: Callable = call_directly, mode: Optional[str] = None):
+    """Sample telemetry and build the crew (or pipeline) for one run. Returns (crew, session)."""
+    mode = mode or RUN_MODE
+    logger.info("[%s] Starting background run (multi_session=%s, mode=%s)", task_id, multi_session, mode)
+    # Sample per run: unsampled runs skip session creation and all event recording
+    sampled = multi_session or telemetry_pipeline.should_sample()
+    session = get_or_create_session(multi_session) if sampled else None
+
+    crew_obj = AstackcrewCrew().pipeline() if mode == "pipeline" else AstackcrewCrew().crew()
+    crew_obj.task_callback = create_crew_task_callback(task_id, session, post)
+    return crew_obj, session
+
+def resume_from_checkpoint(task_id: str, crew_obj: Any, inputs: Dict[str, Any], data_key: str,
+                           mode: Optional[str] = None, post: Callable = call_directly,
+                           resume: bool = True) -> Optional[RunCheckpoint]:
     """
-    Launches the Crew with configurable session handling.
-    Supports both multi-session (for testing) and single-session modes.
+    Checkpoint a crew run's subtasks and skip those an earlier attempt finished
+    (unless `resume` is False). Restored subtasks are posted as partials right
+    away. Pipeline runs are not checkpointed: their first stages make a single
+    streamed completion.
     """
-    logger.info(f"[{task_id}] Starting background run (multi_session={multi_session})")
-    session = get_or_create_session(multi_session)
+    if checkpoints is None or (mode or RUN_MODE) != "crew":
+        return None
+    checkpoint = checkpoints.open(inputs["diagnosis_text"], data_key, "crew")
+    restored = checkpoint.attach(crew_obj, resume=resume)
+    for output in restored:
+        post(add_partial, task_id, PartialRecord(
+            subtask_name=output.name,
+            output=output.raw,
+            details=output.json_dict,
+            timestamp=datetime.utcnow().isoformat(),
+        ))
+    if restored:
+        logger.info("[%s] Resuming from checkpoint after %s", task_id, ", ".join(o.name for o in restored))
+    return checkpoint
+
+def finish_run(task_id: str, result: Any, session: Optional[agentops.Session], multi_session: bool,
+               post: Callable = call_directly):
+    """Record a successful run's result (through `post`, see RunHandle.fan_out) and close its session."""
+    # Record completion
+    if session:
+        telemetry_pipeline.emit(
+            "task_completion",
+            params={"task_id": task_id},
+            returns=getattr(result, "raw", str(result)),
+            session=session,
+            sampled=True,
+        )
 
+    # Try to parse the final result as JSON if possible
     try:
-        # Build and run the Crew
-        crew_obj = AstackcrewCrew().crew()
-        crew_obj.task_callback = create_crew_task_callback(task_id, session.session_id if session else None)
-        
-        # Run crew and get result
-        result = crew_obj.kickoff(inputs=inputs)
-        
-        # Record completion
-        if session:
-            event = agentops.Event(
-                event_type="task_completion",
-                params={"task_id": task_id},
-                returns=getattr(result, "raw", str(result))
-            )
-            session.record(event)
-        
-        # Try to parse the final result as JSON if possible
+        final_str = getattr(result, "raw", str(result))
+        # Update task status
+        post(update_task_status, task_id, {
+            "status": "completed",
+            "result": final_str,
+            "error": None,
+            "progress_summary": f"{TOTAL_SUBTASKS}/{TOTAL_SUBTASKS} subtasks completed"
+        })
+        logger.info("[%s] Crew completed successfully with result: %.100s...", task_id, final_str)
+    except Exception as parse_error:
+        logger.error("[%s] Error parsing final result: %s", task_id, parse_error)
+        post(update_task_status, task_id, {
+            "status": "completed",
+            "result": str(result),
+            "error": None,
+            "progress_summary": f"{TOTAL_SUBTASKS}/{TOTAL_SUBTASKS} subtasks completed"
+        })
+
+    # End session if in multi-session mode
+    if session and multi_session:
+        try:
+            # Deliver this session's queued events before closing it
+            telemetry_pipeline.flush()
+            session.end_session(end_state="Success")
+            logger.info("[%s] Ended AgentOps session", task_id)
+        except Exception as e:
+            logger.error("[%s] Error ending AgentOps session: %s", task_id, e)
+
+def fail_run(task_id: str, error_msg: str, session: Optional[agentops.Session], multi_session: bool,
+             status: str = "failed", post: Callable = call_directly):
+    """Record a failed or cancelled run (through `post`) and close its session."""
+    post(update_task_status, task_id, {
+        "status": status,
+        "result": None,
+        "error": error_msg,
+        "progress_summary": "Task cancelled" if status == "cancelled" else "Task failed"
+    })
+
+    if session and multi_session:
         try:
-            final_str = getattr(result, "raw", str(result))
-            # Update task status
-            update_task_status(task_id, {
-                "status": "completed",
-                "result": final_str,
-                "error": None,
-                "progress_summary": f"{TOTAL_SUBTASKS}/{TOTAL_SUBTASKS} subtasks completed"
-            })
-            logger.info(f"[{task_id}] Crew completed successfully with result: {final_str[:100]}...")
-        except Exception as parse_error:
-            logger.error(f"[{task_id}] Error parsing final result: {str(parse_error)}")
-            update_task_status(task_id, {
-                "status": "completed",
-                "result": str(result),
-                "error": None,
-                "progress_summary": f"{TOTAL_SUBTASKS}/{TOTAL_SUBTASKS} subtasks completed"
-            })
-
-        # End session if in multi-session mode
-        if session and multi_session:
-            try:
-                session.end_session(end_state="Success")
-                logger.info(f"[{task_id}] Ended AgentOps session")
-            except Exception as e:
-                logger.error(f"[{task_id}] Error ending AgentOps session: {e}")
+            telemetry_pipeline.flush()
+            session.end_session(end_state="Fail", end_state_reason=error_msg)
+        except Exception as end_error:
+            logger.error("[%s] Error ending AgentOps session: %s", task_id, end_error)
 
+def record_routing(task_id: str, route_state: routing.RunRouting) -> None:
+    """Add a run that made LLM calls to the routing metrics (escalations, latency, cost)."""
+    if route_state.calls:
+        summary = routing.metrics.record(route_state)
+        logger.info("[%s] Model routing: escalated=%s, %d calls, cost $%.4f", task_id,
+                    summary["escalated"], summary["calls"], summary["cost_usd"])
+
+def cache_result(task_id: str, inputs: Dict[str, Any], data_key: str, result: Any) -> None:
+    """
+    Store a completed run's report in the semantic cache (never fails the run).
+    Results are keyed by the reference dataset's `data_key`, so reloading an
+    edited table under the same version stops serving them.
+    """
+    if semantic_cache is None:
+        return
+    try:
+        if semantic_cache.store(inputs["diagnosis_text"], data_key, getattr(result, "raw", str(result))):
+            logger.debug("[%s] Cached validated result", task_id)
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"[{task_id}] Error in run_crew_task: {error_msg}")
-        
-        update_task_status(task_id, {
-            "status": "failed",
-            "result": None,
-            "error": error_msg,
-            "progress_summary": "Task failed"
-        })
+        logger.error("[%s] Could not cache result: %s", task_id, e)
+
+def serve_cached(task_id: str, inputs: "RunInput", data_key: str) -> bool:
+    """Complete a task from the semantic cache if a similar diagnosis was validated before."""
+    if semantic_cache is None or not inputs.use_cache:
+        return False
+    hit = semantic_cache.lookup(inputs.diagnosis_text, data_key)
+    if hit is None:
+        return False
+    update_task_status(task_id, {
+        "status": "completed",
+        "result": hit.entry.result,
+        "error": None,
+        "progress_summary": f"{TOTAL_SUBTASKS}/{TOTAL_SUBTASKS} subtasks completed",
+        "partials": [PartialRecord(
+            subtask_name="semantic_cache",
+            output=hit.entry.text,
+            details={
+                "similarity": hit.similarity,
+                "matched_text": hit.entry.text,
+                "codes": hit.entry.codes,
+                "data_version": hit.entry.data_version,
+            },
+            timestamp=datetime.utcnow().isoformat(),
+        )],
+    })
+    logger.info("[%s] /run served from semantic cache (similarity %.3f)", task_id, hit.similarity)
+    return True
+
+def run_crew_task(task_id: str, inputs: Dict[str, Any], multi_session: bool = False,
+                  reference_version: Optional[str] = None, mode: Optional[str] = None):
+    """
+    Launches the Crew synchronously in the calling thread, with configurable session handling.
+    Supports both multi-session (for testing) and single-session modes.
+    The whole run validates against one ICD-10 table version: `reference_version`
+    if given, otherwise the version active when the run starts.
+    The API uses `run_crew_task_async` instead.
+    """
+    session = None
+    checkpoint = None
+    route_state = routing.RunRouting(task_id)
+    with log_task_id(task_id):
+        try:
+            # Build and run the Crew
+            crew_obj, session = start_run(task_id, multi_session, mode=mode)
+            with routing.bind(route_state), tools.reference_data.pin(reference_version) as dataset:
+                logger.info("[%s] Validating against ICD-10 version %s", task_id, dataset.version)
+                checkpoint = resume_from_checkpoint(task_id, crew_obj, inputs, dataset.data_key, mode)
+                result = crew_obj.kickoff(inputs=inputs)
+            finish_run(task_id, result, session, multi_session)
+            cache_result(task_id, inputs, dataset.data_key, result)
+            if checkpoint is not None:
+                checkpoint.discard()
+        except Exception as e:
+            error_msg = str(e)
+            logger.error("[%s] Error in run_crew_task: %s", task_id, error_msg)
+            if checkpoint is not None:
+                checkpoint.fail()
+            fail_run(task_id, error_msg, session, multi_session)
+        finally:
+            record_routing(task_id, route_state)
 
-        if session and multi_session:
-            try:
-                session.end_session(end_state="Fail", end_state_reason=error_msg)
-            except Exception as end_error:
-                logger.error(f"[{task_id}] Error ending AgentOps session: {end_error}")
+async def run_crew_task_async(task_id: str, inputs: Dict[str, Any], handle: RunHandle,
+                              reference_version: Optional[str] = None, multi_session: bool = False,
+                              mode: Optional[str] = None, resume: bool = True):
+    """
+    Run the Crew for an API request without tying up a thread while it waits.
+
+    The run first waits for a crew slot as a plain coroutine. Blocking work
+    (building the crew, starting sessions) and the crew itself then run in
+    worker threads. crewai is synchronous internally, so a running crew still
+    occupies one thread until it finishes or its next cancellation check.
+    Status updates from those threads are posted back to the event loop.
+    Cancelling the asyncio task marks the run cancelled right away, and the
+    crew stops at its next agent step or LLM call; the run keeps its crew slot
+    until then, so cancelled crews never push past MAX_CONCURRENT_CREWS.
+    Partials and the final status go to every task subscribed to `handle`.
+    `resume` False ignores any checkpoint of an earlier attempt.
+    """
+    loop = asyncio.get_running_loop()
+    token = handle.token
+    post = lambda fn, *args: loop.call_soon_threadsafe(handle.fan_out, fn, *args)  # noqa: E731
+    session = None
+    checkpoint = None
+    route_state = routing.RunRouting(task_id)
+    try:
+        async with crew_slots():
+            token.raise_if_cancelled()
+            crew_obj, session = await asyncio.to_thread(start_run, task_id, multi_session, post, mode)
+            # Loading a version not loaded yet builds its index; that must not stall the event loop
+            dataset = (tools.reference_data.get(None) if reference_version is None
+                       else await asyncio.to_thread(tools.reference_data.load, reference_version))
+            # The pin, cancel token and routing state are context variables, copied into the crew's worker thread
+            with bind(token), routing.bind(route_state), tools.reference_data.pin(dataset):
+                logger.info("[%s] Validating against ICD-10 version %s", task_id, dataset.version)
+                checkpoint = await asyncio.to_thread(
+                    resume_from_checkpoint, task_id, crew_obj, inputs, dataset.data_key, mode, post, resume
+                )
+                kickoff_async = getattr(crew_obj, "kickoff_async", None)
+                if kickoff_async is not None:
+                    worker = asyncio.ensure_future(kickoff_async(inputs=inputs))
+                else:
+                    worker = asyncio.ensure_future(asyncio.to_thread(crew_obj.kickoff, inputs=inputs))
+                try:
+                    result = await asyncio.shield(worker)
+                except asyncio.CancelledError:
+                    # The crew thread runs on until its next cancellation check; hold the slot until it returns
+                    token.cancel(token.reason or "Cancelled")
+                    await asyncio.wait({worker})
+                    raise
+        token.raise_if_cancelled()
+        # Ending a multi-session run flushes telemetry over the network
+        await asyncio.to_thread(finish_run, task_id, result, session, multi_session, post)
+        await asyncio.to_thread(cache_result, task_id, inputs, dataset.data_key, result)
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.discard)
+    except (asyncio.CancelledError, RunCancelled):
+        token.cancel(token.reason or "Cancelled")
+        logger.info("[%s] Run cancelled: %s", task_id, token.reason)
+        await asyncio.to_thread(fail_run, task_id, token.reason, session, multi_session, "cancelled", post)
+    except Exception as e:
+        error_msg = str(e)
+        logger.error("[%s] Error in run_crew_task: %s", task_id, error_msg)
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.fail)
+        await asyncio.to_thread(fail_run, task_id, error_msg, session, multi_session, "failed", post)
+    finally:
+        record_routing(task_id, route_state)
+        if inflight.get(handle.key) is handle:
+            del inflight[handle.key]
+        for subscriber in handle.subscribers:
+            runs.pop(subscriber, None)
 
 # ------------------------------------------------------------------------------
-# 7) API Endpoint to Launch Crew
+# 7) API Endpoints to Launch and Cancel a Crew
 # ------------------------------------------------------------------------------
 @app.post("/run")
-async def run_crew_endpoint(inputs: RunInput, background_tasks: BackgroundTasks) -> Dict[str, str]:
+async def run_crew_endpoint(inputs: RunInput) -> Dict[str, str]:
     """
     POST /run
     Body: { "diagnosis_text": "some text" }
     Returns: { "task_id": "<uuid>" }
     """
+    reference_version = inputs.reference_version
+    if reference_version and reference_version not in tools.reference_data.discover():
+        raise HTTPException(status_code=400, detail=f"Unknown ICD-10 version '{reference_version}'")
+    if inputs.mode and inputs.mode not in RUN_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{inputs.mode}', expected one of {list(RUN_MODES)}")
+
     task_id = str(uuid4())
-    logger.info(f"[{task_id}] /run called - scheduling background task")
+    if serve_cached(task_id, inputs, tools.reference_data.data_key(reference_version)):
+        return {"task_id": task_id}
+
+    key = dedup_key(inputs) if DEDUPLICATE_RUNS else None
+    # A run that opted out of cached results does not join one that may have resumed from a checkpoint
+    leader = inflight.get(key) if key and inputs.use_cache else None
+
+    if leader is not None and leader.subscribers:
+        # Single-flight: attach to the identical in-flight run instead of starting a crew
+        first = tasks[leader.subscribers[0]]
+        update_task_status(task_id, {
+            "status": "running",
+            "result": None,
+            "error": None,
+            "progress_summary": first.progress_summary,
+            "partials": list(first.partials),
+        })
+        leader.subscribers.append(task_id)
+        runs[task_id] = leader
+        logger.info("[%s] /run called - joined in-flight run of task %s", task_id, leader.subscribers[0])
+        return {"task_id": task_id}
+
+    logger.info("[%s] /run called - scheduling background task", task_id)
 
     # Initialize task status
     update_task_status(task_id, {
@@ -271,33 +561,136 @@ async def run_crew_endpoint(inputs: RunInput, background_tasks: BackgroundTasks)
     })
 
     # Use single-session mode for API calls
-    background_tasks.add_task(run_crew_task, task_id, inputs.dict(), multi_session=False)
+    handle = RunHandle(CancelToken(task_id), key, task_id)
+    # The task copies this context, so everything logged during the run carries its task_id
+    with log_task_id(task_id):
+        handle.task = asyncio.create_task(run_crew_task_async(
+            task_id, inputs.dict(exclude={"reference_version", "mode", "use_cache"}), handle,
+            reference_version=reference_version, mode=inputs.mode, resume=inputs.use_cache,
+        ))
+    runs[task_id] = handle
+    if key:
+        inflight[key] = handle
 
     return {"task_id": task_id}
 
+@app.delete("/run/{task_id}")
+async def cancel_crew_endpoint(task_id: str) -> Dict[str, str]:
+    """
+    DELETE /run/<task_id>
+    Cancels a running task. The crew run is stopped (no further LLM calls) once
+    no other identical request is attached to it.
+    Returns: { "task_id": "<uuid>", "status": "cancelled" }
+    """
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    handle = runs.get(task_id)
+    if handle is None:
+        raise HTTPException(status_code=409, detail=f"Task already {tasks[task_id].status}")
+
+    # Detach this task; the run keeps going while other tasks are subscribed
+    handle.subscribers.remove(task_id)
+    del runs[task_id]
+    fail_run(task_id, "Cancelled by client", None, False, status="cancelled")
+    if handle.subscribers:
+        return {"task_id": task_id, "status": "cancelled"}
+
+    handle.token.cancel("Cancelled by client")
+    handle.task.cancel()
+    # The run finishes in the background once its crew thread has stopped; this task is already cancelled
+    return {"task_id": task_id, "status": tasks[task_id].status}
+
 # ------------------------------------------------------------------------------
 # 8) API Endpoint to Check Status
 # ------------------------------------------------------------------------------
-@app.get("/status/{task_id}")
-async def get_status(task_id: str) -> TaskStatus:
+async def get_status(task_id: str) -> TaskRecord:
+    """The task's record (attributes as in TaskStatus); 404 if unknown."""
+    # Runs on the event loop, the only thread that mutates task state
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return tasks[task_id]
+
+@app.get("/status/{task_id}", response_model=TaskStatus)
+async def get_status_endpoint(task_id: str) -> Response:
     """
     GET /status/<task_id>
-    Returns the TaskStatus with partials and final result.
+    Returns the TaskStatus with partials and final result, pre-rendered:
+    the body is only re-encoded after the task has changed.
     """
-    with tasks_lock:
-        if task_id not in tasks:
-            raise HTTPException(status_code=404, detail="Task not found")
-        
-        status_obj = tasks[task_id]
-        
-        # Update progress summary using cached total
-        completed_subtasks = len(status_obj.partials)
-        status_obj.progress_summary = f"{completed_subtasks}/{TOTAL_SUBTASKS} subtasks completed"
-        
-        return status_obj
+    record = await get_status(task_id)
+    return Response(status_responses.get(task_id, record), media_type="application/json")
+
+# ------------------------------------------------------------------------------
+# 9) Reference Data Versions
+# ------------------------------------------------------------------------------
+@app.get("/reference-data")
+async def get_reference_data() -> Dict[str, Any]:
+    """
+    GET /reference-data
+    Returns the active, loaded, loading and available ICD-10 table versions.
+    """
+    return tools.reference_data.describe()
+
+@app.post("/reference-data/reload")
+async def reload_reference_data() -> Dict[str, Any]:
+    """
+    POST /reference-data/reload
+    Picks up new or edited tables in the background; in-flight runs keep their version.
+    """
+    tools.reference_data.refresh()
+    return tools.reference_data.describe()
+
+@app.post("/reference-data/{version}/activate")
+async def activate_reference_data(version: str) -> Dict[str, Any]:
+    """
+    POST /reference-data/<version>/activate
+    Loads the version in the background and makes it the default for new runs.
+    """
+    if version not in tools.reference_data.discover():
+        raise HTTPException(status_code=404, detail=f"Unknown ICD-10 version '{version}'")
+    tools.reference_data.follow_newest = False
+    tools.reference_data.load_in_background(version, activate=True)
+    return tools.reference_data.describe()
+
+# ------------------------------------------------------------------------------
+# 10) Model Routing Metrics
+# ------------------------------------------------------------------------------
+@app.get("/metrics/routing")
+async def get_routing_metrics() -> Dict[str, Any]:
+    """
+    GET /metrics/routing
+    Returns the model routes and, over finished runs, the escalation rate,
+    latency and estimated LLM cost per request.
+    """
+    return routing.metrics.snapshot()
+
+# ------------------------------------------------------------------------------
+# 11) Semantic Cache
+# ------------------------------------------------------------------------------
+@app.get("/cache/semantic")
+async def get_semantic_cache_report() -> Dict[str, Any]:
+    """
+    GET /cache/semantic
+    Returns the semantic cache's size, hit rate, similarity of served hits and
+    code agreement between fresh results and their nearest cached neighbour.
+    """
+    if semantic_cache is None:
+        raise HTTPException(status_code=404, detail="Semantic cache is disabled")
+    return semantic_cache.report()
+
+@app.delete("/cache/semantic")
+async def clear_semantic_cache() -> Dict[str, Any]:
+    """
+    DELETE /cache/semantic
+    Drops all cached results, in memory and on disk.
+    """
+    if semantic_cache is None:
+        raise HTTPException(status_code=404, detail="Semantic cache is disabled")
+    semantic_cache.clear()
+    return semantic_cache.report()
 
 # ------------------------------------------------------------------------------
-# 9) Uvicorn Entry Point
+# 12) Uvicorn Entry Point
 # ------------------------------------------------------------------------------
 if __name__ == "__main__":
     import uvicorn
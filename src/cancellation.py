@@ -0,0 +1,71 @@
+# src/cancellation.py
+"""
+Cooperative cancellation for crew runs.
+
+A crew run executes synchronously inside crewai, so it cannot be interrupted
+from outside. Instead every run gets a CancelToken bound to its context; the
+crew checks it after each agent step and before every tool LLM call, and
+raises RunCancelled once the token is cancelled. The LLM request already in
+flight finishes (or times out) and its result is discarded; no further calls
+are made.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class RunCancelled(BaseException):
+    """
+    Raised inside a crew run that was cancelled.
+
+    Derives from BaseException (like asyncio.CancelledError) so crewai's
+    `except Exception` retry loops do not swallow it and spend more LLM calls.
+    """
+
+
+class CancelToken:
+    """Thread-safe cancellation flag shared by the API and one crew run."""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Cancelled by client") -> None:
+        self.reason = reason
+        self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RunCancelled(f"[{self.task_id}] {self.reason}")
+
+
+# Token of the run executing in the current context (copied into asyncio.to_thread workers)
+_current: ContextVar[Optional[CancelToken]] = ContextVar("crew_cancel_token", default=None)
+
+
+@contextmanager
+def bind(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Make `token` the current run's token for the duration of the block."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check_cancelled(*_args) -> None:
+    """
+    Raise RunCancelled if the current run was cancelled; a no-op outside runs.
+
+    Accepts and ignores arguments so it can be used directly as a crewai
+    step callback.
+    """
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
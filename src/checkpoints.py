@@ -0,0 +1,309 @@
+# src/checkpoints.py
+"""
+Subtask checkpoints, so a failed or interrupted crew run resumes where it stopped.
+
+Every finished subtask's output is written to a checkpoint file for the run's
+diagnosis (normalized like the API's run deduplication), ICD-10 reference
+data, mode and crew fingerprint (prompts in config/*.yaml, crew.py and the
+model routes), so a deploy that changes the crew never resumes from the old
+crew's outputs. When the same diagnosis is run again, because a client
+retried after a failure or because the worker died and was restarted, the
+crew starts at the first task without a checkpointed output and earlier
+tasks' outputs are handed on as context, exactly as if they had just run. A
+run that died after validation only pays for the report.
+
+Checkpoints hold subtask outputs, so they are off unless CHECKPOINTS is set,
+and are kept in a directory only the current user can access (files 0600).
+The file is named by a digest of the run key and stores only that digest,
+not the diagnosis text. Checkpoints are deleted when a run completes
+(completed results are the semantic cache's job). Those older than
+CHECKPOINT_TTL, and temporary files left by a crashed save, are removed at
+startup and then at most every SWEEP_INTERVAL seconds, so a failed run that
+is never retried does not keep its outputs. A resumed
+run that fails deletes its checkpoint too, since the restored outputs may be
+what made it fail; the next attempt starts over. A run can also start over
+explicitly (the API's "use_cache": false), replacing the checkpoint.
+
+The ICD-10 validations made during a subtask are saved with its output and
+reported to the run's model routing again when it is restored, so a resumed
+run escalates exactly like one that ran the validation itself.
+
+Configuration (environment variables):
+    CHECKPOINTS         "true" enables checkpointing (default: false)
+    CHECKPOINT_DIR      Directory of checkpoint files (default: icd10-checkpoints-<uid> in the temp dir)
+    CHECKPOINT_TTL      Seconds a checkpoint can be resumed from (default: 86400)
+"""
+import getpass
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from crewai import Crew
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.output_format import OutputFormat
+from crewai.tasks.task_output import TaskOutput
+from pydantic import PrivateAttr
+
+import routing
+from tools.icd10_shared_table import private_dir
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+SWEEP_INTERVAL = 3600  # seconds between sweeps of expired checkpoints
+TMP_GRACE = 300  # seconds after which a temporary file is considered orphaned
+
+
+def default_dir() -> str:
+    """Per-user checkpoint directory in the temp dir."""
+    user = os.geteuid() if hasattr(os, "geteuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"icd10-checkpoints-{user}")
+
+
+def crew_fingerprint() -> str:
+    """Hash of the crew's prompts, task wiring and model routes (config/*.yaml, crew.py, MODEL_ROUTES_FILE)."""
+    paths = sorted(glob.glob(os.path.join(SRC_DIR, "config", "*.yaml")))
+    paths += [os.path.join(SRC_DIR, "crew.py"), os.getenv("MODEL_ROUTES_FILE", routing.ROUTES_FILE)]
+    digest = hashlib.sha256(os.getenv("MODEL_ROUTING", "true").encode())
+    for path in paths:
+        digest.update(path.encode())
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+# ------------------------------------------------------------------------------
+# Resumable crew
+# ------------------------------------------------------------------------------
+class ResumableCrew(Crew):
+    """
+    Sequential Crew whose kickoff skips tasks restored from a checkpoint.
+
+    Restored outputs are set on their tasks (like Crew.replay does), so the
+    next task receives them as context; agents, callbacks and inputs are set
+    up by the regular kickoff.
+    """
+    _restored: List[TaskOutput] = PrivateAttr(default_factory=list)
+
+    def restore(self, outputs: List[TaskOutput]) -> None:
+        """Treat `outputs` as the results of the first len(outputs) tasks."""
+        self._restored = list(outputs)
+
+    def _run_sequential_process(self) -> CrewOutput:
+        # Restored outputs apply to one kickoff; a later kickoff runs every task
+        restored, self._restored = self._restored, []
+        for task, output in zip(self.tasks, restored):
+            task.output = output
+        return self._execute_tasks(self.tasks, start_index=len(restored), was_replayed=bool(restored))
+
+
+# ------------------------------------------------------------------------------
+# Checkpoints
+# ------------------------------------------------------------------------------
+def run_key(diagnosis_text: str, data_version: str, mode: str, fingerprint: str) -> tuple:
+    """Runs of the same diagnosis (ignoring case/whitespace), ICD-10 data, mode and crew share checkpoints."""
+    return (" ".join(diagnosis_text.split()).casefold(), data_version, mode, fingerprint)
+
+
+def key_digest(key: tuple) -> str:
+    return hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+
+
+def _dump_output(output: Any) -> Dict[str, Any]:
+    output_format = getattr(output, "output_format", OutputFormat.RAW)
+    return {
+        "name": getattr(output, "name", None),
+        "description": getattr(output, "description", ""),
+        "agent": getattr(output, "agent", ""),
+        "raw": getattr(output, "raw", ""),
+        "json_dict": getattr(output, "json_dict", None),
+        "output_format": getattr(output_format, "value", output_format),
+    }
+
+
+def _load_output(data: Dict[str, Any]) -> TaskOutput:
+    return TaskOutput(
+        name=data["name"],
+        description=data["description"],
+        agent=data["agent"],
+        raw=data["raw"],
+        json_dict=data["json_dict"],
+        output_format=OutputFormat(data["output_format"]),
+    )
+
+
+class RunCheckpoint:
+    """Checkpointed subtask outputs of one run key, saved as each subtask finishes."""
+
+    def __init__(self, store: "CheckpointStore", key: tuple, outputs: List[Dict[str, Any]]):
+        self.store = store
+        self.key = key
+        self.outputs = outputs
+        self.resumed = False
+        self._validations_seen = 0
+        self._lock = threading.Lock()
+
+    def restorable(self, crew: Crew) -> List[TaskOutput]:
+        """Outputs of the leading tasks of `crew` that were checkpointed, in task order."""
+        restored = []
+        for task, data in zip(crew.tasks, self.outputs):
+            if data["name"] != task.name:
+                break
+            restored.append(_load_output(data))
+        return restored
+
+    def attach(self, crew: ResumableCrew, resume: bool = True) -> List[TaskOutput]:
+        """
+        Resume `crew` from this checkpoint and save each task it finishes.
+
+        Call after the crew's task_callback is set, inside the run's routing
+        binding; the callback still runs for every executed task, after the
+        output has been saved.
+
+        Args:
+            crew: Crew about to be kicked off
+            resume: False runs every task, replacing the saved outputs
+
+        Returns:
+            The restored outputs (their tasks will not run)
+        """
+        restored = self.restorable(crew) if resume else []
+        self.outputs = self.outputs[:len(restored)]
+        self.resumed = bool(restored)
+        for data in self.outputs:
+            for validation in data.get("validations", ()):
+                routing.observe_validation(validation)
+        self._validations_seen = len(routing.current_run().validations)
+        crew.restore(restored)
+        inner: Optional[Callable[[Any], None]] = crew.task_callback
+
+        def task_callback(output: Any) -> None:
+            # Saved first: a run cancelled or failing in the callback keeps this stage
+            self.save(output)
+            if inner is not None:
+                inner(output)
+
+        crew.task_callback = task_callback
+        return restored
+
+    def save(self, output: Any) -> None:
+        with self._lock:
+            validations = routing.current_run().validations
+            data = _dump_output(output)
+            data["validations"] = validations[self._validations_seen:]
+            self._validations_seen = len(validations)
+            self.outputs.append(data)
+            self.store.write(self.key, self.outputs)
+
+    def discard(self) -> None:
+        """Drop the checkpoint of a completed run."""
+        self.store.delete(self.key)
+
+    def fail(self) -> None:
+        """Drop the checkpoint of a failed run if it was resumed, so a retry does not reuse its restored outputs."""
+        if self.resumed:
+            logger.info("Dropping checkpoint of failed resumed run %s", self.key)
+            self.discard()
+
+
+class CheckpointStore:
+    """One private JSON file of subtask outputs per run key, replaced atomically on every save."""
+
+    def __init__(self, directory: Optional[str] = None, ttl: float = 86400, fingerprint: Optional[str] = None):
+        """
+        Args:
+            directory: Directory the checkpoint files are kept in (created 0700 on first save);
+                None for a per-user directory in the temp dir
+            ttl: Seconds after its last save a checkpoint is still resumed from
+            fingerprint: Version of the crew whose outputs are saved; None for crew_fingerprint()
+        """
+        self.directory = directory or default_dir()
+        self.ttl = ttl
+        self.fingerprint = fingerprint if fingerprint is not None else crew_fingerprint()
+        self._next_sweep = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["CheckpointStore"]:
+        """The store configured by CHECKPOINT_* variables (swept of expired files), or None if disabled."""
+        if os.getenv("CHECKPOINTS", "false").lower() not in ("1", "true", "yes"):
+            return None
+        store = cls(os.getenv("CHECKPOINT_DIR") or None, float(os.getenv("CHECKPOINT_TTL", "86400")))
+        store.sweep()
+        return store
+
+    def path(self, key: tuple) -> str:
+        return os.path.join(self.directory, f"{key_digest(key)[:32]}.json")
+
+    def open(self, diagnosis_text: str, data_version: str, mode: str) -> RunCheckpoint:
+        """The checkpoint of a run, with the outputs saved by an earlier attempt if any."""
+        if time.time() >= self._next_sweep:
+            self.sweep()
+        key = run_key(diagnosis_text, data_version, mode, self.fingerprint)
+        return RunCheckpoint(self, key, self.read(key))
+
+    def sweep(self) -> int:
+        """
+        Remove expired checkpoints and orphaned temporary files.
+
+        Returns:
+            Number of files removed
+        """
+        self._next_sweep = time.time() + SWEEP_INTERVAL
+        now, removed = time.time(), 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            max_age = self.ttl if name.endswith(".json") else TMP_GRACE if name.endswith(".tmp") else None
+            if max_age is None:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.lstat(path).st_mtime > max_age:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info("Removed %d expired checkpoint files from %s", removed, self.directory)
+        return removed
+
+    def read(self, key: tuple) -> List[Dict[str, Any]]:
+        path = self.path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                document = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", path, e)
+            return []
+        if document.get("key") != key_digest(key):
+            return []  # file name collision
+        if time.time() - document.get("updated_at", 0) > self.ttl:
+            self.delete(key)
+            return []
+        return document["outputs"]
+
+    def write(self, key: tuple, outputs: List[Dict[str, Any]]) -> None:
+        private_dir(self.directory, "CHECKPOINT_DIR")
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0)
+        with os.fdopen(os.open(tmp_path, flags, 0o600), "w", encoding="utf-8") as f:
+            json.dump({"key": key_digest(key), "updated_at": time.time(), "outputs": outputs}, f, default=str)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: tuple) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
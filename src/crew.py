@@ -4,18 +4,32 @@ from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.tasks.task_output import TaskOutput
 import tools
+from cancellation import check_cancelled
+from checkpoints import ResumableCrew
+from logging_config import resolve_verbose
+from pipeline import SpeculativePipeline
+from routing import routed_llm
 
 
 @CrewBase
 class AstackcrewCrew:
     """A Crew setup for a medical diagnosis workflow with conditional task execution."""
 
+    def _agent_verbose(self, name: str) -> bool:
+        """Verbosity for an agent: CREW_VERBOSE, then `verbose` in agents.yaml, then LOG_PROFILE."""
+        return resolve_verbose(self.agents_config[name].get("verbose"))
+
+    def _agent_llm(self, name: str):
+        """LLM for an agent: its route in routes.yaml if any, else `llm` in agents.yaml."""
+        return routed_llm(name, self.agents_config[name].get("llm"))
+
     # Agent definitions
     @agent
     def medical_coder(self) -> Agent:
         return Agent(
             config=self.agents_config["medical_coder"],
-            verbose=True,
+            verbose=self._agent_verbose("medical_coder"),
+            llm=self._agent_llm("medical_coder"),
             tools=[tools.gpt4_suggestion_tool],
         )
 
@@ -23,14 +37,16 @@ class AstackcrewCrew:
     def validation_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['validation_agent'],
-            verbose=True,
-            tools=[tools.icd10_database_tool],
+            verbose=self._agent_verbose('validation_agent'),
+            llm=self._agent_llm('validation_agent'),
+            tools=[tools.icd10_database_tool, tools.icd10_navigation_tool],
         )
     @agent
     def reporting_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['reporting_agent'],
-            verbose=True,
+            verbose=self._agent_verbose('reporting_agent'),
+            llm=self._agent_llm('reporting_agent'),
         )
 
     # Task definitions
@@ -38,7 +54,10 @@ class AstackcrewCrew:
     def medical_diagnosis_task(self) -> Task:
         return Task(
             config=self.tasks_config['medical_diagnosis_task'],
-            async_execution=True
+            # The whole crew already runs off the API event loop; an async task would
+            # add a thread per run that validation_task immediately waits on, and
+            # that thread would not see the run's pinned data version or cancel token
+            async_execution=False
         )
 
     @task
@@ -56,12 +75,34 @@ class AstackcrewCrew:
         )
 
     @crew
-    def crew(self) -> Crew:
-        """Defines the Crew workflow."""
-        return Crew(
+    def crew(self) -> ResumableCrew:
+        """Defines the Crew workflow (resumable from subtask checkpoints, see src/checkpoints.py)."""
+        return ResumableCrew(
             agents=self.agents,  # Agents defined above
             tasks=self.tasks,  # Tasks defined above
             process=Process.sequential,  # Sequential execution for better control
-            verbose=True,
+            verbose=resolve_verbose(),
+            step_callback=check_cancelled,  # Stop a cancelled run after the current agent step
             # merge_outputs=True  # Aggregate outputs from all tasks
         )
+
+    # Pipeline mode: streamed suggestions validated locally, then one reporting agent
+    def pipeline_reporting_task(self) -> Task:
+        # Not a @task, so the sequential crew above does not pick it up; named like
+        # the crew's report so partials and progress read the same in both modes
+        return Task(
+            config=self.tasks_config['pipeline_reporting_task'],
+            name="reporting_task",
+        )
+
+    def pipeline(self) -> SpeculativePipeline:
+        """Defines the speculative validation pipeline (see src/pipeline.py)."""
+        return SpeculativePipeline(
+            reporting_crew=Crew(
+                agents=[self.reporting_agent()],
+                tasks=[self.pipeline_reporting_task()],
+                process=Process.sequential,
+                verbose=resolve_verbose(),
+                step_callback=check_cancelled,
+            )
+        )
@@ -0,0 +1,161 @@
+# src/logging_config.py
+"""
+Logging profiles for the API and the crew.
+
+Two profiles are available, selected with the LOG_PROFILE environment variable:
+
+- "development" (default): human-readable logs written synchronously, crew verbose.
+- "production": structured JSON logs emitted through a QueueHandler and written by
+  a QueueListener thread, payloads truncated, crew verbosity off. Records logged
+  while a run is bound with `log_task_id` (including from its worker threads)
+  carry its "task_id" field.
+
+Other environment variables:
+    LOG_LEVEL           Root log level (default: INFO)
+    LOG_PAYLOAD_LIMIT   Max characters of LLM output kept in a log line (default: 500)
+    CREW_VERBOSE        Overrides agent/crew verbosity ("true"/"false")
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+DEVELOPMENT = "development"
+PRODUCTION = "production"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Task whose run is executing in the current context (copied into asyncio tasks and to_thread workers)
+_task_id: ContextVar[Optional[str]] = ContextVar("log_task_id", default=None)
+
+
+def get_profile() -> str:
+    """Return the active logging profile."""
+    profile = os.getenv("LOG_PROFILE", DEVELOPMENT).lower()
+    return PRODUCTION if profile in ("production", "prod") else DEVELOPMENT
+
+
+def payload_limit() -> int:
+    return int(os.getenv("LOG_PAYLOAD_LIMIT", "500"))
+
+
+class Truncated:
+    """
+    Lazy, truncated view of a (possibly huge) payload for %-style log arguments.
+
+    Nothing is converted to a string unless the record is actually emitted.
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = payload_limit() if limit is None else limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... [truncated {len(text) - self.limit} chars]"
+
+    __repr__ = __str__
+
+
+@contextmanager
+def log_task_id(task_id: str) -> Iterator[None]:
+    """Tag records logged in this context, and in tasks and threads started from it, with `task_id`."""
+    reset = _task_id.set(task_id)
+    try:
+        yield
+    finally:
+        _task_id.reset(reset)
+
+
+class TaskIdFilter(logging.Filter):
+    """Set `record.task_id` from the bound run (in the logging thread, before records are queued)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "task_id", None) is None:
+            record.task_id = _task_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        task_id = getattr(record, "task_id", None)
+        if task_id:
+            entry["task_id"] = task_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def resolve_verbose(config_value: Optional[bool] = None) -> bool:
+    """
+    Decide crew/agent verbosity.
+
+    CREW_VERBOSE wins, then the value from agents.yaml, then the profile default.
+    """
+    env = os.getenv("CREW_VERBOSE")
+    if env is not None:
+        return env.strip().lower() in ("1", "true", "yes", "on")
+    if config_value is not None:
+        return bool(config_value)
+    return get_profile() == DEVELOPMENT
+
+
+def configure_logging(profile: Optional[str] = None) -> Optional[logging.handlers.QueueListener]:
+    """
+    Configure root logging for the selected profile.
+
+    Returns:
+        The running QueueListener in the production profile, otherwise None
+    """
+    global _listener
+    profile = profile or get_profile()
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+
+    if profile != PRODUCTION:
+        logging.basicConfig(
+            level=level,
+            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+        return None
+
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(TaskIdFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush and stop the production QueueListener, if any."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -4,20 +4,42 @@ from datetime import datetime
 from crew import AstackcrewCrew
 import agentops
 import logging
+import routing
+import tools
+from checkpoints import CheckpointStore
+from logging_config import configure_logging
 
 # Initialize AgentOps with default tags
 agentops.init(default_tags=['crewai', 'agentstack'])
 
-# Configure logging
+# Configure logging (LOG_PROFILE=production for JSON logs and quiet agents)
+configure_logging()
+
+DEFAULT_INPUTS = {"diagnosis_text": "Lower Back Pain, Osteoarthritis, Fibromyalgia"}
+
 def run():
     logging.info("Starting the crew...")
+    route_state = routing.RunRouting("main")
+    checkpoints = CheckpointStore.from_env()
+    checkpoint = None
     try:
-        result = AstackcrewCrew().crew().kickoff(
-            inputs={"diagnosis_text": "Lower Back Pain, Osteoarthritis, Fibromyalgia"}
-        )
+        with routing.bind(route_state), tools.reference_data.pin(None) as dataset:
+            crew = AstackcrewCrew().crew()
+            # Subtasks finished by an earlier, failed run of the same diagnosis are not run again
+            checkpoint = checkpoints.open(DEFAULT_INPUTS["diagnosis_text"], dataset.data_key, "crew") if checkpoints else None
+            if checkpoint is not None:
+                restored = checkpoint.attach(crew)
+                if restored:
+                    logging.info(f"Resuming from checkpoint after {', '.join(o.name for o in restored)}")
+            result = crew.kickoff(inputs=DEFAULT_INPUTS)
+        if checkpoint is not None:
+            checkpoint.discard()
         logging.info(f"Crew execution result: {result}")
+        logging.info(f"Model routing: {routing.metrics.record(route_state)}")
     except Exception as e:
         logging.error(f"An error occurred during crew execution: {e}")
+        if checkpoint is not None:
+            checkpoint.fail()
         raise
 
     # Example 2: General Symptoms
@@ -32,11 +54,10 @@ def run():
 def train():
     """
     Train the crew for a given number of iterations.
+    Usage: train <n_iterations> <filename>
     """
-    inputs = {
-    }
     try:
-        CptcrewCrew().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
+        AstackcrewCrew().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=DEFAULT_INPUTS)
 
     except Exception as e:
         raise Exception(f"An error occurred while training the crew: {e}")
@@ -45,9 +66,12 @@ def train():
 def replay():
     """
     Replay the crew execution from a specific task.
+    Usage: replay <task_id> (task ids of the latest kickoff: `crewai log-tasks-outputs`)
+    Earlier tasks are not run again; their outputs from that kickoff are reused.
     """
     try:
-        CptcrewCrew().crew().replay(task_id=sys.argv[1])
+        with routing.bind(routing.RunRouting("replay")):
+            AstackcrewCrew().crew().replay(task_id=sys.argv[1])
 
     except Exception as e:
         raise Exception(f"An error occurred while replaying the crew: {e}")
@@ -56,11 +80,10 @@ def replay():
 def test():
     """
     Test the crew execution and returns the results.
+    Usage: test <n_iterations> <openai_model_name>
     """
-    inputs = {
-    }
     try:
-        CptcrewCrew().crew().test(n_iterations=int(sys.argv[1]), openai_model_name=sys.argv[2], inputs=inputs)
+        AstackcrewCrew().crew().test(n_iterations=int(sys.argv[1]), openai_model_name=sys.argv[2], inputs=DEFAULT_INPUTS)
 
     except Exception as e:
         raise Exception(f"An error occurred while testing the crew: {e}") 
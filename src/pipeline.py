@@ -0,0 +1,152 @@
+# src/pipeline.py
+"""
+Speculative validation pipeline (run mode "pipeline").
+
+The crew validates codes only after the medical coder has produced its whole
+answer, and the validation agent then spends LLM round trips calling the
+ICD-10 tool code by code. In pipeline mode the suggestion completion is
+streamed instead, and each suggested code is validated against the local
+ICD-10 index the moment it has been parsed, while the model is still
+generating the rest. The validated results are handed to the reporting agent
+as structured JSON, so only the report needs an agent.
+
+With a model route for the suggestion tool (config/routes.yaml), the cheap
+model streams first; if any of its codes validates with low confidence, the
+escalation model streams a fresh set, which replaces the first one. The
+cheap model's "validated_code" partials have already been sent by then, so a
+"superseded_codes" partial tells clients to drop them.
+
+SpeculativePipeline behaves like a crew for the API: it has `task_callback`
+and `kickoff(inputs)`, and reports the same subtask names.
+"""
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from crewai import Crew
+
+import tools
+from cancellation import check_cancelled
+from routing import current_run
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStep(NamedTuple):
+    """Subtask result passed to `task_callback` (same attributes crewai's TaskOutput offers)."""
+    name: str
+    raw: str
+    json_dict: Optional[Dict[str, Any]]
+
+
+class PipelineOutput(NamedTuple):
+    """Result of a pipeline run; `raw` is the report, like CrewOutput.raw."""
+    raw: str
+    suggestions: Dict[str, Any]
+    validated_codes: List[Dict[str, Any]]
+    timings: Dict[str, float]
+
+
+class SpeculativePipeline:
+    """Stream suggestions, validate each code as it arrives, then report."""
+
+    def __init__(self, reporting_crew: Crew, suggestion_tool=None, validation_tool=None):
+        """
+        Args:
+            reporting_crew: Crew with the single report task; its description
+                receives {diagnosis_text} and {validated_codes}
+            suggestion_tool: Gpt4SuggestionTool (default: tools.gpt4_suggestion_tool)
+            validation_tool: ICD10DatabaseTool (default: tools.icd10_database_tool)
+        """
+        self.reporting_crew = reporting_crew
+        self.suggestion_tool = suggestion_tool or tools.gpt4_suggestion_tool
+        self.validation_tool = validation_tool or tools.icd10_database_tool
+        self.task_callback: Optional[Callable[[Any], None]] = None
+
+    def _emit(self, name: str, payload: Any) -> None:
+        if self.task_callback is not None:
+            self.task_callback(PipelineStep(name, json.dumps(payload), payload if isinstance(payload, dict) else None))
+
+    def validate(self, suggestion: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate one suggested code with the ICD-10 tool; errors become part of the record."""
+        try:
+            validation = self.validation_tool._run(suggestion.get("code"), suggestion.get("description"))
+        except ValueError as e:
+            validation = {"valid": False, "code": suggestion.get("code"), "note": str(e)}
+        return {
+            "suggested_code": suggestion.get("code"),
+            "suggested_description": suggestion.get("description"),
+            "validation": validation,
+        }
+
+    def kickoff(self, inputs: Dict[str, Any]) -> PipelineOutput:
+        """
+        Run the pipeline for `inputs["diagnosis_text"]`.
+
+        Partials: one "validated_code" step per code as it is validated. On
+        escalation a "superseded_codes" step follows the cheap model's codes
+        (which clients should discard), and the escalated retry's codes are
+        marked "escalated". Then "medical_diagnosis_task" (the full suggestion
+        response), "validation_task" (all validated codes) and "reporting_task".
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        validated: List[Dict[str, Any]] = []
+        escalated = False
+
+        def on_suggestion(suggestion: Dict[str, Any]) -> None:
+            check_cancelled()
+            record = self.validate(suggestion)
+            if escalated:
+                record["escalated"] = True
+            validated.append(record)
+            timings.setdefault("first_validated_code_s", time.perf_counter() - start)
+            self._emit("validated_code", record)
+
+        diagnosis = inputs["diagnosis_text"]
+        route = getattr(self.suggestion_tool, "route", None)
+        try:
+            suggestions = self.suggestion_tool.stream_suggestions(diagnosis, on_suggestion)
+            reason = "low-confidence suggestion(s)"
+            escalated = route is not None and route.needs_escalation([r["validation"] for r in validated])
+        except Exception as e:
+            if route is None or not route.escalate_to:
+                raise
+            reason, escalated = f"{route.model} failed: {e}", True
+        if escalated:
+            # The cheap model's codes were speculative; the escalated set replaces them
+            run = current_run()
+            run.escalate(route, reason)
+            run.discard_validations()
+            self._emit("superseded_codes", {
+                "superseded": len(validated),
+                "codes": [record["suggested_code"] for record in validated],
+                "model": route.model,
+                "escalated_to": route.escalate_to,
+                "reason": reason,
+            })
+            validated.clear()
+            timings["escalated_after_s"] = time.perf_counter() - start
+            suggestions = self.suggestion_tool.stream_suggestions(
+                diagnosis, on_suggestion, model=route.escalate_to, escalated=True
+            )
+        timings["suggestions_s"] = time.perf_counter() - start
+        self._emit("medical_diagnosis_task", suggestions)
+        self._emit("validation_task", {"validated_codes": validated})
+
+        check_cancelled()
+        self.reporting_crew.task_callback = self.task_callback
+        report = self.reporting_crew.kickoff(inputs={
+            **inputs,
+            "validated_codes": json.dumps({
+                "icd10_suggestions": validated,
+                "explanation": suggestions.get("explanation"),
+            }, indent=2),
+        })
+        timings["total_s"] = time.perf_counter() - start
+        logger.info(
+            "Pipeline validated %d codes, first after %.2fs, report after %.2fs",
+            len(validated), timings.get("first_validated_code_s", float("nan")), timings["total_s"],
+        )
+        return PipelineOutput(getattr(report, "raw", str(report)), suggestions, validated, timings)
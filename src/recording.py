@@ -0,0 +1,389 @@
+# src/recording.py
+"""
+Record/replay harness for deterministic offline crew runs.
+
+In record mode every LLM call (litellm.completion, used by both crewai agents and
+Gpt4SuggestionTool) and every tool call is captured, together with the final crew
+output, into a compact gzip-compressed JSON-lines file. In replay mode the same
+calls are answered from that file, so a whole AstackcrewCrew run completes
+offline in milliseconds with identical output. That isolates the non-LLM overhead
+(crew orchestration, validation, parsing) for profiling and lets large regression
+corpora run without Azure access.
+
+Streamed completions (`stream=True`, as in RUN_MODE=pipeline) are recorded chunk
+by chunk as the caller reads them and replayed as an iterator of the same chunks.
+A stream the caller stopped reading early (a cancelled run) is recorded, and
+replayed, only up to where it was read.
+
+Usage:
+    python src/recording.py record "Lower Back Pain, Osteoarthritis" -o run.jsonl.gz [--mode pipeline]
+    python src/recording.py replay run.jsonl.gz [--repeat 20] [--profile] [--live-tool icd10_database_tool]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "crew-recording"
+FORMAT_VERSION = 1
+
+LLM = "llm"
+TOOL = "tool"
+STREAM = "stream_chunks"  # response key of a recorded streamed completion
+
+
+class ReplayMissError(LookupError):
+    """Raised in strict replay when a call has no recorded response."""
+
+
+def request_key(kind: str, name: str, payload: Dict[str, Any]) -> str:
+    """Stable hash of a call, used to match replayed requests to recorded ones."""
+    canonical = json.dumps([kind, name, payload], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:24]
+
+
+class Recording:
+    """
+    In-memory recording of one crew run plus its compact on-disk format.
+
+    Entries keep call order; replay matches by request key first and falls back
+    to call order per (kind, name) when a prompt has drifted.
+    """
+
+    def __init__(self, inputs: Optional[Dict[str, Any]] = None, mode: str = "crew"):
+        self.inputs = inputs or {}
+        self.mode = mode
+        self.final_output: Optional[str] = None
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Deque[Any]] = {}
+        self._by_sequence: Dict[Tuple[str, str], Deque[Any]] = {}
+        self.stats = {"served": 0, "fallbacks": 0, "misses": 0}
+
+    # --------------------------------------------------------------------------
+    # Recording
+    # --------------------------------------------------------------------------
+    def add(self, kind: str, name: str, key: str, response: Any, elapsed: float) -> None:
+        with self._lock:
+            self.entries.append({
+                "kind": kind,
+                "name": name,
+                "key": key,
+                "elapsed_ms": round(elapsed * 1000, 2),
+                "response": response,
+            })
+
+    def save(self, path: str) -> None:
+        header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "inputs": self.inputs,
+            "mode": self.mode,
+            "final_output": self.final_output,
+            "entries": len(self.entries),
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header, separators=(",", ":"), default=str) + "\n")
+            for entry in self.entries:
+                f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != FORMAT_NAME:
+                raise ValueError(f"{path} is not a crew recording")
+            recording = cls(inputs=header.get("inputs"), mode=header.get("mode", "crew"))
+            recording.final_output = header.get("final_output")
+            recording.entries = [json.loads(line) for line in f if line.strip()]
+        recording.rewind()
+        return recording
+
+    # --------------------------------------------------------------------------
+    # Replay
+    # --------------------------------------------------------------------------
+    def rewind(self) -> None:
+        """Reset replay cursors so the recording can be served again."""
+        by_key: Dict[str, Deque[Any]] = defaultdict(deque)
+        by_sequence: Dict[Tuple[str, str], Deque[Any]] = defaultdict(deque)
+        for entry in self.entries:
+            by_key[entry["key"]].append(entry)
+            by_sequence[(entry["kind"], entry["name"])].append(entry)
+        with self._lock:
+            self._by_key = by_key
+            self._by_sequence = by_sequence
+            self.stats = {"served": 0, "fallbacks": 0, "misses": 0}
+
+    def serve(self, kind: str, name: str, key: str, strict: bool = False) -> Any:
+        """Return the recorded response for a call, consuming it."""
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._discard(self._by_sequence[(kind, name)], entry)
+                self.stats["served"] += 1
+                return entry["response"]
+
+            sequence = self._by_sequence.get((kind, name))
+            if not strict and sequence:
+                entry = sequence.popleft()
+                self._discard(self._by_key[entry["key"]], entry)
+                self.stats["served"] += 1
+                self.stats["fallbacks"] += 1
+                logger.warning("Replay: no exact match for %s '%s', serving next recorded response", kind, name)
+                return entry["response"]
+
+            self.stats["misses"] += 1
+        raise ReplayMissError(f"No recorded response for {kind} '{name}' (key {key})")
+
+    @staticmethod
+    def _discard(queue: Deque[Any], entry: Dict[str, Any]) -> None:
+        for i, candidate in enumerate(queue):
+            if candidate is entry:
+                del queue[i]
+                return
+
+
+def _dump(response: Any) -> Dict[str, Any]:
+    return response.model_dump() if hasattr(response, "model_dump") else dict(response)
+
+
+class CrewRecorder:
+    """
+    Context manager that records or replays LLM and tool calls of crew runs.
+
+    Patches litellm.completion (and the name imported into the Gpt4SuggestionTool
+    module) and the `_run` method of every tool class in the `tools` package.
+
+    Args:
+        recording: Recording to fill (record) or serve from (replay)
+        mode: "record" or "replay"
+        live_tools: Tool names that still execute for real during replay
+        strict: Fail on calls without an exact recorded match instead of falling back to call order
+    """
+
+    def __init__(self, recording: Recording, mode: str = "record",
+                 live_tools: Iterable[str] = (), strict: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.recording = recording
+        self.mode = mode
+        self.live_tools = set(live_tools)
+        self.strict = strict
+        self._patches: List[Tuple[Any, str, Any]] = []
+
+    def __enter__(self) -> "CrewRecorder":
+        import importlib
+        import litellm
+        import tools
+
+        # `tools.gpt4_suggestion_tool` is the tool instance, so fetch the module explicitly
+        suggestion_module = importlib.import_module("tools.gpt4_suggestion_tool")
+
+        original_completion = litellm.completion
+        wrapped = self._wrap_completion(original_completion)
+        self._patch(litellm, "completion", wrapped)
+        self._patch(suggestion_module, "completion", wrapped)
+
+        seen = set()
+        for value in vars(tools).values():
+            tool_class = type(value)
+            if isinstance(value, type) or tool_class in seen:
+                continue
+            if hasattr(value, "_run") and hasattr(value, "name"):
+                seen.add(tool_class)
+                self._patch(tool_class, "_run", self._wrap_tool(tool_class._run))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        while self._patches:
+            target, attribute, original = self._patches.pop()
+            setattr(target, attribute, original)
+
+    def _patch(self, target: Any, attribute: str, replacement: Any) -> None:
+        self._patches.append((target, attribute, getattr(target, attribute)))
+        setattr(target, attribute, replacement)
+
+    def _wrap_completion(self, original: Callable) -> Callable:
+        recorder = self
+
+        def completion(*args, **kwargs):
+            import litellm
+
+            payload = {
+                "model": kwargs.get("model", args[0] if args else None),
+                "messages": kwargs.get("messages", args[1] if len(args) > 1 else None),
+                "tools": kwargs.get("tools"),
+                "response_format": kwargs.get("response_format"),
+                "temperature": kwargs.get("temperature"),
+                "stop": kwargs.get("stop"),
+            }
+            stream = bool(kwargs.get("stream"))
+            if stream:
+                payload["stream"] = True  # only when set, so keys of earlier recordings still match
+            name = str(payload["model"])
+            key = request_key(LLM, name, payload)
+
+            if recorder.mode == "replay":
+                data = recorder.recording.serve(LLM, name, key, strict=recorder.strict)
+                if STREAM in data:
+                    return iter([litellm.ModelResponse(stream=True, **chunk) for chunk in data[STREAM]])
+                return litellm.ModelResponse(**data)
+
+            start = time.perf_counter()
+            response = original(*args, **kwargs)
+            if stream:
+                return recorder._record_stream(name, key, response, start)
+            recorder.recording.add(LLM, name, key, _dump(response), time.perf_counter() - start)
+            return response
+
+        return completion
+
+    def _record_stream(self, name: str, key: str, response: Iterable[Any], start: float) -> Iterator[Any]:
+        """Pass the chunks of a streamed completion through, recording them once the caller is done."""
+        chunks = []
+        try:
+            for chunk in response:
+                chunks.append(_dump(chunk))
+                yield chunk
+        finally:
+            self.recording.add(LLM, name, key, {STREAM: chunks}, time.perf_counter() - start)
+
+    def _wrap_tool(self, original: Callable) -> Callable:
+        recorder = self
+
+        def _run(tool_self, *args, **kwargs):
+            name = getattr(tool_self, "name", type(tool_self).__name__)
+            key = request_key(TOOL, name, {"args": list(args), "kwargs": kwargs})
+
+            if recorder.mode == "replay" and name not in recorder.live_tools:
+                return recorder.recording.serve(TOOL, name, key, strict=recorder.strict)
+
+            start = time.perf_counter()
+            result = original(tool_self, *args, **kwargs)
+            if recorder.mode == "record":
+                recorder.recording.add(TOOL, name, key, result, time.perf_counter() - start)
+            return result
+
+        return _run
+
+
+# ------------------------------------------------------------------------------
+# Entry points
+# ------------------------------------------------------------------------------
+def _offline_env() -> None:
+    """Keep replays offline: placeholder Azure settings, no crewai telemetry."""
+    for var in ("AZURE_API_KEY", "AZURE_API_BASE", "AZURE_API_VERSION"):
+        os.environ.setdefault(var, "replay")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+
+def run_crew(inputs: Dict[str, Any], mode: str = "crew") -> str:
+    """Run the crew, or the speculative pipeline for mode "pipeline" (like RUN_MODE)."""
+    from crew import AstackcrewCrew
+
+    crew = AstackcrewCrew().pipeline() if mode == "pipeline" else AstackcrewCrew().crew()
+    result = crew.kickoff(inputs=inputs)
+    return getattr(result, "raw", str(result))
+
+
+def record_run(inputs: Dict[str, Any], path: str, mode: str = "crew") -> Recording:
+    """Run the crew (or pipeline) live and save every LLM/tool exchange to `path`."""
+    recording = Recording(inputs=inputs, mode=mode)
+    with CrewRecorder(recording, mode="record"):
+        recording.final_output = run_crew(inputs, mode)
+    recording.save(path)
+    logger.info("Recorded %d calls to %s", len(recording.entries), path)
+    return recording
+
+
+def replay_run(path_or_recording: Any, live_tools: Iterable[str] = (), strict: bool = False) -> Dict[str, Any]:
+    """
+    Replay a recorded run offline.
+
+    Returns:
+        {
+            "output": str,
+            "identical": bool,    # output equals the recorded final output
+            "elapsed_ms": float,
+            "stats": Dict         # served / fallbacks / misses
+        }
+    """
+    _offline_env()
+    recording = path_or_recording
+    if not isinstance(recording, Recording):
+        recording = Recording.load(path_or_recording)
+    recording.rewind()
+
+    start = time.perf_counter()
+    with CrewRecorder(recording, mode="replay", live_tools=live_tools, strict=strict):
+        output = run_crew(recording.inputs, recording.mode)
+    return {
+        "output": output,
+        "identical": output == recording.final_output,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+        "stats": dict(recording.stats),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record or replay crew runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Run the crew live and record every LLM/tool call")
+    record.add_argument("diagnosis_text")
+    record.add_argument("-o", "--output", required=True, help="Recording file (.jsonl.gz)")
+    record.add_argument("--mode", choices=("crew", "pipeline"), default="crew",
+                        help="Run the crew or the streaming pipeline (RUN_MODE)")
+
+    replay = sub.add_parser("replay", help="Replay a recording offline")
+    replay.add_argument("recording")
+    replay.add_argument("--repeat", type=int, default=1, help="Replay N times (for profiling)")
+    replay.add_argument("--live-tool", action="append", default=[], help="Tool to execute for real")
+    replay.add_argument("--strict", action="store_true", help="Fail on any unmatched call")
+    replay.add_argument("--profile", action="store_true", help="Print cProfile stats of the replays")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "record":
+        recording = record_run({"diagnosis_text": args.diagnosis_text}, args.output, args.mode)
+        print(json.dumps({"output": args.output, "calls": len(recording.entries)}))
+        return 0
+
+    recording = Recording.load(args.recording)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    runs = [replay_run(recording, args.live_tool, args.strict) for _ in range(args.repeat)]
+    if profiler:
+        import pstats
+        profiler.disable()
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+
+    print(json.dumps({
+        "runs": len(runs),
+        "identical": all(run["identical"] for run in runs),
+        "elapsed_ms": [round(run["elapsed_ms"], 2) for run in runs],
+        "stats": runs[-1]["stats"],
+    }, indent=2))
+    return 0 if all(run["identical"] for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# src/routing.py
+"""
+Adaptive model routing: a cheaper deployment first, gpt-4o on low confidence.
+
+Routes are configured per agent or tool in src/config/routes.yaml (or the
+file named by MODEL_ROUTES_FILE):
+
+    reporting_agent:
+      model: azure/gpt-4o-mini      # tried first
+      escalate_to: azure/gpt-4o     # used once confidence is low
+      min_similarity: 0.6           # description similarity below this is low confidence
+
+A run escalates a route when ICD10DatabaseTool finds an invalid code, or a
+description whose similarity to the WHO description is below the route's
+`min_similarity`, or when the cheap model's call fails. Agents and tools
+without a route keep their configured model. MODEL_ROUTING=false turns
+routing off.
+
+Every run gets a RunRouting bound to its context (like the cancel token in
+cancellation.py), which collects the validation outcomes and the model calls
+of that run; `metrics` aggregates finished runs into escalation rate,
+latency and cost per request.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+import yaml
+from crewai import LLM
+from litellm import cost_per_token
+
+logger = logging.getLogger(__name__)
+
+ROUTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "routes.yaml")
+DEFAULT_MIN_SIMILARITY = 0.6  # ICD10DatabaseTool calls descriptions above this "similar"
+
+
+# ------------------------------------------------------------------------------
+# Routes
+# ------------------------------------------------------------------------------
+class Route(NamedTuple):
+    """Models for one agent or tool: `model` first, `escalate_to` on low confidence."""
+    name: str
+    model: str
+    escalate_to: Optional[str] = None
+    min_similarity: float = DEFAULT_MIN_SIMILARITY
+
+    def is_low_confidence(self, validation: Dict[str, Any]) -> bool:
+        """An ICD10DatabaseTool result is low confidence if invalid or poorly matching its description."""
+        if not validation.get("valid"):
+            return True
+        similarity = validation.get("similarity_score")
+        return similarity is not None and similarity < self.min_similarity
+
+    def needs_escalation(self, validations: List[Dict[str, Any]]) -> bool:
+        """Escalate when nothing validated or any validation is low confidence."""
+        return bool(self.escalate_to) and (not validations or any(map(self.is_low_confidence, validations)))
+
+
+def load_routes(path: Optional[str] = None) -> Dict[str, Route]:
+    """Routes from routes.yaml; empty if MODEL_ROUTING is off or the file is missing."""
+    if os.getenv("MODEL_ROUTING", "true").lower() not in ("1", "true", "yes"):
+        return {}
+    path = path or os.getenv("MODEL_ROUTES_FILE", ROUTES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    return {
+        name: Route(
+            name=name,
+            model=entry["model"],
+            escalate_to=entry.get("escalate_to"),
+            min_similarity=float(entry.get("min_similarity", DEFAULT_MIN_SIMILARITY)),
+        )
+        for name, entry in config.items()
+    }
+
+
+routes: Dict[str, Route] = load_routes()
+
+
+def route_for(name: str) -> Optional[Route]:
+    return routes.get(name)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) where the provider's usage is not available."""
+    return max(1, len(text or "") // 4)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD cost from litellm's price table; None for deployments it does not know."""
+    try:
+        prompt_cost, completion_cost = cost_per_token(
+            model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+    except Exception:
+        return None
+    return prompt_cost + completion_cost
+
+
+# ------------------------------------------------------------------------------
+# Per-run state
+# ------------------------------------------------------------------------------
+class ModelCall(NamedTuple):
+    """One LLM call made on behalf of a route."""
+    route: str
+    model: str
+    latency_s: float
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: Optional[float]
+    escalated: bool
+    failed: bool = False
+
+
+class RunRouting:
+    """Validation outcomes, escalations and model calls of one crew run."""
+
+    def __init__(self, task_id: Optional[str] = None):
+        self.task_id = task_id
+        self.started_at = time.perf_counter()
+        self.validations: List[Dict[str, Any]] = []
+        self.escalations: Dict[str, str] = {}  # route -> reason
+        self.calls: List[ModelCall] = []
+        self._lock = threading.Lock()
+
+    def observe_validation(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.validations.append(result)
+
+    def discard_validations(self) -> None:
+        """Forget validations of results that were superseded (e.g. by an escalated retry)."""
+        with self._lock:
+            self.validations = []
+
+    def should_escalate(self, route: Route) -> bool:
+        """Whether calls on `route` should use its escalation model from now on."""
+        if route.name in self.escalations:
+            return True
+        with self._lock:
+            low = [v for v in self.validations if route.is_low_confidence(v)]
+        if low and route.escalate_to:
+            self.escalate(route, f"{len(low)} low-confidence validation(s)")
+            return True
+        return False
+
+    def escalate(self, route: Route, reason: str) -> None:
+        if route.name not in self.escalations:
+            self.escalations[route.name] = reason
+            logger.info("[%s] Escalating %s to %s: %s", self.task_id, route.name, route.escalate_to, reason)
+
+    def record_call(self, call: ModelCall) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self.calls)
+        costs = [c.cost_usd for c in calls if c.cost_usd is not None]
+        return {
+            "escalated": bool(self.escalations),
+            "escalations": dict(self.escalations),
+            "calls": len(calls),
+            "calls_by_model": {model: sum(1 for c in calls if c.model == model) for model in {c.model for c in calls}},
+            "llm_latency_s": sum(c.latency_s for c in calls),
+            "latency_s": time.perf_counter() - self.started_at,
+            "cost_usd": sum(costs),
+            "unpriced_calls": len(calls) - len(costs),
+        }
+
+
+# Routing state of the run executing in the current context (copied into asyncio.to_thread workers)
+_current: ContextVar[Optional[RunRouting]] = ContextVar("run_routing", default=None)
+
+
+@contextmanager
+def bind(state: Optional[RunRouting]) -> Iterator[Optional[RunRouting]]:
+    """Make `state` the current run's routing state for the duration of the block."""
+    reset = _current.set(state)
+    try:
+        yield state
+    finally:
+        _current.reset(reset)
+
+
+def current_run() -> RunRouting:
+    """The bound run's state; outside runs a throwaway one, so calls are routed but not aggregated."""
+    return _current.get() or RunRouting()
+
+
+def observe_validation(result: Dict[str, Any]) -> None:
+    """Report an ICD10DatabaseTool result to the current run; a no-op outside runs."""
+    state = _current.get()
+    if state is not None:
+        state.observe_validation(result)
+
+
+# ------------------------------------------------------------------------------
+# Routed agent LLM
+# ------------------------------------------------------------------------------
+class RoutedLLM(LLM):
+    """
+    crewai LLM that calls the route's cheap model until the run escalates.
+
+    A failed cheap call is retried once on the escalation model, so a missing
+    cheap deployment degrades to the previous behaviour instead of failing.
+    """
+
+    def __init__(self, route: Route, **kwargs):
+        super().__init__(model=route.model, **kwargs)
+        self.route = route
+
+    def _with_model(self, model: str) -> LLM:
+        llm = copy.copy(self)
+        llm.model = model
+        return llm
+
+    def _call(self, state: RunRouting, model: str, messages, callbacks, escalated: bool) -> str:
+        start = time.perf_counter()
+        prompt_tokens = estimate_tokens(" ".join(str(m.get("content", "")) for m in messages))
+        try:
+            text = LLM.call(self._with_model(model), messages, callbacks)
+        except Exception:
+            state.record_call(ModelCall(self.route.name, model, time.perf_counter() - start,
+                                        prompt_tokens, 0, None, escalated, failed=True))
+            raise
+        completion_tokens = estimate_tokens(text)
+        state.record_call(ModelCall(self.route.name, model, time.perf_counter() - start, prompt_tokens,
+                                    completion_tokens, estimate_cost(model, prompt_tokens, completion_tokens),
+                                    escalated))
+        return text
+
+    def call(self, messages: List[Dict[str, str]], callbacks: List[Any] = []) -> str:
+        state = current_run()
+        if self.route.escalate_to and state.should_escalate(self.route):
+            return self._call(state, self.route.escalate_to, messages, callbacks, escalated=True)
+        try:
+            return self._call(state, self.route.model, messages, callbacks, escalated=False)
+        except Exception as e:
+            if not self.route.escalate_to:
+                raise
+            state.escalate(self.route, f"{self.route.model} failed: {e}")
+            return self._call(state, self.route.escalate_to, messages, callbacks, escalated=True)
+
+
+def routed_llm(name: str, default: Any) -> Any:
+    """
+    LLM for an agent: a RoutedLLM for its route, else `default` (its agents.yaml
+    llm), metered through a route without escalation so every call is costed.
+    """
+    route = route_for(name)
+    if route is None and isinstance(default, str):
+        route = Route(name=name, model=default)
+    return RoutedLLM(route) if route else default
+
+
+# ------------------------------------------------------------------------------
+# Aggregated metrics
+# ------------------------------------------------------------------------------
+class RoutingMetrics:
+    """Escalation rate, latency and cost per request over finished runs (recent latencies bounded)."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.escalated_requests = 0
+        self.escalations_by_route: Dict[str, int] = {}
+        self.calls_by_model: Dict[str, int] = {}
+        self.cost_usd = 0.0
+        self.unpriced_calls = 0
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, state: RunRouting) -> Dict[str, Any]:
+        """Add a finished run; returns its summary."""
+        summary = state.summary()
+        with self._lock:
+            self.requests += 1
+            self.escalated_requests += summary["escalated"]
+            for route in summary["escalations"]:
+                self.escalations_by_route[route] = self.escalations_by_route.get(route, 0) + 1
+            for model, count in summary["calls_by_model"].items():
+                self.calls_by_model[model] = self.calls_by_model.get(model, 0) + count
+            self.cost_usd += summary["cost_usd"]
+            self.unpriced_calls += summary["unpriced_calls"]
+            self._latencies.append((summary["latency_s"], summary["llm_latency_s"]))
+        return summary
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(total for total, _ in self._latencies)
+            llm_latency = [llm for _, llm in self._latencies]
+            requests = self.requests
+            return {
+                "routes": {name: route._asdict() for name, route in routes.items()},
+                "requests": requests,
+                "escalated_requests": self.escalated_requests,
+                "escalation_rate": self.escalated_requests / requests if requests else 0.0,
+                "escalations_by_route": dict(self.escalations_by_route),
+                "calls_by_model": dict(self.calls_by_model),
+                "latency_s": {
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+                    "mean_llm": sum(llm_latency) / len(llm_latency) if llm_latency else None,
+                },
+                "cost_usd": {
+                    "total": self.cost_usd,
+                    "per_request": self.cost_usd / requests if requests else None,
+                },
+                "unpriced_calls": self.unpriced_calls,
+            }
+
+
+metrics = RoutingMetrics()
@@ -0,0 +1,403 @@
+# src/semantic_cache.py
+"""
+Persistent semantic cache of diagnosis text -> validated crew result.
+
+Exact-text caching misses near-duplicates (case, punctuation, reordered
+phrase lists, plurals, common abbreviations). Here each word is reduced to a
+canonical form (plurals singularized, "lower" -> "low", roman numerals ->
+digits, "lt"/"rt"/"htn" spelled out, "of"/"the"/"with" dropped), each text is
+embedded locally as hashed character trigrams of those words (no model, no
+network) and candidates are found by cosine similarity in a brute-force NumPy
+index.
+
+A candidate above the whole-text threshold is only served if the two texts
+list the same diagnoses: they must split into the same number of phrases (at
+commas, semicolons and line breaks), and every phrase must pair with a
+distinct phrase of the other text at a much higher similarity (default 0.95).
+So "osteoarthritis of knee" never gets the report for "osteoarthritis of
+hip", and a list with one diagnosis more or less never gets the other list's
+codes. Phrases that differ in numbers, laterality, negation or opposite
+prefixes ("type 1" / "type 2", "left" / "right", "hypertension" /
+"hypotension") never pair, however similar they look. In practice a hit needs
+the same canonical words: "Lower Back Pain", "low back pains" and "hip
+osteoarthritis" hit "low back pain" and "osteoarthritis of hip", while
+misspellings, synonyms and rewordings ("lumbago", "backache") miss and run the
+crew, because at a lower phrase threshold one-word differences such as
+"upper" / "lower lobe" (0.92-0.94) would pair.
+
+Only completed runs whose report contains codes are stored, keyed by the
+ICD-10 reference version they were validated against. The cache is off unless
+SEMANTIC_CACHE is set, and holds diagnosis texts in memory only unless
+SEMANTIC_CACHE_PATH names a file for them.
+
+With a path, entries are appended to that JSONL file and replayed on start;
+the file is compacted when it has grown to twice the cache size. The cache
+holds at most `max_entries`, evicting the least recently used.
+
+`report()` describes hit quality: hit rate, similarity of recent hits, and a
+calibration table built from fresh runs, namely how far the codes of a new
+result agree with its nearest cached neighbour at each similarity. If
+agreement is poor just above the threshold, raise the threshold.
+
+Configuration (environment variables):
+    SEMANTIC_CACHE                      "true" enables the cache (default: false)
+    SEMANTIC_CACHE_PATH                 JSONL file to persist entries to (default: none, in memory)
+    SEMANTIC_CACHE_THRESHOLD            Minimum whole-text cosine similarity of a candidate (default: 0.8)
+    SEMANTIC_CACHE_PHRASE_THRESHOLD     Minimum similarity of each paired phrase (default: 0.95)
+    SEMANTIC_CACHE_SIZE                 Maximum entries (default: 1000)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 2 ** 11
+NGRAM = 3
+RECENT_HITS = 1000  # hit similarities kept for the report
+
+_NON_WORD = re.compile(r"[^\w]+")
+_PHRASE_SEPARATORS = re.compile(r"[,;\n]+")
+# Words that change the meaning of an otherwise similar diagnosis
+_DISCRIMINATING = frozenset({
+    "left", "right", "bilateral", "unilateral",
+    "no", "not", "non", "without", "negative", "positive",
+    "acute", "chronic",
+})
+# Prefixes with opposite meanings that n-grams cannot tell apart (hyper-/hypo-tension)
+_DISCRIMINATING_PREFIXES = ("hyper", "hypo", "tachy", "brady", "poly", "oligo", "hemi", "para", "quadri")
+# Abbreviations and variants -> canonical words (roman numerals become numbers, so they discriminate)
+_CANONICAL = {
+    "lower": ("low",), "i": ("1",), "ii": ("2",), "iii": ("3",), "iv": ("4",),
+    "lt": ("left",), "rt": ("right",), "bilat": ("bilateral",), "htn": ("hypertension",),
+}
+_STOPWORDS = frozenset({"a", "an", "the", "of", "with"})
+_CALIBRATION_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0)
+
+
+# ------------------------------------------------------------------------------
+# Vectorizer
+# ------------------------------------------------------------------------------
+def normalize_text(text: str) -> str:
+    """Casefold and reduce punctuation/whitespace to single spaces."""
+    return " ".join(_NON_WORD.sub(" ", text.casefold()).split())
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or not word.endswith("s") or word.endswith(("ss", "us", "is")):
+        return word
+    return word[:-3] + "y" if word.endswith("ies") else word[:-1]
+
+
+def canonical_words(normalized: str) -> List[str]:
+    """Words of a normalized text with plurals, abbreviations and stopwords canonicalized."""
+    words = []
+    for word in normalized.split():
+        if word in _STOPWORDS:
+            continue
+        words.extend(_CANONICAL.get(word, (_singular(word),)))
+    return words
+
+
+def discriminating_tokens(normalized: str) -> FrozenSet[str]:
+    """Numbers, meaning-changing words and prefixes, which must be identical for a hit."""
+    tokens = set()
+    for word in canonical_words(normalized):
+        if word.isdigit() or word in _DISCRIMINATING:
+            tokens.add(word)
+        tokens.update(prefix + "-" for prefix in _DISCRIMINATING_PREFIXES if word.startswith(prefix))
+    return frozenset(tokens)
+
+
+def split_phrases(text: str) -> List[str]:
+    """Normalized diagnoses of a comma/semicolon/line separated list."""
+    return [phrase for phrase in map(normalize_text, _PHRASE_SEPARATORS.split(text)) if phrase]
+
+
+def phrases_match(phrases: List[str], other: List[str], threshold: float) -> bool:
+    """Whether both lists have the same diagnoses: each phrase pairs with a distinct, equally discriminated one."""
+    if len(phrases) != len(other):
+        return False
+    remaining = [(embed(phrase), discriminating_tokens(phrase)) for phrase in other]
+    for phrase in phrases:
+        vector, tokens = embed(phrase), discriminating_tokens(phrase)
+        scored = [(float(vector @ v), i) for i, (v, t) in enumerate(remaining) if t == tokens]
+        best = max(scored, default=None)
+        if best is None or best[0] < threshold:
+            return False
+        del remaining[best[1]]
+    return True
+
+
+def _bucket(feature: str) -> int:
+    # crc32 is stable across processes (unlike hash()), so persisted texts re-embed identically
+    return zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+
+
+def embed(normalized: str) -> np.ndarray:
+    """L2-normalized hashed bag of character trigrams of each canonical word (float32)."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for word in canonical_words(normalized):
+        padded = f" {word} "
+        for i in range(max(1, len(padded) - NGRAM + 1)):
+            vector[_bucket(padded[i:i + NGRAM])] += 1.0
+    np.sqrt(vector, out=vector)  # sublinear counts: repeated words don't dominate
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def extract_codes(result: Optional[str]) -> List[str]:
+    """Codes of the report (final_report.diagnoses_report[].codes[]), in order, without duplicates."""
+    if not result:
+        return []
+    start, end = result.find("{"), result.rfind("}")
+    if start == -1 or end <= start:
+        return []
+    try:
+        report = json.loads(result[start:end + 1])
+    except json.JSONDecodeError:
+        return []
+    body = report.get("final_report", report) if isinstance(report, dict) else {}
+    codes = []
+    for diagnosis in body.get("diagnoses_report", []) or []:
+        for entry in diagnosis.get("codes", []) or []:
+            code = str(entry.get("code") or "").strip().upper()
+            if code and code not in codes:
+                codes.append(code)
+    return codes
+
+
+# ------------------------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------------------------
+class CacheEntry(NamedTuple):
+    text: str
+    normalized: str
+    data_version: str
+    result: str
+    codes: List[str]
+    created_at: float
+
+
+class CacheHit(NamedTuple):
+    entry: CacheEntry
+    similarity: float
+
+
+class SemanticCache:
+    """Bounded, persistent nearest-neighbour cache of validated crew results."""
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.8, max_entries: int = 1000,
+                 phrase_threshold: float = 0.95):
+        """
+        Args:
+            path: JSONL file the entries are persisted to; None keeps them in memory only
+            threshold: Minimum whole-text cosine similarity of a candidate
+            max_entries: Entries kept; the least recently used is evicted beyond this
+            phrase_threshold: Minimum similarity of each pair of phrases for a candidate to hit
+        """
+        self.path = path
+        self.threshold = threshold
+        self.phrase_threshold = phrase_threshold
+        self.max_entries = max_entries
+        # key -> entry in LRU order; each entry owns one row of the preallocated index
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._vectors = np.zeros((max_entries, DIMENSIONS), dtype=np.float32)
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * max_entries
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._log_lines = 0
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0, "stores": 0, "evictions": 0}
+        self._hit_similarities: deque = deque(maxlen=RECENT_HITS)
+        # bucket -> [pairs, sum of code agreement]
+        self._calibration: Dict[float, List[float]] = {bucket: [0, 0.0] for bucket in _CALIBRATION_BUCKETS}
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        """The cache configured by SEMANTIC_CACHE_* variables, or None if disabled."""
+        if os.getenv("SEMANTIC_CACHE", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("SEMANTIC_CACHE_PATH") or None,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+            phrase_threshold=float(os.getenv("SEMANTIC_CACHE_PHRASE_THRESHOLD", "0.95")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --------------------------------------------------------------------------
+    # Lookup and store
+    # --------------------------------------------------------------------------
+    def _neighbours(self, vector: np.ndarray, data_version: str, exclude: Optional[Tuple[str, str]] = None):
+        """(similarity, key) of the entries of `data_version`, most similar first."""
+        if not self._rows:
+            return
+        # Brute force: one matrix-vector product over all rows (free rows are zero vectors)
+        similarities = self._vectors @ vector
+        for row in np.argsort(-similarities):
+            key = self._keys[row]
+            if key is not None and key[1] == data_version and key != exclude:
+                yield float(similarities[row]), key
+
+    def _nearest(self, vector: np.ndarray, data_version: str, exclude: Optional[Tuple[str, str]] = None):
+        """(similarity, key) of the most similar entry of `data_version`, else (None, None)."""
+        return next(self._neighbours(vector, data_version, exclude), (None, None))
+
+    def lookup(self, text: str, data_version: str) -> Optional[CacheHit]:
+        """Cached result for a text listing the same diagnoses as `text`, validated against `data_version`."""
+        phrases = split_phrases(text)
+        vector = embed(normalize_text(text))
+        with self._lock:
+            self._stats["lookups"] += 1
+            rejected = False
+            for similarity, key in self._neighbours(vector, data_version):
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[key]
+                if not phrases_match(phrases, split_phrases(entry.text), self.phrase_threshold):
+                    rejected = True
+                    continue
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._hit_similarities.append(similarity)
+                return CacheHit(entry, similarity)
+            self._stats["rejected"] += rejected
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, text: str, data_version: str, result: str) -> bool:
+        """
+        Cache a completed run's report; reports without codes are not cached.
+
+        Returns:
+            True if the result was stored
+        """
+        codes = extract_codes(result)
+        if not codes:
+            return False
+        entry = CacheEntry(text, normalize_text(text), data_version, result, codes, time.time())
+        with self._lock:
+            self._calibrate(entry)
+            self._insert(entry)
+            self._stats["stores"] += 1
+            self._persist(entry)
+        return True
+
+    def _calibrate(self, entry: CacheEntry) -> None:
+        """Record how well the nearest cached neighbour's codes agree with a fresh result."""
+        similarity, key = self._nearest(embed(entry.normalized), entry.data_version,
+                                        exclude=(entry.normalized, entry.data_version))
+        if similarity is None:
+            return
+        for bucket in _CALIBRATION_BUCKETS:
+            if similarity <= bucket:
+                fresh, cached = set(entry.codes), set(self._entries[key].codes)
+                self._calibration[bucket][0] += 1
+                self._calibration[bucket][1] += len(fresh & cached) / len(fresh | cached)
+                return
+
+    def _insert(self, entry: CacheEntry) -> None:
+        key = (entry.normalized, entry.data_version)
+        if key in self._entries:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            return
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+        row = self._keys.index(None)
+        self._entries[key] = entry
+        self._keys[row] = key
+        self._rows[key] = row
+        self._vectors[row] = embed(entry.normalized)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        del self._entries[key]
+        row = self._rows.pop(key)
+        self._keys[row] = None
+        self._vectors[row] = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+            self._log_lines = 0
+
+    # --------------------------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------------------------
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                self._log_lines += 1
+                try:
+                    entry = CacheEntry(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    logger.warning("Skipping unreadable semantic cache line in %s", self.path)
+                    continue
+                self._insert(entry)
+        logger.info("Loaded %d semantic cache entries from %s", len(self._entries), self.path)
+
+    def _persist(self, entry: CacheEntry) -> None:
+        if not self.path:
+            return
+        if self._log_lines >= 2 * self.max_entries:
+            self._compact()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry._asdict()) + "\n")
+        self._log_lines += 1
+
+    def _compact(self) -> None:
+        """Rewrite the log with the live entries only (oldest first, so reloading keeps LRU order)."""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry._asdict()) + "\n")
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(self._entries)
+
+    # --------------------------------------------------------------------------
+    # Hit-quality report
+    # --------------------------------------------------------------------------
+    def report(self) -> Dict[str, Any]:
+        """Hit rate, similarity of served hits and code agreement by similarity."""
+        with self._lock:
+            similarities = sorted(self._hit_similarities)
+            stats = dict(self._stats)
+            calibration = {
+                f"<={bucket}": {"pairs": pairs, "mean_code_agreement": agreement / pairs}
+                for bucket, (pairs, agreement) in self._calibration.items() if pairs
+            }
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "phrase_threshold": self.phrase_threshold,
+                **stats,
+                "hit_rate": stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0,
+                "hit_similarity": {
+                    "min": similarities[0] if similarities else None,
+                    "p50": similarities[len(similarities) // 2] if similarities else None,
+                    "near_threshold": sum(1 for s in similarities if s < self.threshold + 0.03),
+                },
+                "calibration": calibration,
+            }
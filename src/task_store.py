@@ -0,0 +1,172 @@
+# src/task_store.py
+"""
+Compact task records and pre-rendered /status responses.
+
+Clients poll /status every few seconds for every task they started. Returning
+the pydantic TaskStatus meant FastAPI re-validated and re-encoded every
+partial output on every poll, and kept each output as a model field besides.
+
+Here a partial is encoded to JSON once, when its subtask finishes, and that
+encoding is the only copy of its output (zlib-compressed above
+STATUS_COMPRESS_THRESHOLD bytes). A task's /status body is spliced together
+from its fields and the partials' encodings, then kept in an LRU bounded to
+STATUS_CACHE_BYTES of bodies until the task changes, so repeated polls of an
+unchanged task cost a dict lookup. Bodies are uncompressed, so the bound is on
+bytes rather than responses: a few large reports must not undo the savings
+of compressing them in the records.
+
+JSON is encoded with orjson when it is installed (it ships with crewai's
+chromadb dependency), else with the standard library.
+"""
+import json
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a transitive dependency of crewai
+    orjson = None
+
+COMPRESS_THRESHOLD = int(os.getenv("STATUS_COMPRESS_THRESHOLD", "4096"))
+STATUS_CACHE_BYTES = int(os.getenv("STATUS_CACHE_BYTES", str(16 * 2 ** 20)))
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes; values JSON cannot represent are rendered with str()."""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _pack(data: bytes) -> Union[bytes, Tuple[bytes]]:
+    """Compressed data is wrapped in a 1-tuple so it is told apart without an extra field."""
+    return (zlib.compress(data, 1),) if len(data) > COMPRESS_THRESHOLD else data
+
+
+def _unpack(packed: Union[bytes, Tuple[bytes]]) -> bytes:
+    return zlib.decompress(packed[0]) if isinstance(packed, tuple) else packed
+
+
+# ------------------------------------------------------------------------------
+# Records
+# ------------------------------------------------------------------------------
+class PartialRecord:
+    """
+    Result of one finished subtask, stored as its /status JSON encoding.
+
+    `output` and `details` are decoded on access; the same record is shared
+    by every task subscribed to a run.
+    """
+    __slots__ = ("subtask_name", "timestamp", "_json")
+
+    def __init__(self, subtask_name: str, output: str, details: Any, timestamp: str):
+        self.subtask_name = subtask_name
+        self.timestamp = timestamp
+        self._json = _pack(dumps({
+            "subtask_name": subtask_name,
+            "output": output,
+            "details": details,
+            "timestamp": timestamp,
+        }))
+
+    @property
+    def json(self) -> bytes:
+        return _unpack(self._json)
+
+    @property
+    def output(self) -> str:
+        return loads(self.json)["output"]
+
+    @property
+    def details(self) -> Any:
+        return loads(self.json)["details"]
+
+    def __repr__(self) -> str:
+        return f"PartialRecord({self.subtask_name!r}, {self.timestamp!r})"
+
+
+class TaskRecord:
+    """
+    State of one task, with the attributes of the TaskStatus response model.
+
+    Change it through `update` and `add_partial` only: each change bumps
+    `version`, which invalidates the cached /status response.
+    """
+    __slots__ = ("status", "error", "progress_summary", "partials", "version", "_result")
+
+    def __init__(self, status: str = "running", result: Optional[str] = None, error: Optional[str] = None,
+                 progress_summary: str = "0/0 subtasks completed", partials: Iterable[PartialRecord] = ()):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.progress_summary = progress_summary
+        self.partials: List[PartialRecord] = list(partials)
+        self.version = 0
+
+    @property
+    def result(self) -> Optional[str]:
+        return None if self._result is None else _unpack(self._result).decode("utf-8")
+
+    @result.setter
+    def result(self, value: Optional[str]) -> None:
+        self._result = None if value is None else _pack(value.encode("utf-8"))
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        for key, value in fields.items():
+            setattr(self, key, list(value) if key == "partials" else value)
+        self.version += 1
+
+    def add_partial(self, partial: PartialRecord) -> None:
+        self.partials.append(partial)
+        self.version += 1
+
+    def render(self) -> bytes:
+        """The TaskStatus JSON body, reusing the partials' stored encodings."""
+        head = dumps({
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "progress_summary": self.progress_summary,
+        })
+        return b"".join((head[:-1], b',"partials":[', b",".join(p.json for p in self.partials), b"]}"))
+
+
+# ------------------------------------------------------------------------------
+# Response cache
+# ------------------------------------------------------------------------------
+class StatusResponses:
+    """Rendered /status bodies of recently polled tasks, valid while the task's version is unchanged."""
+
+    def __init__(self, max_bytes: int = STATUS_CACHE_BYTES):
+        """
+        Args:
+            max_bytes: Total size of the cached bodies; least recently polled ones are dropped first
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._bodies: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id: str, record: TaskRecord) -> bytes:
+        cached = self._bodies.get(task_id)
+        if cached is not None and cached[0] == record.version:
+            self._bodies.move_to_end(task_id)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        body = record.render()
+        if cached is not None:
+            self.size -= len(self._bodies.pop(task_id)[1])
+        if len(body) <= self.max_bytes:
+            self._bodies[task_id] = (record.version, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self.size -= len(self._bodies.popitem(last=False)[1][1])
+        return body
@@ -0,0 +1,294 @@
+# src/telemetry.py
+"""
+Non-blocking telemetry pipeline for AgentOps events.
+
+Events are pushed onto a bounded in-process queue by the crew threads and
+flushed in batches by a single background worker, so a slow or unreachable
+telemetry backend never adds latency to a crew run.
+
+Configuration (environment variables):
+    TELEMETRY_SAMPLE_RATE      Fraction of runs/events to keep (default: 1.0)
+    TELEMETRY_QUEUE_SIZE       Maximum queued events (default: 1000)
+    TELEMETRY_BATCH_SIZE       Maximum events per flush (default: 50)
+    TELEMETRY_FLUSH_INTERVAL   Seconds between flushes (default: 1.0)
+    TELEMETRY_DROP_POLICY      "drop_newest" or "drop_oldest" (default: drop_newest)
+    TELEMETRY_SINK             "agentops" or "memory" (InMemorySink, for load tests) (default: agentops)
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST)
+SINKS = ("agentops", "memory")
+DROP_WARNING_INTERVAL = 60.0  # seconds between warnings about a full queue
+
+
+@dataclass
+class TelemetryEvent:
+    """A single event waiting to be delivered to a sink."""
+    event_type: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    returns: Any = None
+    session: Any = None  # AgentOps session to record on, or None for the default
+    created_at: float = field(default_factory=time.time)
+
+
+class InMemorySink:
+    """
+    Local stub sink that keeps delivered batches in memory.
+
+    Useful for tests and benchmarks; ``delay`` simulates a slow backend.
+    """
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batches: List[List[TelemetryEvent]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def events(self) -> List[TelemetryEvent]:
+        with self._lock:
+            return [event for batch in self.batches for event in batch]
+
+    def send(self, batch: List[TelemetryEvent]) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Telemetry sink unavailable")
+        with self._lock:
+            self.batches.append(list(batch))
+
+
+class AgentOpsSink:
+    """Sink that records events on AgentOps (per-session when available)."""
+
+    def __init__(self):
+        import agentops
+        self._agentops = agentops
+
+    def send(self, batch: List[TelemetryEvent]) -> None:
+        for item in batch:
+            event = self._agentops.Event(
+                event_type=item.event_type,
+                params=item.params,
+                returns=item.returns,
+            )
+            if item.session is not None:
+                item.session.record(event)
+            else:
+                self._agentops.record(event)
+
+
+class TelemetryPipeline:
+    """
+    Bounded queue plus background worker that delivers events in batches.
+
+    ``emit`` never blocks: when the queue is full the configured drop policy
+    decides whether the new event or the oldest queued event is discarded.
+    """
+
+    def __init__(
+        self,
+        sink: Any,
+        sample_rate: float = 1.0,
+        max_queue_size: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        drop_policy: str = DROP_NEWEST,
+    ):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0.0 and 1.0")
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}")
+
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+
+        self._queue: "queue.Queue[TelemetryEvent]" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._stats_lock = threading.Lock()
+        self._stats = {"emitted": 0, "sampled_out": 0, "dropped": 0, "sent": 0, "errors": 0}
+        self._next_drop_warning = 0.0
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls, sink: Any = None) -> "TelemetryPipeline":
+        """Build a pipeline configured from TELEMETRY_* environment variables (`sink` overrides TELEMETRY_SINK)."""
+        if sink is None:
+            name = os.getenv("TELEMETRY_SINK", "agentops")
+            if name not in SINKS:
+                raise ValueError(f"TELEMETRY_SINK must be one of {SINKS}")
+            sink = InMemorySink() if name == "memory" else AgentOpsSink()
+        return cls(
+            sink=sink,
+            sample_rate=float(os.getenv("TELEMETRY_SAMPLE_RATE", "1.0")),
+            max_queue_size=int(os.getenv("TELEMETRY_QUEUE_SIZE", "1000")),
+            batch_size=int(os.getenv("TELEMETRY_BATCH_SIZE", "50")),
+            flush_interval=float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0")),
+            drop_policy=os.getenv("TELEMETRY_DROP_POLICY", DROP_NEWEST),
+        )
+
+    # --------------------------------------------------------------------------
+    # Producer side
+    # --------------------------------------------------------------------------
+    def should_sample(self) -> bool:
+        """Roll the sampling dice once (e.g. per run, so a run is kept or dropped as a whole)."""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def emit(
+        self,
+        event_type: str,
+        params: Optional[Dict[str, Any]] = None,
+        returns: Any = None,
+        session: Any = None,
+        sampled: Optional[bool] = None,
+    ) -> bool:
+        """
+        Queue an event for delivery without blocking the caller.
+
+        Args:
+            event_type: AgentOps event type
+            params: Event parameters
+            returns: Event return value
+            session: AgentOps session to record on (None records globally)
+            sampled: Pre-computed sampling decision; rolled per event when None
+
+        Returns:
+            True if the event was queued, False if it was sampled out or dropped
+        """
+        if sampled is None:
+            sampled = self.should_sample()
+        if not sampled:
+            self._bump("sampled_out")
+            return False
+
+        self._ensure_worker()
+        event = TelemetryEvent(event_type=event_type, params=params or {}, returns=returns, session=session)
+        with self._idle:
+            self._in_flight += 1
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            if self.drop_policy == DROP_OLDEST:
+                try:
+                    self._queue.get_nowait()
+                    self._task_done()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(event)
+                except queue.Full:
+                    self._task_done()
+                    self._drop()
+                    return False
+                self._drop()
+            else:
+                self._task_done()
+                self._drop()
+                return False
+
+        self._bump("emitted")
+        return True
+
+    # --------------------------------------------------------------------------
+    # Worker side
+    # --------------------------------------------------------------------------
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name="telemetry-worker", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._deliver(batch)
+
+    def _next_batch(self) -> List[TelemetryEvent]:
+        batch: List[TelemetryEvent] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _deliver(self, batch: List[TelemetryEvent]) -> None:
+        try:
+            self.sink.send(batch)
+            self._bump("sent", len(batch))
+        except Exception as e:
+            self._bump("errors", len(batch))
+            logger.warning("Telemetry sink failed, dropping %d events: %s", len(batch), e)
+        finally:
+            for _ in batch:
+                self._task_done()
+
+    def _task_done(self) -> None:
+        with self._idle:
+            self._in_flight -= 1
+            if self._in_flight <= 0:
+                self._idle.notify_all()
+
+    def _bump(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _drop(self) -> None:
+        # Counted per event but warned about at most every DROP_WARNING_INTERVAL: a saturated
+        # queue drops on every emit, and a warning each time would be a log storm
+        with self._stats_lock:
+            self._stats["dropped"] += 1
+            now = time.monotonic()
+            if now < self._next_drop_warning:
+                return
+            self._next_drop_warning = now + DROP_WARNING_INTERVAL
+            dropped = self._stats["dropped"]
+        logger.warning("Telemetry queue full (%d events), %d events dropped so far", self._queue.maxsize, dropped)
+
+    # --------------------------------------------------------------------------
+    # Lifecycle
+    # --------------------------------------------------------------------------
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every queued event has been delivered (or timeout). Returns True if drained."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight <= 0, timeout=timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush outstanding events and stop the background worker."""
+        self.flush(timeout=timeout)
+        self._stop.set()
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout=timeout)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for emitted, sampled-out, dropped, sent and failed events."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
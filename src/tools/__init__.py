@@ -5,11 +5,22 @@ import os
 
 from .gpt4_suggestion_tool import Gpt4SuggestionTool
 from .icd10_database_tool import ICD10DatabaseTool
+from .icd10_hierarchy import ICD10Hierarchy
+from .icd10_shared_table import SharedICD10Table
+from .reference_data import ReferenceDataRegistry
+from .code_normalizer import ICD10CodeNormalizer
+from .icd10_navigation_tool import ICD10NavigationTool
 
 # Get the absolute path to the src directory
 src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-icd10_path = os.path.join(src_dir, "icd10_2019.csv")
 
-gpt4_suggestion_tool = Gpt4SuggestionTool()
-icd10_database_tool = ICD10DatabaseTool(database_path=icd10_path)
+# icd10_<version>.csv tables in ICD10_DATA_DIR (default: src/); ICD10_VERSION picks one,
+# otherwise the newest is served and newer drops are picked up by the watcher/reload
+reference_data = ReferenceDataRegistry.from_env(default_dir=src_dir)
+
+icd10_database_tool = ICD10DatabaseTool(registry=reference_data)
+# Checks the cheap model's suggestions locally before deciding to escalate (config/routes.yaml)
+gpt4_suggestion_tool = Gpt4SuggestionTool(validator=icd10_database_tool.check)
+# Shares the registry, so each table version is loaded and indexed once
+icd10_navigation_tool = ICD10NavigationTool(registry=reference_data)
 # tool import
\ No newline at end of file
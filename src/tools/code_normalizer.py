@@ -0,0 +1,131 @@
+import re
+from typing import Dict, List, NamedTuple, Optional
+from .icd10_hierarchy import ICD10Hierarchy
+
+# Common ICD-10-CM codes (and code families, matched by longest prefix) whose WHO
+# ICD-10 equivalent cannot be reached by simply dropping the CM extension characters.
+ICD10CM_TO_WHO: Dict[str, str] = {
+    # Asthma severity classes (mild intermittent ... severe persistent)
+    "J45.2": "J45.9",
+    "J45.3": "J45.9",
+    "J45.4": "J45.9",
+    "J45.5": "J45.9",
+    # Depression, unspecified / other specified
+    "F32.A": "F32.9",
+    # Pain not elsewhere classified (CM-only G89 category)
+    "G89.1": "R52.0",
+    "G89.2": "R52.2",
+    "G89.3": "R52.9",
+    "G89.4": "R52.2",
+    "G89": "R52.9",
+    # Long-term (current) drug therapy
+    "Z79.0": "Z92.1",
+    "Z79": "Z92.2",
+    # Personal history of nicotine dependence
+    "Z87.891": "Z86.4",
+}
+
+_PUNCTUATION = str.maketrans({",": ".", "·": ".", "‚": ".", "-": None, "†": None, "*": None})
+_SHAPE = re.compile(r"^([A-Z][0-9][0-9A-Z])\.?([0-9A-Z]{0,4})$")
+_MAX_CACHE = 8192
+
+
+class NormalizedCode(NamedTuple):
+    """Result of canonicalizing one code, with the rewrites that were applied."""
+    code: str
+    input_code: str
+    rewrites: List[str]
+    well_formed: bool
+
+    @property
+    def changed(self) -> bool:
+        return self.code != self.input_code
+
+
+class ICD10CodeNormalizer:
+    """
+    Canonicalizes LLM-suggested codes before they hit the ICD-10 index.
+
+    Steps, stopping at the first form found in the WHO table:
+    1. Syntax: trim, uppercase, drop markers/hyphens, fix the decimal point
+       ("e11.9", "E119", "E11.9 " -> "E11.9")
+    2. Precomputed ICD-10-CM -> WHO map (longest prefix, e.g. "J45.20" -> "J45.9")
+    3. Drop ICD-10-CM extension characters ("J45.909" -> "J45.9")
+    4. WHO categories without 4th-character subdivisions in the table absorb
+       CM sub-codes ("E11.65" -> "E11", "R05.9" -> "R05")
+
+    Results are memoized, so repeated suggestions cost one dict lookup.
+    """
+
+    def __init__(self, hierarchy: ICD10Hierarchy, cm_map: Optional[Dict[str, str]] = None):
+        self._hierarchy = hierarchy
+        self._cm_map = dict(ICD10CM_TO_WHO if cm_map is None else cm_map)
+        self._cm_prefix_lengths = sorted({len(prefix) for prefix in self._cm_map}, reverse=True)
+        self._cache: Dict[str, NormalizedCode] = {}
+
+    def normalize(self, code: str) -> NormalizedCode:
+        """
+        Canonicalize a code.
+
+        Args:
+            code: Code as suggested (any case, with or without decimal point)
+
+        Returns:
+            NormalizedCode(code, input_code, rewrites, well_formed). `code` is the
+            WHO form when one was found, otherwise the syntactically cleaned code.
+        """
+        cached = self._cache.get(code)
+        if cached is not None:
+            return cached
+
+        result = self._normalize(code)
+        if len(self._cache) >= _MAX_CACHE:
+            self._cache.clear()
+        self._cache[code] = result
+        return result
+
+    def _normalize(self, code: str) -> NormalizedCode:
+        original = "" if code is None else str(code)
+        rewrites: List[str] = []
+
+        cleaned = original.strip().upper().translate(_PUNCTUATION).replace(" ", "")
+        if cleaned.endswith("."):
+            cleaned = cleaned[:-1]
+        match = _SHAPE.match(cleaned)
+        if not match:
+            if cleaned != original:
+                rewrites.append(f"cleaned '{original}' to '{cleaned}'")
+            return NormalizedCode(cleaned, original, rewrites, False)
+
+        category, extension = match.groups()
+        canonical = f"{category}.{extension}" if extension else category
+        if canonical != original:
+            rewrites.append(f"canonicalized '{original}' to '{canonical}'")
+        if self._hierarchy.contains(canonical):
+            return NormalizedCode(canonical, original, rewrites, True)
+
+        mapped = self._map_cm(canonical)
+        if mapped:
+            rewrites.append(f"mapped ICD-10-CM '{canonical}' to WHO '{mapped}'")
+            return NormalizedCode(mapped, original, rewrites, True)
+
+        candidate = canonical
+        if len(extension) > 1:
+            candidate = f"{category}.{extension[0]}"
+            if self._hierarchy.contains(candidate):
+                rewrites.append(f"dropped ICD-10-CM extension '{canonical}' -> '{candidate}'")
+                return NormalizedCode(candidate, original, rewrites, True)
+
+        if extension and self._hierarchy.contains(category) and not self._hierarchy.children(category):
+            rewrites.append(f"WHO category '{category}' has no subdivisions, mapped '{canonical}' to '{category}'")
+            return NormalizedCode(category, original, rewrites, True)
+
+        return NormalizedCode(canonical, original, rewrites, True)
+
+    def _map_cm(self, code: str) -> Optional[str]:
+        for length in self._cm_prefix_lengths:
+            if len(code) >= length:
+                target = self._cm_map.get(code[:length])
+                if target and self._hierarchy.contains(target):
+                    return target
+        return None
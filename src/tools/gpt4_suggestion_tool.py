@@ -1,9 +1,13 @@
 from crewai_tools import BaseTool
-from typing import Type
+import time
+from typing import Any, Callable, Dict, List, Optional, Type
 from pydantic import BaseModel, Field
 import os
 import json
 from litellm import completion
+from cancellation import check_cancelled
+from routing import ModelCall, Route, current_run, estimate_cost, estimate_tokens, route_for
+from .suggestion_stream import SuggestionStreamParser
 
 
 class Gpt4SuggestionToolInput(BaseModel):
@@ -11,6 +15,9 @@ class Gpt4SuggestionToolInput(BaseModel):
     argument: str = Field(..., description="The medical diagnosis text to analyze.")
 
 
+DEFAULT_MODEL = "azure/gpt-4o"
+
+
 class Gpt4SuggestionTool(BaseTool):
     name: str = "gpt4_suggestion_tool"
     description: str = (
@@ -18,8 +25,15 @@ class Gpt4SuggestionTool(BaseTool):
     )
     args_schema: Type[BaseModel] = Gpt4SuggestionToolInput
 
-    def __init__(self, **kwargs):
+    def __init__(self, validator: Optional[Callable[[str, str], Dict]] = None, **kwargs):
+        """
+        Args:
+            validator: `ICD10DatabaseTool.check`-like callable; with a route in
+                routes.yaml, suggestions of the cheap model are checked with it
+                and regenerated by the escalation model if any is low confidence
+        """
         super().__init__(**kwargs)
+        self._validator = validator
         self._api_key = os.getenv("AZURE_API_KEY")
         self._api_base = os.getenv("AZURE_API_BASE")
         self._api_version = os.getenv("AZURE_API_VERSION")
@@ -32,8 +46,7 @@ class Gpt4SuggestionTool(BaseTool):
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-    def _run(self, argument: str) -> str:
-        """Generate ICD-10 suggestions for a medical diagnosis."""
+    def _messages(self, argument: str) -> List[Dict[str, str]]:
         system_message = """You are a medical coding expert specializing in ICD-10 classifications.
     Your task is to analyze medical diagnoses and suggest appropriate codes.
     Always return your response in the specified JSON format with up to 5 relevant ICD-10 codes."""
@@ -53,23 +66,80 @@ class Gpt4SuggestionTool(BaseTool):
         "who_database_url": "https://icd.who.int/browse10/2019/en"
     }}"""
 
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ]
+
+    @property
+    def route(self) -> Optional[Route]:
+        """Model route for this tool (routes.yaml), None to always use DEFAULT_MODEL."""
+        return route_for(self.name)
+
+    def _completion(self, argument: str, model: str = DEFAULT_MODEL, **kwargs):
+        return completion(
+            model=model,
+            messages=self._messages(argument),
+            api_key=self._api_key,
+            api_base=self._api_base,
+            api_version=self._api_version,
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            **kwargs
+        )
+
+    def _suggest(self, argument: str, model: str, escalated: bool = False) -> Dict[str, Any]:
+        """One (non-streaming) suggestion completion on `model`, recorded on the current run."""
+        start = time.perf_counter()
+        response = self._completion(argument, model)
+        usage = response.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        current_run().record_call(ModelCall(
+            self.name, model, time.perf_counter() - start, prompt_tokens, completion_tokens,
+            estimate_cost(model, prompt_tokens, completion_tokens), escalated,
+        ))
+        response_content = response.get("choices", [])[0].get("message", {}).get("content", "{}")
+        return json.loads(response_content)
+
+    def check_suggestions(self, suggestions: Dict[str, Any]) -> List[Dict]:
+        """Validate every suggested code with the validator (an empty list without one)."""
+        if self._validator is None:
+            return []
+        results = []
+        for suggestion in suggestions.get("icd10_suggestions") or []:
+            try:
+                results.append(self._validator(suggestion.get("code"), suggestion.get("description")))
+            except ValueError:
+                results.append({"valid": False, "code": suggestion.get("code")})
+        return results
+
+    def _routed_suggest(self, argument: str) -> Dict[str, Any]:
+        route = self.route
+        if route is None:
+            return self._suggest(argument, DEFAULT_MODEL)
+        if not route.escalate_to or self._validator is None:
+            return self._suggest(argument, route.model)
         try:
-            response = completion(
-                model="azure/gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                api_key=self._api_key,
-                api_base=self._api_base,
-                api_version=self._api_version,
-                response_format={"type": "json_object"},
-                temperature=0.1
-            )
+            suggestions = self._suggest(argument, route.model)
+            low = [v for v in self.check_suggestions(suggestions) if route.is_low_confidence(v)]
+            if suggestions.get("icd10_suggestions") and not low:
+                return suggestions
+            reason = f"{len(low)} low-confidence suggestion(s)" if low else "no suggestions"
+        except Exception as e:
+            reason = f"{route.model} failed: {e}"
+        check_cancelled()
+        current_run().escalate(route, reason)
+        return self._suggest(argument, route.escalate_to, escalated=True)
 
+    def _run(self, argument: str) -> str:
+        """Generate ICD-10 suggestions for a medical diagnosis."""
+        # Don't start an LLM call for a run that was cancelled meanwhile
+        check_cancelled()
+
+        try:
             # Validate and return the JSON response
-            response_content = response.get("choices", [])[0].get("message", {}).get("content", "{}")
-            response_json = json.loads(response_content)
+            response_json = self._routed_suggest(argument)
             return json.dumps(response_json, indent=2)
 
         except json.JSONDecodeError as e:
@@ -77,4 +147,47 @@ class Gpt4SuggestionTool(BaseTool):
         except KeyError as e:
             return f"Error accessing response content: {str(e)}"
         except Exception as e:
-            return f"Unexpected error: {str(e)}"
\ No newline at end of file
+            return f"Unexpected error: {str(e)}"
+
+    def stream_suggestions(self, argument: str, on_suggestion: Callable[[Dict], None],
+                           model: Optional[str] = None, escalated: bool = False) -> Dict:
+        """
+        Generate ICD-10 suggestions with a streaming completion.
+
+        `on_suggestion(suggestion)` is called for each {"code", "description"}
+        entry as soon as it has been streamed, while the model is still
+        generating the remaining codes and the explanation. Cancellation is
+        checked between chunks, so a cancelled run also stops reading the stream.
+
+        Args:
+            argument: The medical diagnosis text to analyze
+            on_suggestion: Called once per suggestion, in response order
+            model: Model to stream from (default: the route's first model, else DEFAULT_MODEL);
+                escalation is left to the caller, which sees every validation first
+            escalated: Record the call as an escalation in the routing metrics
+
+        Returns:
+            The complete response document (same format as `_run`)
+
+        Raises:
+            json.JSONDecodeError: If the streamed response is not valid JSON
+        """
+        check_cancelled()
+        route = self.route
+        model = model or (route.model if route else DEFAULT_MODEL)
+        start = time.perf_counter()
+        parser = SuggestionStreamParser()
+        for chunk in self._completion(argument, model, stream=True):
+            check_cancelled()
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta") or {}
+            for suggestion in parser.feed(delta.get("content") or ""):
+                on_suggestion(suggestion)
+        # Streamed chunks carry no usage; tokens are estimated from the text
+        prompt_tokens = estimate_tokens(" ".join(m["content"] for m in self._messages(argument)))
+        completion_tokens = estimate_tokens(parser.text)
+        current_run().record_call(ModelCall(
+            self.name, model, time.perf_counter() - start, prompt_tokens, completion_tokens,
+            estimate_cost(model, prompt_tokens, completion_tokens), escalated,
+        ))
+        return parser.document()
@@ -1,8 +1,11 @@
 from crewai.tools import BaseTool
 from typing import Type, List, Dict
 from pydantic import BaseModel, Field
-import pandas as pd
 from difflib import SequenceMatcher
+from .icd10_hierarchy import ICD10Hierarchy
+from .reference_data import ReferenceDataRegistry, ReferenceDataset
+from .code_normalizer import ICD10CodeNormalizer
+from routing import observe_validation
 
 class ICD10DatabaseToolInput(BaseModel):
     """
@@ -40,15 +43,51 @@ class ICD10DatabaseTool(BaseTool):
     )
     args_schema: Type[BaseModel] = ICD10DatabaseToolInput
 
-    def __init__(self, database_path: str, **kwargs):
-        """Initialize with the WHO ICD-10 database."""
+    def __init__(self, database_path: str = None, registry: ReferenceDataRegistry = None, **kwargs):
+        """
+        Initialize with the WHO ICD-10 database.
+
+        Tables are attached from read-only snapshots shared by every worker
+        process (built from the CSV on first use), instead of each worker
+        holding its own pandas copy. With a `registry`, the table version can
+        be swapped or pinned per request at runtime; a bare `database_path`
+        serves that one table.
+        """
         super().__init__(**kwargs)
-        self._database = pd.read_csv(database_path)
+        self._registry = registry or ReferenceDataRegistry.from_path(database_path)
+
+    @property
+    def registry(self) -> ReferenceDataRegistry:
+        """Versioned reference datasets shared with the navigation tool."""
+        return self._registry
+
+    @property
+    def hierarchy(self) -> ICD10Hierarchy:
+        """Chapter/block/category index of the current (pinned or active) version."""
+        return self._registry.get().hierarchy
+
+    @property
+    def normalizer(self) -> ICD10CodeNormalizer:
+        """Canonicalizer applied to every code before the index lookup."""
+        return self._registry.get().normalizer
 
     def _run(
         self,
         code: str = None,
         description: str = None
+    ) -> Dict:
+        """
+        Validate an ICD-10 code and/or description (see `check`) and report the
+        outcome to the current run, whose model routing escalates on failures.
+        """
+        result = self.check(code, description)
+        observe_validation(result)
+        return result
+
+    def check(
+        self,
+        code: str = None,
+        description: str = None
     ) -> Dict:
         """
         Validate an ICD-10 code and/or description.
@@ -61,13 +100,18 @@ class ICD10DatabaseTool(BaseTool):
             For code validation:
             {
                 "valid": bool,
-                "code": str,
+                "code": str,                  # canonical WHO form of the input code
+                "data_version": str,          # reference table version used, e.g. "2019"
+                "input_code": str,            # if the code was rewritten
+                "normalization": List[str],   # rewrites applied, if any
                 "official_description": str,  # WHO database description
                 "description_match": bool,    # if description provided
                 "chapter": str,
                 "domain": str,
+                "block": str,                 # block range, e.g. "E10-E14"
                 "url": str,
-                "alternatives": List[Dict]    # if validation fails
+                "alternatives": List[Dict],   # if validation fails
+                "nearest_valid_ancestor": Dict  # if validation fails
             }
 
         Raises:
@@ -76,23 +120,41 @@ class ICD10DatabaseTool(BaseTool):
         if not code:
             raise ValueError("Code must be provided for validation")
 
-        match = self._database[self._database["sub-code"] == code]
-        
-        if match.empty:
+        # One dataset for the whole call, even if a new version is swapped in meanwhile
+        dataset = self._registry.get()
+        hierarchy = dataset.hierarchy
+        normalized = dataset.normalizer.normalize(code)
+        code = normalized.code
+        rewrite = (
+            {"input_code": normalized.input_code, "normalization": normalized.rewrites}
+            if normalized.changed else {}
+        )
+
+        row_index = hierarchy.row_of(code)
+        block = hierarchy.block_of(code)
+
+        if row_index is None:
             return {
                 "valid": False,
                 "code": code,
+                "data_version": dataset.version,
+                **rewrite,
                 "note": "Invalid ICD-10 code",
-                "alternatives": self._find_alternative_codes(code)
+                "block": block.range if block else None,
+                "nearest_valid_ancestor": hierarchy.nearest_ancestor(code),
+                "alternatives": self._find_alternative_codes(dataset, code)
             }
 
-        row = match.iloc[0]
+        row = dataset.table.row(row_index)
         result = {
             "valid": True,
             "code": code,
+            "data_version": dataset.version,
+            **rewrite,
             "official_description": row["definition"],
             "chapter": row["chapter"],
             "domain": row["domain"],
+            "block": block.range if block else None,
             "url": row["url"]
         }
 
@@ -142,11 +204,12 @@ class ICD10DatabaseTool(BaseTool):
             )
         }
 
-    def _find_alternative_codes(self, code: str) -> List[Dict]:
+    def _find_alternative_codes(self, dataset: ReferenceDataset, code: str) -> List[Dict]:
         """
         Find alternative codes in the same category when validation fails.
 
         Args:
+            dataset: Reference data version the code is validated against
             code: Invalid ICD-10 code
 
         Returns:
@@ -157,17 +220,21 @@ class ICD10DatabaseTool(BaseTool):
                 "domain": str
             }
         """
-        # Find codes in the same domain
+        # Codes in the same category, else categories of the enclosing block
+        hierarchy = dataset.hierarchy
         code_prefix = code.split('.')[0]
-        similar_codes = self._database[
-            self._database["sub-code"].str.startswith(code_prefix)
-        ]
-        
-        return [
-            {
+        similar_codes = hierarchy.with_prefix(code_prefix)[:5]  # Limit to 5 alternatives
+        if not similar_codes:
+            ancestor = hierarchy.nearest_ancestor(code)
+            if ancestor and ancestor["level"] == "block":
+                similar_codes = hierarchy.children(ancestor["code"])[:5]
+
+        alternatives = []
+        for similar_code in similar_codes:
+            row = dataset.table.row(hierarchy.row_of(similar_code))
+            alternatives.append({
                 "code": row["sub-code"],
                 "description": row["definition"],
                 "domain": row["domain"]
-            }
-            for _, row in similar_codes.iterrows()
-        ][:5]  # Limit to 5 alternatives
+            })
+        return alternatives
@@ -0,0 +1,273 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from .icd10_shared_table import SharedICD10Table
+
+# WHO dagger/asterisk markers (e.g. "A17.0†", "G01*") are not part of the code itself
+_MARKERS = re.compile(r"[†*\s]")
+_RANGE = re.compile(r"\(([A-Z]\d\d)-([A-Z]\d\d)\)\s*$")
+_CATEGORY_LENGTH = 3
+
+
+def strip_markers(code: str) -> str:
+    """Remove dagger/asterisk markers and whitespace from a WHO code."""
+    return _MARKERS.sub("", str(code))
+
+
+def parent_code(code: str) -> Optional[str]:
+    """Immediate parent of a category or sub-code ("E11.9" -> "E11", "S72.00" -> "S72.0")."""
+    if len(code) <= _CATEGORY_LENGTH:
+        return None
+    return code[:-1].rstrip(".")
+
+
+class Chapter(NamedTuple):
+    id: int
+    numeral: str
+    title: str
+    start: str
+    end: str
+
+    @property
+    def range(self) -> str:
+        return f"{self.start}-{self.end}"
+
+
+class Block(NamedTuple):
+    id: int
+    chapter_id: int
+    title: str
+    start: str
+    end: str
+
+    @property
+    def range(self) -> str:
+        return f"{self.start}-{self.end}"
+
+
+class ICD10Hierarchy:
+    """
+    Compact chapter → block → category → sub-code hierarchy of the WHO ICD-10 table.
+
+    Built once from the database table. Chapters and blocks get integer ids,
+    codes are kept in one sorted sequence with a parallel integer sequence of
+    database rows, and chapter/block ranges are indexed by their start code, so:
+
+    - "which block/chapter contains code X" is a bisect over block starts,
+    - "children of E11" is a bisect over the sorted code list,
+    - "nearest valid ancestor of an invalid code" walks at most a few prefixes,
+
+    all in O(log n), for codes that exist in the table and codes that do not.
+
+    `codes` and `rows` are parallel: `rows[i]` is the database row of `codes[i]`.
+    The code, row and definition sequences only need `__len__`/`__getitem__`, so
+    they can be plain lists or zero-copy views over a shared snapshot
+    (see icd10_shared_table.py).
+    """
+
+    def __init__(self, chapters: List[Chapter], blocks: List[Block], codes: Sequence[str],
+                 rows: Sequence[int], definitions: Sequence[str]):
+        self.chapters = chapters
+        self.blocks = blocks
+        self.codes = codes
+        self.rows = rows
+        self._definitions = definitions
+        self._block_starts = [block.start for block in blocks]
+        self._chapter_starts = [chapter.start for chapter in chapters]
+        self._ranges: Dict[str, Union[Chapter, Block]] = {block.range: block for block in blocks}
+        for chapter in chapters:
+            for alias in (chapter.range, chapter.numeral, f"CHAPTER {chapter.numeral}"):
+                self._ranges[alias.upper()] = chapter
+
+    @classmethod
+    def from_dataframe(cls, database: "pd.DataFrame") -> "ICD10Hierarchy":
+        """Build the hierarchy from the WHO table loaded with pandas."""
+        return cls.from_records(zip(
+            database["chapter"], database["domain"], database["sub-code"], database["definition"]
+        ))
+
+    @classmethod
+    def from_shared_table(cls, table: "SharedICD10Table") -> "ICD10Hierarchy":
+        """Attach to the hierarchy stored in a shared snapshot (no copies of the code index)."""
+        return cls(
+            chapters=table.chapters,
+            blocks=table.blocks,
+            codes=table.sorted_codes,
+            rows=table.sorted_rows,
+            definitions=table.sorted_column("definition"),
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, str, str, str]]) -> "ICD10Hierarchy":
+        """
+        Parse the repeated chapter/domain text blobs into the compact hierarchy.
+
+        Args:
+            records: (chapter, domain, sub-code, definition) per table row, in row order
+        """
+        chapter_ids: Dict[str, int] = {}
+        block_ids: Dict[str, int] = {}
+        chapters: List[Chapter] = []
+        blocks: List[Block] = []
+        entries = []
+
+        for row_index, (chapter_text, domain_text, raw_code, definition) in enumerate(records):
+            if chapter_text not in chapter_ids:
+                lines = [line.strip() for line in str(chapter_text).splitlines() if line.strip()]
+                start, end = _RANGE.search(chapter_text).groups()
+                chapter_ids[chapter_text] = len(chapters)
+                chapters.append(Chapter(
+                    id=len(chapters),
+                    numeral=lines[0].replace("Chapter", "").strip(),
+                    title=" ".join(lines[1:-1]),
+                    start=start,
+                    end=end,
+                ))
+            if domain_text not in block_ids:
+                lines = [line.strip() for line in str(domain_text).splitlines() if line.strip()]
+                start, end = _RANGE.search(domain_text).groups()
+                block_ids[domain_text] = len(blocks)
+                blocks.append(Block(
+                    id=len(blocks),
+                    chapter_id=chapter_ids[chapter_text],
+                    title=" ".join(lines[:-1]),
+                    start=start,
+                    end=end,
+                ))
+            entries.append((strip_markers(raw_code), row_index, definition))
+
+        # Re-number blocks in code order so block ranges can be bisected
+        order = sorted(range(len(blocks)), key=lambda i: blocks[i].start)
+        renumber = {old: new for new, old in enumerate(order)}
+        blocks = [blocks[old]._replace(id=renumber[old]) for old in order]
+        chapters.sort(key=lambda chapter: chapter.start)
+        chapter_renumber = {chapter.id: new for new, chapter in enumerate(chapters)}
+        chapters = [chapter._replace(id=i) for i, chapter in enumerate(chapters)]
+        blocks = [block._replace(chapter_id=chapter_renumber[block.chapter_id]) for block in blocks]
+
+        entries.sort(key=lambda entry: entry[0])
+        return cls(
+            chapters=chapters,
+            blocks=blocks,
+            codes=[entry[0] for entry in entries],
+            rows=array("i", (entry[1] for entry in entries)),
+            definitions=[entry[2] for entry in entries],
+        )
+
+    # --------------------------------------------------------------------------
+    # Lookups
+    # --------------------------------------------------------------------------
+    def _find(self, code: str) -> Optional[int]:
+        """Position of a code in the sorted code sequence (binary search)."""
+        code = strip_markers(code)
+        position = bisect_left(self.codes, code)
+        if position < len(self.codes) and self.codes[position] == code:
+            return position
+        return None
+
+    def row_of(self, code: str) -> Optional[int]:
+        """Database row index of a code, or None if the code is not in the table."""
+        position = self._find(code)
+        return None if position is None else self.rows[position]
+
+    def contains(self, code: str) -> bool:
+        return self._find(code) is not None
+
+    def definition(self, code: str) -> Optional[str]:
+        position = self._find(code)
+        return None if position is None else self._definitions[position]
+
+    def block_of(self, code: str) -> Optional[Block]:
+        """Block whose range contains the code's category (the code need not exist)."""
+        category = strip_markers(code)[:_CATEGORY_LENGTH].upper()
+        index = bisect_right(self._block_starts, category) - 1
+        if index >= 0 and self.blocks[index].end >= category:
+            return self.blocks[index]
+        return None
+
+    def chapter_of(self, code: str) -> Optional[Chapter]:
+        """Chapter whose range contains the code's category (the code need not exist)."""
+        category = strip_markers(code)[:_CATEGORY_LENGTH].upper()
+        index = bisect_right(self._chapter_starts, category) - 1
+        if index >= 0 and self.chapters[index].end >= category:
+            return self.chapters[index]
+        return None
+
+    def find_range(self, node: str) -> Optional[Union[Chapter, Block]]:
+        """Resolve a "A00-B99" / "A00-A09" style range (or chapter numeral) to a Chapter or Block."""
+        return self._ranges.get(node.strip().upper())
+
+    # --------------------------------------------------------------------------
+    # Navigation
+    # --------------------------------------------------------------------------
+    def children(self, node: str) -> List[str]:
+        """
+        Direct children of a node.
+
+        Chapter range/numeral -> block ranges, block range -> categories,
+        category -> sub-codes, sub-code -> finer sub-codes.
+        """
+        resolved = self.find_range(node)
+        if isinstance(resolved, Chapter):
+            lo = bisect_left(self._block_starts, resolved.start)
+            hi = bisect_right(self._block_starts, resolved.end)
+            return [block.range for block in self.blocks[lo:hi]]
+        if isinstance(resolved, Block):
+            lo = bisect_left(self.codes, resolved.start)
+            hi = bisect_left(self.codes, resolved.end + "\uffff")
+            return [code for code in self.codes[lo:hi] if len(code) == _CATEGORY_LENGTH]
+
+        code = strip_markers(node).upper()
+        return [candidate for candidate in self.with_prefix(code) if parent_code(candidate) == code]
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        """All codes starting with a prefix, in code order (e.g. "J45" -> J45, J45.0, ...)."""
+        prefix = strip_markers(prefix).upper()
+        lo = bisect_left(self.codes, prefix)
+        hi = bisect_left(self.codes, prefix + "\uffff")
+        return self.codes[lo:hi]
+
+    def nearest_ancestor(self, code: str) -> Optional[Dict[str, str]]:
+        """
+        Closest existing node at or above a (possibly invalid) code.
+
+        Returns:
+            {"level": "code" | "block" | "chapter", "code": str, "description": str} or None
+        """
+        candidate = strip_markers(code).upper()
+        while candidate and len(candidate) >= _CATEGORY_LENGTH:
+            position = self._find(candidate)
+            if position is not None:
+                return {"level": "code", "code": candidate, "description": self._definitions[position]}
+            candidate = parent_code(candidate) or ""
+
+        block = self.block_of(code)
+        if block is not None:
+            return {"level": "block", "code": block.range, "description": block.title}
+        chapter = self.chapter_of(code)
+        if chapter is not None:
+            return {"level": "chapter", "code": chapter.range, "description": chapter.title}
+        return None
+
+    def path(self, code: str) -> List[Dict[str, str]]:
+        """Chapter → block → category → code path for a code (existing levels only)."""
+        path = []
+        chapter = self.chapter_of(code)
+        if chapter is not None:
+            path.append({"level": "chapter", "code": chapter.range,
+                         "description": f"Chapter {chapter.numeral}: {chapter.title}"})
+        block = self.block_of(code)
+        if block is not None:
+            path.append({"level": "block", "code": block.range, "description": block.title})
+
+        lineage = []
+        candidate: Optional[str] = strip_markers(code).upper()
+        while candidate:
+            if self.contains(candidate):
+                lineage.append({"level": "code", "code": candidate, "description": self.definition(candidate)})
+            candidate = parent_code(candidate)
+        return path + lineage[::-1]
@@ -0,0 +1,121 @@
+from crewai.tools import BaseTool
+from typing import Type, Dict
+from pydantic import BaseModel, Field
+from .icd10_hierarchy import ICD10Hierarchy
+from .reference_data import ReferenceDataRegistry
+
+OPERATIONS = ("path", "children", "block", "ancestor")
+
+
+class ICD10NavigationToolInput(BaseModel):
+    """
+    Input schema for the ICD10NavigationTool used by the validation agent.
+
+    Attributes:
+        code (str): ICD-10 code ("E11.9"), block range ("E10-E14") or chapter ("IV" / "E00-E90").
+        operation (str): One of "path", "children", "block", "ancestor".
+    """
+    code: str = Field(
+        ...,
+        description="ICD-10 code, block range (e.g. 'E10-E14') or chapter (e.g. 'IV' or 'E00-E90')."
+    )
+    operation: str = Field(
+        "path",
+        description=(
+            "'path': chapter/block/category lineage of a code; "
+            "'children': direct children of a chapter, block or code; "
+            "'block': block and chapter containing a code; "
+            "'ancestor': nearest valid code/block/chapter above an invalid code."
+        )
+    )
+
+
+class ICD10NavigationTool(BaseTool):
+    """
+    A navigation tool for the Validation Agent over the WHO ICD-10 hierarchy.
+
+    Answers structural questions from the precomputed hierarchy instead of
+    letting the agent guess:
+    1. Which block and chapter contain a code
+    2. Which codes are children of a chapter, block or category
+    3. What the nearest valid ancestor of an invalid code is
+    """
+    name: str = "icd10_navigation_tool"
+    description: str = (
+        "Navigates the WHO ICD-10 hierarchy (chapter -> block -> category -> sub-code):\n"
+        "1. 'block': which block and chapter contain a code\n"
+        "2. 'children': list children of a chapter, block or code (e.g. E11)\n"
+        "3. 'ancestor': nearest valid ancestor of an invalid code\n"
+        "4. 'path': full lineage of a code\n"
+        "Use it to pick a valid, more specific or more general code instead of guessing."
+    )
+    args_schema: Type[BaseModel] = ICD10NavigationToolInput
+
+    def __init__(self, registry: ReferenceDataRegistry, **kwargs):
+        """Initialize with the reference data registry of ICD10DatabaseTool."""
+        super().__init__(**kwargs)
+        self._registry = registry
+
+    def _run(self, code: str, operation: str = "path") -> Dict:
+        """
+        Answer a navigation query.
+
+        Args:
+            code: ICD-10 code, block range or chapter
+            operation: "path", "children", "block" or "ancestor"
+
+        Returns:
+            {
+                "code": str,
+                "operation": str,
+                "valid": bool,           # whether `code` itself is a valid code or range
+                ...operation-specific keys ("path", "children", "block", "chapter", "ancestor")
+            }
+
+        Raises:
+            ValueError: If code is missing or the operation is unknown
+        """
+        if not code:
+            raise ValueError("Code must be provided for navigation")
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}', expected one of {OPERATIONS}")
+
+        dataset = self._registry.get()
+        hierarchy = dataset.hierarchy
+        code = code.strip()
+        result = {"operation": operation, "data_version": dataset.version}
+        if hierarchy.find_range(code) is None:
+            normalized = dataset.normalizer.normalize(code)
+            if normalized.changed:
+                result.update({"input_code": normalized.input_code, "normalization": normalized.rewrites})
+            code = normalized.code
+        result.update({
+            "code": code,
+            "valid": hierarchy.contains(code) or hierarchy.find_range(code) is not None,
+        })
+
+        if operation == "children":
+            children = hierarchy.children(code)
+            result["children"] = [
+                {"code": child, "description": self._describe(hierarchy, child)} for child in children
+            ]
+        elif operation == "block":
+            block = hierarchy.block_of(code)
+            chapter = hierarchy.chapter_of(code)
+            result["block"] = {"range": block.range, "title": block.title} if block else None
+            result["chapter"] = (
+                {"numeral": chapter.numeral, "range": chapter.range, "title": chapter.title}
+                if chapter else None
+            )
+        elif operation == "ancestor":
+            result["ancestor"] = hierarchy.nearest_ancestor(code)
+        else:
+            result["path"] = hierarchy.path(code)
+
+        return result
+
+    def _describe(self, hierarchy: ICD10Hierarchy, node: str) -> str:
+        resolved = hierarchy.find_range(node)
+        if resolved is not None:
+            return resolved.title
+        return hierarchy.definition(node)
@@ -0,0 +1,377 @@
+import csv
+import getpass
+import hashlib
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+from .icd10_hierarchy import Block, Chapter, ICD10Hierarchy
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms build without a lock
+    fcntl = None
+
+MAGIC = b"ICD10SNP"
+FORMAT_VERSION = 1
+COLUMNS = ("url", "chapter", "domain", "sub-code", "definition")
+_HEADER = struct.Struct("<8sII")  # magic, format version, JSON header length
+_ALIGN = 8
+
+
+def snapshot_dir() -> str:
+    """
+    Directory for snapshots: ICD10_SHARED_DIR, else a per-user directory in
+    /dev/shm (tmpfs), else in the temp dir.
+
+    Both defaults are world-writable, so snapshots go in a subdirectory only
+    the current user can write (see `private_dir`).
+    """
+    configured = os.getenv("ICD10_SHARED_DIR")
+    if configured:
+        return configured
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        base = "/dev/shm"
+    else:
+        base = tempfile.gettempdir()
+    user = os.geteuid() if hasattr(os, "geteuid") else getpass.getuser()
+    return os.path.join(base, f"icd10-snapshots-{user}")
+
+
+def private_dir(directory: str, setting: str = "ICD10_SHARED_DIR") -> str:
+    """
+    Create `directory` (mode 0700) and check no other user can plant files in it.
+
+    Args:
+        directory: Directory to create or check
+        setting: Environment variable that configures it, named in the error
+
+    Raises:
+        PermissionError: The directory is a symlink, is owned by another user or
+            is group/world-writable
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "geteuid"):  # pragma: no cover - no POSIX ownership to check
+        return directory
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o022:
+        raise PermissionError(
+            f"Refusing directory {directory}: it must be a directory owned by "
+            f"the current user and not writable by others (set {setting} to another one)"
+        )
+    return directory
+
+
+def snapshot_path(database_path: str, directory: Optional[str] = None) -> str:
+    """
+    Snapshot file for a CSV: `<stem>-<path digest>-<content digest>.snap`.
+
+    The content digest covers the CSV's size and mtime, so edits produce a new
+    snapshot; the path digest names every snapshot of one CSV, so stale ones
+    can be pruned.
+    """
+    info = os.stat(database_path)
+    location = os.path.abspath(database_path)
+    signature = f"{location}:{info.st_size}:{info.st_mtime_ns}:{FORMAT_VERSION}"
+    digest = hashlib.sha1(signature.encode()).hexdigest()[:12]
+    return os.path.join(directory or snapshot_dir(), f"{_snapshot_prefix(database_path)}{digest}.snap")
+
+
+def _snapshot_prefix(database_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(database_path))[0]
+    return f"{stem}-{hashlib.sha1(os.path.abspath(database_path).encode()).hexdigest()[:8]}-"
+
+
+class _StringPool:
+    """Deduplicating string table (chapter/domain/url blobs repeat on every row)."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+
+def _pad(blob: bytes) -> bytes:
+    return blob + b"\0" * (-len(blob) % _ALIGN)
+
+
+def build_snapshot(database_path: str, path: str) -> str:
+    """
+    Write the WHO table plus its hierarchy index as a compact binary snapshot.
+
+    Layout: fixed header, JSON header (section offsets, chapters, blocks), then
+    8-byte aligned sections:
+        string_offsets  uint32[n_strings + 1]   offsets into the UTF-8 pool
+        pool            bytes                   deduplicated strings
+        cells           uint32[n_rows * 5]      string id per row and column
+        sorted_rows     uint32[n_rows]          row index per sorted-code position
+        sorted_codes    uint32[n_rows]          string id of the canonical code per position
+
+    The file is written to a temporary name and renamed, so concurrent builders
+    and readers never see a partial snapshot.
+    """
+    with open(database_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        records = [tuple(row[column] for column in COLUMNS) for row in reader]
+
+    hierarchy = ICD10Hierarchy.from_records(
+        (record[1], record[2], record[3], record[4]) for record in records
+    )
+
+    pool = _StringPool()
+    cells = [pool.add(value) for record in records for value in record]
+    sorted_codes = [pool.add(code) for code in hierarchy.codes]
+    sorted_rows = list(hierarchy.rows)
+
+    encoded = [value.encode("utf-8") for value in pool.strings]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+
+    sections = [
+        ("string_offsets", _pad(struct.pack(f"<{len(offsets)}I", *offsets))),
+        ("pool", _pad(b"".join(encoded))),
+        ("cells", _pad(struct.pack(f"<{len(cells)}I", *cells))),
+        ("sorted_rows", _pad(struct.pack(f"<{len(sorted_rows)}I", *sorted_rows))),
+        ("sorted_codes", _pad(struct.pack(f"<{len(sorted_codes)}I", *sorted_codes))),
+    ]
+
+    layout = {}
+    position = 0
+    for name, blob in sections:
+        layout[name] = [position, len(blob)]
+        position += len(blob)
+    header = json.dumps({
+        "rows": len(records),
+        "strings": len(pool.strings),
+        "columns": list(COLUMNS),
+        "sections": layout,
+        "chapters": [list(chapter) for chapter in hierarchy.chapters],
+        "blocks": [list(block) for block in hierarchy.blocks],
+    }).encode("utf-8")
+    header = _pad(header + b" " * (-(len(header) + _HEADER.size) % _ALIGN))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".icd10-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            for _, blob in sections:
+                f.write(blob)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def _open_snapshot(path: str):
+    """
+    Open a snapshot for reading, refusing symlinks and files of other users.
+
+    Raises:
+        FileNotFoundError: No snapshot at `path`
+        ValueError: `path` is not a regular file owned by the current user
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError as e:
+        if isinstance(e, FileNotFoundError):
+            raise
+        raise ValueError(f"{path} cannot be opened as an ICD-10 snapshot: {e}") from e
+    info = os.fstat(fd)
+    if not stat.S_ISREG(info.st_mode) or (hasattr(os, "geteuid") and info.st_uid != os.geteuid()):
+        os.close(fd)
+        raise ValueError(f"{path} is not an ICD-10 snapshot owned by the current user")
+    return os.fdopen(fd, "rb")
+
+
+def _parse_header(buffer, size: int, path: str) -> tuple:
+    """
+    The JSON header and the offset its sections start at.
+
+    Raises:
+        ValueError: Wrong magic or format version, or a truncated file
+    """
+    if size < _HEADER.size:
+        raise ValueError(f"{path} is truncated")
+    magic, version, header_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} ICD-10 snapshot")
+    base = _HEADER.size + header_length
+    try:
+        header = json.loads(bytes(buffer[_HEADER.size:base]))
+        end = max(start + length for start, length in header["sections"].values())
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"{path} has a corrupt header: {e}") from e
+    if base + end != size:
+        raise ValueError(f"{path} is {size} bytes, its header describes {base + end}")
+    return header, base
+
+
+def _is_valid_snapshot(path: str) -> bool:
+    try:
+        with _open_snapshot(path) as f:
+            size = os.fstat(f.fileno()).st_size
+            prefix = f.read(_HEADER.size)
+            if len(prefix) == _HEADER.size:
+                prefix += f.read(_HEADER.unpack_from(prefix, 0)[2])
+            _parse_header(prefix, size, path)
+        return True
+    except (OSError, ValueError, struct.error):
+        return False
+
+
+def _prune_stale(database_path: str, current: str) -> None:
+    """Remove the snapshots (and lock files) of earlier versions of the CSV."""
+    directory, current_name = os.path.split(current)
+    prefix = _snapshot_prefix(database_path)
+    for name in os.listdir(directory or "."):
+        if name.startswith(prefix) and name not in (current_name, current_name + ".lock"):
+            try:
+                os.unlink(os.path.join(directory, name))  # processes still mapping it keep their pages
+            except FileNotFoundError:
+                pass
+
+
+def ensure_snapshot(database_path: str, directory: Optional[str] = None) -> str:
+    """
+    Return the snapshot for a CSV, building it once if no process has yet.
+
+    A snapshot that is truncated, corrupt or not owned by the current user is
+    rebuilt; snapshots of earlier versions of the CSV are removed.
+    """
+    path = snapshot_path(database_path, directory)
+    if _is_valid_snapshot(path):
+        return path
+
+    private_dir(os.path.dirname(path) or ".")
+    lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    with os.fdopen(lock_fd, "r+") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not _is_valid_snapshot(path):
+                build_snapshot(database_path, path)
+                _prune_stale(database_path, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return path
+
+
+class _StringColumn(Sequence[str]):
+    """Read-only sequence decoding strings from the snapshot on access."""
+
+    def __init__(self, table: "SharedICD10Table", ids: Sequence[int]):
+        self._table = table
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._table.string(string_id) for string_id in self._ids[index]]
+        return self._table.string(self._ids[index])
+
+    def __iter__(self) -> Iterator[str]:
+        for string_id in self._ids:
+            yield self._table.string(string_id)
+
+
+class SharedICD10Table:
+    """
+    Read-only WHO ICD-10 table attached zero-copy from an mmap'd snapshot.
+
+    Every worker process maps the same file (on /dev/shm by default), so the
+    table and its sorted-code index live once in the page cache instead of once
+    per process as a pandas DataFrame. Integer sections are exposed as
+    `memoryview`s cast to uint32; strings are decoded only when accessed.
+
+    Raises ValueError for a file that is not a complete snapshot owned by the
+    current user (`attach` rebuilds those).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with _open_snapshot(path) as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{path} is truncated")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, base = _parse_header(self._mmap, size, path)
+        view = memoryview(self._mmap)
+
+        def section(name: str) -> memoryview:
+            start, length = header["sections"][name]
+            return view[base + start:base + start + length]
+
+        self.rows = header["rows"]
+        self._columns = {name: i for i, name in enumerate(header["columns"])}
+        self._offsets = section("string_offsets").cast("I")[:header["strings"] + 1]
+        self._pool = section("pool")
+        self._cells = section("cells").cast("I")[:self.rows * len(COLUMNS)]
+        self.sorted_rows = section("sorted_rows").cast("I")[:self.rows]
+        self._sorted_code_ids = section("sorted_codes").cast("I")[:self.rows]
+        self.sorted_codes = _StringColumn(self, self._sorted_code_ids)
+        self.chapters = [Chapter(*chapter) for chapter in header["chapters"]]
+        self.blocks = [Block(*block) for block in header["blocks"]]
+
+    @classmethod
+    def attach(cls, database_path: str, directory: Optional[str] = None) -> "SharedICD10Table":
+        """Map the snapshot for a CSV, building it first if needed."""
+        return cls(ensure_snapshot(database_path, directory))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def string(self, string_id: int) -> str:
+        return str(self._pool[self._offsets[string_id]:self._offsets[string_id + 1]], "utf-8")
+
+    def cell(self, row: int, column: str) -> str:
+        return self.string(self._cells[row * len(COLUMNS) + self._columns[column]])
+
+    def row(self, row: int) -> Dict[str, str]:
+        """One table row as a dict keyed like the CSV columns."""
+        return {column: self.cell(row, column) for column in COLUMNS}
+
+    def sorted_column(self, column: str) -> Sequence[str]:
+        """A column in sorted-code order (parallel to `sorted_codes`)."""
+        column_index = self._columns[column]
+        width = len(COLUMNS)
+        ids = _RowMappedIds(self.sorted_rows, self._cells, width, column_index)
+        return _StringColumn(self, ids)
+
+    def hierarchy(self) -> ICD10Hierarchy:
+        return ICD10Hierarchy.from_shared_table(self)
+
+
+class _RowMappedIds(Sequence[int]):
+    """String ids of one column, indexed by sorted-code position."""
+
+    def __init__(self, rows: Sequence[int], cells: Sequence[int], width: int, column: int):
+        self._rows = rows
+        self._cells = cells
+        self._width = width
+        self._column = column
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._cells[row * self._width + self._column] for row in self._rows[index]]
+        return self._cells[self._rows[index] * self._width + self._column]
@@ -0,0 +1,339 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+from .code_normalizer import ICD10CodeNormalizer
+from .icd10_hierarchy import ICD10Hierarchy
+from .icd10_shared_table import SharedICD10Table
+
+logger = logging.getLogger(__name__)
+
+# Reference tables are discovered as icd10_<version>.csv (e.g. icd10_2019.csv -> "2019")
+_DATASET_FILE = re.compile(r"^icd10_(?P<version>[\w.-]+)\.csv$")
+
+# Dataset pinned for the current request/thread (see ReferenceDataRegistry.pin)
+_pinned: ContextVar[Optional["ReferenceDataset"]] = ContextVar("icd10_pinned_dataset", default=None)
+
+
+def version_key(version: str):
+    """Natural sort key, so "2019" < "2019.1" < "2024" and "v9" < "v10"."""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", version) if part]
+
+
+def file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def data_key(version: str, signature: tuple) -> str:
+    """
+    Key for results validated against one table: "<version>@<file digest>".
+
+    An edited table reloaded under the same version gets a new key, so caches
+    keyed by it never serve results validated against the old table, not
+    even after a restart.
+    """
+    digest = hashlib.sha1(repr(tuple(signature)).encode()).hexdigest()[:10]
+    return f"{version}@{digest}"
+
+
+class ReferenceDataset(NamedTuple):
+    """One loaded, indexed version of the WHO table. Immutable once built."""
+    version: str
+    path: str
+    table: SharedICD10Table
+    hierarchy: ICD10Hierarchy
+    normalizer: ICD10CodeNormalizer
+    signature: tuple
+    loaded_at: float
+
+    @classmethod
+    def load(cls, version: str, path: str) -> "ReferenceDataset":
+        table = SharedICD10Table.attach(path)
+        hierarchy = ICD10Hierarchy.from_shared_table(table)
+        return cls(
+            version=version,
+            path=path,
+            table=table,
+            hierarchy=hierarchy,
+            # Normalizer memo entries belong to this version and go away with it
+            normalizer=ICD10CodeNormalizer(hierarchy),
+            signature=file_signature(path),
+            loaded_at=time.time(),
+        )
+
+    @property
+    def data_key(self) -> str:
+        """Cache key of this dataset (see `data_key`)."""
+        return data_key(self.version, self.signature)
+
+
+class ReferenceDataRegistry:
+    """
+    Versioned ICD-10 reference datasets, hot-swappable without a restart.
+
+    New versions are loaded and indexed on a background thread, then made
+    active by swapping a single reference, so in-flight validations keep the
+    dataset they started with and never wait for a load. Callers resolve the
+    dataset once per call with `get()`, which honours a version pinned for the
+    current request with `pin()`.
+
+    Caches of validated results key them by `data_key()` rather than by the
+    version, so a reloaded table invalidates them without any notification.
+    """
+
+    def __init__(self, data_dir: str, active_version: Optional[str] = None,
+                 sources: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            data_dir: Directory scanned for icd10_<version>.csv tables
+            active_version: Version to serve by default; None follows the newest
+                version, including ones added later (see `refresh`)
+            sources: Extra {version: csv_path} entries outside the naming scheme
+        """
+        self.data_dir = data_dir
+        self.follow_newest = active_version is None
+        self._sources = dict(sources or {})
+        self._datasets: Dict[str, ReferenceDataset] = {}
+        self._active: Optional[ReferenceDataset] = None
+        self._loading: Dict[str, threading.Thread] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}  # one per version, so concurrent loads build it once
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        available = self.discover()
+        if not available:
+            raise FileNotFoundError(f"No icd10_<version>.csv reference tables in {data_dir}")
+        version = active_version or max(available, key=version_key)
+        if version not in available:
+            raise ValueError(f"Unknown ICD-10 version '{version}', available: {sorted(available, key=version_key)}")
+        # The first version is loaded synchronously; there is nothing to serve meanwhile
+        self._swap(self.load(version))
+
+    @classmethod
+    def from_env(cls, default_dir: str) -> "ReferenceDataRegistry":
+        """
+        Build the registry from ICD10_DATA_DIR (default: `default_dir`) and
+        ICD10_VERSION (default: newest). ICD10_RELOAD_INTERVAL > 0 starts a
+        watcher that picks up new or edited tables every that many seconds.
+        """
+        registry = cls(os.getenv("ICD10_DATA_DIR", default_dir), os.getenv("ICD10_VERSION") or None)
+        interval = float(os.getenv("ICD10_RELOAD_INTERVAL", "0"))
+        if interval > 0:
+            registry.start_watcher(interval)
+        return registry
+
+    @classmethod
+    def from_path(cls, database_path: str) -> "ReferenceDataRegistry":
+        """Registry serving one table; named icd10_<version>.csv or versioned by its file name."""
+        name = os.path.basename(database_path)
+        match = _DATASET_FILE.match(name)
+        version = match.group("version") if match else os.path.splitext(name)[0]
+        return cls(
+            os.path.dirname(os.path.abspath(database_path)),
+            active_version=version,
+            sources={version: database_path},
+        )
+
+    # --------------------------------------------------------------------------
+    # Lookups
+    # --------------------------------------------------------------------------
+    @property
+    def active_version(self) -> str:
+        return self._active.version
+
+    def get(self, version: Optional[str] = None) -> ReferenceDataset:
+        """
+        Dataset for an explicit version, else the pinned one, else the active one.
+
+        Resolve it once per call and use that object throughout: a concurrent
+        swap then never changes the data halfway through a validation.
+
+        Raises:
+            KeyError: If the requested version is not loaded
+        """
+        if version is None:
+            return _pinned.get() or self._active
+        dataset = self._datasets.get(version)
+        if dataset is None:
+            raise KeyError(f"ICD-10 version '{version}' is not loaded (loaded: {self.loaded_versions()})")
+        return dataset
+
+    def data_key(self, version: Optional[str] = None) -> str:
+        """
+        Cache key of the dataset a run of `version` would use, without loading it:
+        the pinned or active dataset for None, else the version's file as on disk
+        (which `load` reloads if it changed).
+
+        Raises:
+            KeyError: If the version is not available
+        """
+        if version is None:
+            return self.get(None).data_key
+        path = self.discover().get(version)
+        if path is None:
+            raise KeyError(f"No reference table for ICD-10 version '{version}' in {self.data_dir}")
+        return data_key(version, file_signature(path))
+
+    def loaded_versions(self) -> List[str]:
+        return sorted(self._datasets, key=version_key)
+
+    def discover(self) -> Dict[str, str]:
+        """Versions available in the data directory, mapped to their CSV paths."""
+        found = {}
+        for name in os.listdir(self.data_dir):
+            match = _DATASET_FILE.match(name)
+            if match:
+                found[match.group("version")] = os.path.join(self.data_dir, name)
+        found.update(self._sources)
+        return found
+
+    def describe(self) -> Dict:
+        """Active, loaded, loading and available versions (for the API)."""
+        return {
+            "active": self.active_version,
+            "loaded": self.loaded_versions(),
+            "loading": sorted(self._loading, key=version_key),
+            "available": sorted(self.discover(), key=version_key),
+        }
+
+    @contextmanager
+    def pin(self, version: Union[str, ReferenceDataset, None]) -> Iterator[ReferenceDataset]:
+        """
+        Pin a version for the current context (a request or crew run).
+
+        Yields the pinned dataset; with `version=None` the currently active one
+        is pinned, so a run that straddles a swap or reload stays on one dataset.
+        A version that is available but not loaded yet is loaded first, which
+        blocks; on an event loop, resolve it with `load` in a worker thread and
+        pin the returned dataset instead.
+
+        Raises:
+            KeyError: If the version is not available
+        """
+        if isinstance(version, ReferenceDataset):
+            dataset = version
+        else:
+            dataset = self.get(None) if version is None else self.load(version)
+        token = _pinned.set(dataset)
+        try:
+            yield dataset
+        finally:
+            _pinned.reset(token)
+
+    # --------------------------------------------------------------------------
+    # Loading and swapping
+    # --------------------------------------------------------------------------
+    def load(self, version: str) -> ReferenceDataset:
+        """
+        Load and index a version (synchronously) without activating it.
+
+        A version whose file changed since it was loaded is loaded again; calls
+        already holding the old dataset finish on it. Concurrent calls for the
+        same version wait for one load and share its dataset.
+        """
+        path = self.discover().get(version)
+        if path is None:
+            raise KeyError(f"No reference table for ICD-10 version '{version}' in {self.data_dir}")
+        dataset = self._datasets.get(version)
+        if dataset is not None and dataset.signature == file_signature(path):
+            return dataset
+        with self._lock:
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+        with load_lock:
+            dataset = self._datasets.get(version)
+            if dataset is not None and dataset.signature == file_signature(path):
+                return dataset  # loaded by the call we waited for
+            start = time.perf_counter()
+            dataset = ReferenceDataset.load(version, path)
+            with self._lock:
+                self._datasets[version] = dataset
+        logger.info("Loaded ICD-10 version %s in %.2fs", version, time.perf_counter() - start)
+        return dataset
+
+    def activate(self, version: str) -> ReferenceDataset:
+        """
+        Load a version if needed and make it the default for new calls.
+
+        An explicit activation stops `refresh` from following newer versions.
+        """
+        self.follow_newest = False
+        return self._swap(self.load(version))
+
+    def _swap(self, dataset: ReferenceDataset) -> ReferenceDataset:
+        with self._lock:
+            previous = self._active
+            self._active = dataset
+        if previous is not dataset:
+            logger.info("Active ICD-10 version: %s -> %s", previous and previous.version, dataset.version)
+        return dataset
+
+    def load_in_background(self, version: str, activate: bool = True) -> threading.Thread:
+        """Load (and optionally activate) a version on a daemon thread; returns the thread."""
+        with self._lock:
+            thread = self._loading.get(version)
+            if thread is not None:
+                return thread
+
+            def run():
+                try:
+                    dataset = self.load(version)
+                    if activate:
+                        self._swap(dataset)
+                except Exception:
+                    logger.exception("Failed to load ICD-10 version %s", version)
+                finally:
+                    with self._lock:
+                        self._loading.pop(version, None)
+
+            thread = threading.Thread(target=run, name=f"icd10-load-{version}", daemon=True)
+            self._loading[version] = thread
+        thread.start()
+        return thread
+
+    def refresh(self) -> Optional[threading.Thread]:
+        """
+        Pick up reference data changes on disk, loading them in the background.
+
+        Switches to a newer version dropped into the data directory (unless a
+        version was fixed at startup) or reloads the active version's edited file.
+        """
+        available = self.discover()
+        target = self.active_version
+        if self.follow_newest:
+            target = max(available, key=version_key)
+        path = available.get(target)
+        if path is None:
+            return None
+        if target == self.active_version and self._active.signature == file_signature(path):
+            return None
+        return self.load_in_background(target, activate=True)
+
+    def start_watcher(self, interval: float) -> None:
+        """Poll the data directory for new versions every `interval` seconds."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("ICD-10 reference data refresh failed")
+
+        self._watcher = threading.Thread(target=watch, name="icd10-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._stop.clear()
@@ -0,0 +1,91 @@
+import json
+from typing import Dict, List
+
+
+class SuggestionStreamParser:
+    """
+    Incremental parser for a streamed Gpt4SuggestionTool JSON response.
+
+    Text is fed in chunks as it arrives from the LLM. Every JSON object that
+    sits directly inside an array (the entries of "icd10_suggestions") is
+    returned by `feed` as soon as its closing brace arrives, long before the
+    rest of the document (explanation, URL) has been generated. The complete
+    document is available from `document()` once the stream has ended.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._length = 0
+        self._stack: List[str] = []  # open containers, "{" or "["
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None  # buffer offset of the array entry being read
+        self._item_depth = 0  # containers open around that entry; it ends when its "}" returns to this depth
+        self._pending = ""
+
+    @property
+    def text(self) -> str:
+        return "".join(self._buffer)
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Consume the next piece of the response.
+
+        Returns:
+            Suggestions completed by this chunk, each {"code": str, "description": str},
+            in the order they appear in the response
+        """
+        completed = []
+        offset = self._length
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+        if self._item_start is not None:
+            self._pending += chunk
+
+        for position, char in enumerate(chunk, start=offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack and self._stack[-1] == "[" and self._item_start is None:
+                    self._item_start = position
+                    self._item_depth = len(self._stack)
+                    self._pending = chunk[position - offset:]
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._item_start is not None and len(self._stack) == self._item_depth:
+                    item = self._pending[:len(self._pending) - (self._length - position - 1)]
+                    self._item_start = None
+                    self._pending = ""
+                    suggestion = self._suggestion(item)
+                    if suggestion is not None:
+                        completed.append(suggestion)
+        return completed
+
+    @staticmethod
+    def _suggestion(item: str):
+        try:
+            value = json.loads(item)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(value, dict) and value.get("code"):
+            return value
+        return None
+
+    def document(self) -> Dict:
+        """
+        The complete response, parsed.
+
+        Raises:
+            json.JSONDecodeError: If the stream ended with an incomplete or invalid document
+        """
+        return json.loads(self.text)
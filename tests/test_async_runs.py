@@ -0,0 +1,144 @@
+# tests/test_async_runs.py
+"""
+Test cases for asyncio-native crew runs and DELETE /run/{task_id} cancellation.
+The crew is replaced by a fake that checks for cancellation like crewai's step callback.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from src import api
+from src.api import RunInput, cancel_crew_endpoint, get_status, run_crew_endpoint, runs
+from cancellation import check_cancelled
+
+class FakeCrew:
+    """Stands in for AstackcrewCrew().crew(): runs `steps` agent steps, then one subtask."""
+    steps_taken = 0
+    kickoffs = 0
+
+    def __init__(self, steps: int, delay: float):
+        self.steps = steps
+        self.delay = delay
+        self.task_callback = None
+
+    def crew(self):
+        return self
+
+    def kickoff(self, inputs):
+        FakeCrew.kickoffs += 1
+        for _ in range(self.steps):
+            time.sleep(self.delay)
+            check_cancelled()
+            FakeCrew.steps_taken += 1
+        self.task_callback(SimpleNamespace(name="medical_diagnosis_task", raw=inputs["diagnosis_text"], json_dict=None))
+        return SimpleNamespace(raw='{"report": "ok"}')
+
+@pytest.fixture
+def fake_crew(monkeypatch):
+    def install(steps: int = 3, delay: float = 0.01, slots: int = 16):
+        FakeCrew.steps_taken = FakeCrew.kickoffs = 0
+        monkeypatch.setattr(api, "AstackcrewCrew", lambda: FakeCrew(steps, delay))
+        monkeypatch.setattr(api.telemetry_pipeline, "should_sample", lambda: False)
+        monkeypatch.setattr(api, "_crew_slots", asyncio.Semaphore(slots))
+        monkeypatch.setattr(api, "inflight", {})
+        monkeypatch.setattr(api, "semantic_cache", None)
+        monkeypatch.setattr(api, "checkpoints", None)
+    return install
+
+async def test_run_completes(fake_crew):
+    """A run completes on the event loop path and collects its partials."""
+    fake_crew()
+    task_id = (await run_crew_endpoint(RunInput(diagnosis_text="Lower Back Pain")))["task_id"]
+    await runs[task_id].task
+
+    status = await get_status(task_id)
+    assert status.status == "completed"
+    assert status.result == '{"report": "ok"}'
+    assert [p.output for p in status.partials] == ["Lower Back Pain"]
+    assert task_id not in runs
+
+async def test_cancel_stops_crew(fake_crew):
+    """DELETE marks the task cancelled at once and the crew makes no further steps."""
+    fake_crew(steps=500, delay=0.01)
+    task_id = (await run_crew_endpoint(RunInput(diagnosis_text="Migraine")))["task_id"]
+    await asyncio.sleep(0.1)
+
+    response = await cancel_crew_endpoint(task_id)
+    assert response == {"task_id": task_id, "status": "cancelled"}
+    await asyncio.sleep(0.05)
+    steps = FakeCrew.steps_taken
+    await asyncio.sleep(0.1)
+    assert FakeCrew.steps_taken == steps < 500
+    assert (await get_status(task_id)).partials == []
+
+async def test_queued_run_cancelled_before_start(fake_crew):
+    """Runs waiting for a crew slot are coroutines; cancelling one never starts its crew."""
+    fake_crew(steps=20, delay=0.01, slots=1)
+    first = (await run_crew_endpoint(RunInput(diagnosis_text="Asthma")))["task_id"]
+    queued = (await run_crew_endpoint(RunInput(diagnosis_text="Bronchitis")))["task_id"]
+    await asyncio.sleep(0.02)
+
+    await cancel_crew_endpoint(queued)
+    await runs[first].task
+    assert FakeCrew.kickoffs == 1
+    assert (await get_status(queued)).status == "cancelled"
+    assert (await get_status(first)).status == "completed"
+
+async def test_cancelled_crew_holds_slot_until_thread_returns(fake_crew):
+    """A cancelled crew's thread runs to its next step; the next run waits for it, not for DELETE."""
+    fake_crew(steps=3, delay=0.3, slots=1)
+    first = (await run_crew_endpoint(RunInput(diagnosis_text="Asthma")))["task_id"]
+    await asyncio.sleep(0.05)
+    run = runs[first].task
+    await cancel_crew_endpoint(first)
+    second = (await run_crew_endpoint(RunInput(diagnosis_text="Bronchitis")))["task_id"]
+
+    await asyncio.sleep(0.1)
+    assert FakeCrew.kickoffs == 1
+    await run
+    await runs[second].task
+    assert FakeCrew.kickoffs == 2
+    assert (await get_status(first)).status == "cancelled"
+    assert (await get_status(second)).status == "completed"
+
+async def test_cancel_finished_task_conflicts(fake_crew):
+    """Finished tasks cannot be cancelled; unknown ones are 404."""
+    fake_crew(steps=1)
+    task_id = (await run_crew_endpoint(RunInput(diagnosis_text="Gout")))["task_id"]
+    await runs[task_id].task
+    with pytest.raises(api.HTTPException) as conflict:
+        await cancel_crew_endpoint(task_id)
+    assert conflict.value.status_code == 409
+    with pytest.raises(api.HTTPException) as missing:
+        await cancel_crew_endpoint("no-such-task")
+    assert missing.value.status_code == 404
+
+async def test_identical_requests_share_one_run(fake_crew):
+    """Identical concurrent diagnoses get their own task ids but one crew run."""
+    fake_crew(steps=10)
+    first = (await run_crew_endpoint(RunInput(diagnosis_text="Lower Back Pain")))["task_id"]
+    second = (await run_crew_endpoint(RunInput(diagnosis_text="  lower back pain ")))["task_id"]
+    other = (await run_crew_endpoint(RunInput(diagnosis_text="Migraine")))["task_id"]
+    assert len({first, second, other}) == 3
+    await asyncio.gather(runs[first].task, runs[other].task)
+
+    assert FakeCrew.kickoffs == 2
+    for task_id in (first, second):
+        status = await get_status(task_id)
+        assert status.status == "completed"
+        assert status.result == '{"report": "ok"}'
+        assert len(status.partials) == 1
+    assert api.inflight == {}
+
+async def test_cancelling_one_subscriber_keeps_shared_run(fake_crew):
+    """Cancelling the starting task detaches it; the run still completes for the joined task."""
+    fake_crew(steps=10)
+    first = (await run_crew_endpoint(RunInput(diagnosis_text="Asthma")))["task_id"]
+    second = (await run_crew_endpoint(RunInput(diagnosis_text="Asthma")))["task_id"]
+    run = runs[first].task
+
+    await cancel_crew_endpoint(first)
+    await run
+    assert (await get_status(first)).status == "cancelled"
+    assert (await get_status(second)).status == "completed"
+    assert FakeCrew.kickoffs == 1
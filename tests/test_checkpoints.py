@@ -0,0 +1,201 @@
+# tests/test_checkpoints.py
+"""
+Test cases for subtask checkpoints: a run that failed after some subtasks
+resumes at the first unfinished one, reusing the earlier outputs as context.
+LLM calls are replaced by a fake that answers per task.
+"""
+import json
+import os
+import stat
+import time
+import pytest
+from crewai import LLM, Agent, Process, Task
+from crewai.tasks.task_output import TaskOutput
+import routing
+from checkpoints import CheckpointStore, ResumableCrew, run_key
+
+DIAGNOSIS = "Low back pain"
+STAGES = ("medical_diagnosis_task", "validation_task", "reporting_task")
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    LLM calls answer "<task>-output"; `fail` names tasks whose call raises.
+    The validation stage reports one low-confidence validation, like ICD10DatabaseTool.
+    """
+    prompts, fail = [], set()
+
+    def call(self, messages, callbacks=[]):
+        prompt = " ".join(str(m["content"]) for m in messages)
+        stage = next(name for name in STAGES if f"Run {name}" in prompt)
+        prompts.append((stage, prompt))
+        if stage == "validation_task":
+            routing.observe_validation({"code": "M54.5", "valid": False})
+        if stage in fail:
+            raise TimeoutError(f"{stage} timed out")
+        return f"Thought: done\nFinal Answer: {stage}-output"
+
+    monkeypatch.setattr(LLM, "call", call)
+    return prompts, fail
+
+def make_crew() -> ResumableCrew:
+    agent = Agent(role="coder", goal="code", backstory="coder", llm=LLM(model="gpt-4o"), max_retry_limit=0)
+    tasks = [Task(name=name, description=f"Run {name} for {{diagnosis_text}}", expected_output="text", agent=agent)
+             for name in STAGES]
+    return ResumableCrew(agents=[agent], tasks=tasks, process=Process.sequential)
+
+def kickoff(store: CheckpointStore, resume: bool = True, route_state: routing.RunRouting = None):
+    """Run the crew like the API does: resumed from, and failing or completing, its checkpoint."""
+    crew = make_crew()
+    checkpoint = store.open(DIAGNOSIS, "2019", "crew")
+    finished = []
+    crew.task_callback = lambda output: finished.append(output.name)
+    with routing.bind(route_state or routing.RunRouting()):
+        restored = checkpoint.attach(crew, resume=resume)
+        try:
+            result = crew.kickoff(inputs={"diagnosis_text": DIAGNOSIS})
+        except Exception:
+            checkpoint.fail()
+            raise
+    checkpoint.discard()
+    return result, [o.name for o in restored], finished
+
+def test_failed_run_resumes_at_unfinished_subtask(tmp_path, fake_llm):
+    prompts, fail = fake_llm
+    store = CheckpointStore(str(tmp_path))
+    fail.add("reporting_task")
+    with pytest.raises(TimeoutError):
+        kickoff(store)
+    assert [stage for stage, _ in prompts] == ["medical_diagnosis_task", "validation_task", "reporting_task"]
+
+    prompts.clear()
+    fail.clear()
+    result, restored, finished = kickoff(store)
+    assert restored == ["medical_diagnosis_task", "validation_task"]
+    assert finished == ["reporting_task"]
+    assert [stage for stage, _ in prompts] == ["reporting_task"]
+    # The restored output reaches the next task as context
+    assert "validation_task-output" in prompts[0][1]
+    assert result.raw == "reporting_task-output"
+    # A completed run leaves no checkpoint behind
+    assert list(tmp_path.iterdir()) == []
+
+def test_checkpoint_key_and_expiry(tmp_path):
+    store = CheckpointStore(str(tmp_path), ttl=60)
+    checkpoint = store.open(DIAGNOSIS, "2019", "crew")
+    checkpoint.save(TaskOutput(name="medical_diagnosis_task", description="d", agent="coder", raw="a"))
+
+    assert len(store.open(" low  BACK pain ", "2019", "crew").outputs) == 1
+    assert store.open(DIAGNOSIS, "2020", "crew").outputs == []
+
+    path = store.path(checkpoint.key)
+    document = json.loads(open(path).read())
+    document["updated_at"] = time.time() - 120
+    open(path, "w").write(json.dumps(document))
+    assert store.open(DIAGNOSIS, "2019", "crew").outputs == []
+
+def test_checkpoints_are_private_and_per_crew(tmp_path):
+    """Files are 0600 in a 0700 directory, store no diagnosis text, and a changed crew starts over."""
+    directory = tmp_path / "checkpoints"
+    store = CheckpointStore(str(directory))
+    checkpoint = store.open(DIAGNOSIS, "2019", "crew")
+    checkpoint.save(TaskOutput(name="medical_diagnosis_task", description="d", agent="coder", raw="a"))
+
+    path = store.path(checkpoint.key)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert DIAGNOSIS.casefold() not in open(path).read().casefold()
+    assert len(store.open(DIAGNOSIS, "2019", "crew").outputs) == 1
+    assert CheckpointStore(str(directory), fingerprint="new-prompts").open(DIAGNOSIS, "2019", "crew").outputs == []
+
+def test_sweep_removes_expired_and_orphaned_files(tmp_path, monkeypatch):
+    """Checkpoints of runs that are never retried, and temp files of crashed saves, don't stay on disk."""
+    store = CheckpointStore(str(tmp_path), ttl=60)
+    for text in ("fresh", "abandoned"):
+        store.open(text, "2019", "crew").save(
+            TaskOutput(name="medical_diagnosis_task", description="d", agent="coder", raw="a"))
+    abandoned = store.path(store.open("abandoned", "2019", "crew").key)
+    orphan, writing = tmp_path / "x.json.1.2.tmp", tmp_path / "y.json.1.3.tmp"
+    orphan.write_text("{")
+    writing.write_text("{")
+    old = time.time() - 3600
+    os.utime(abandoned, (old, old))
+    os.utime(orphan, (old, old))
+
+    monkeypatch.setenv("CHECKPOINTS", "true")
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setenv("CHECKPOINT_TTL", "60")
+    assert CheckpointStore.from_env() is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [os.path.basename(store.path(store.open("fresh", "2019", "crew").key)), writing.name])
+
+def test_only_matching_leading_tasks_are_restored(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.write(run_key(DIAGNOSIS, "2019", "crew", store.fingerprint), [
+        {"name": "medical_diagnosis_task", "description": "d", "agent": "coder", "raw": "a",
+         "json_dict": None, "output_format": "raw"},
+        {"name": "renamed_task", "description": "d", "agent": "coder", "raw": "b",
+         "json_dict": None, "output_format": "raw"},
+    ])
+    crew = make_crew()
+    restored = store.open(DIAGNOSIS, "2019", "crew").restorable(crew)
+    assert [o.raw for o in restored] == ["a"]
+
+def test_resumed_run_failure_drops_checkpoint(tmp_path, fake_llm):
+    """A failure after resuming may come from the restored outputs, so the next retry starts over."""
+    prompts, fail = fake_llm
+    store = CheckpointStore(str(tmp_path))
+    fail.add("reporting_task")
+    with pytest.raises(TimeoutError):
+        kickoff(store)
+    assert len(store.open(DIAGNOSIS, "2019", "crew").outputs) == 2
+    with pytest.raises(TimeoutError):
+        kickoff(store)
+    assert store.open(DIAGNOSIS, "2019", "crew").outputs == []
+
+    prompts.clear()
+    fail.clear()
+    kickoff(store)
+    assert [stage for stage, _ in prompts] == list(STAGES)
+
+def test_run_can_start_over(tmp_path, fake_llm):
+    """resume=False runs every task and replaces the saved outputs."""
+    prompts, fail = fake_llm
+    store = CheckpointStore(str(tmp_path))
+    fail.add("reporting_task")
+    with pytest.raises(TimeoutError):
+        kickoff(store)
+    prompts.clear()
+    with pytest.raises(TimeoutError):
+        kickoff(store, resume=False)
+    assert [stage for stage, _ in prompts] == list(STAGES)
+    assert [o["name"] for o in store.open(DIAGNOSIS, "2019", "crew").outputs] == list(STAGES[:2])
+
+def test_restored_validations_reach_routing(tmp_path, fake_llm):
+    """A resumed run sees the restored stage's validations, so its reporting route still escalates."""
+    prompts, fail = fake_llm
+    store = CheckpointStore(str(tmp_path))
+    fail.add("reporting_task")
+    with pytest.raises(TimeoutError):
+        kickoff(store)
+
+    fail.clear()
+    route_state = routing.RunRouting()
+    _, restored, _ = kickoff(store, route_state=route_state)
+    assert "validation_task" in restored
+    assert route_state.validations == [{"code": "M54.5", "valid": False}]
+
+def test_restored_outputs_apply_to_one_kickoff(tmp_path, fake_llm):
+    """A second kickoff of a resumed crew runs every task again."""
+    prompts, _ = fake_llm
+    store = CheckpointStore(str(tmp_path))
+    crew = make_crew()
+    checkpoint = store.open(DIAGNOSIS, "2019", "crew")
+    checkpoint.save(TaskOutput(name="medical_diagnosis_task", description="d", agent="coder", raw="a"))
+    store.open(DIAGNOSIS, "2019", "crew").attach(crew)
+    crew.kickoff(inputs={"diagnosis_text": DIAGNOSIS})
+    assert [stage for stage, _ in prompts] == list(STAGES[1:])
+
+    prompts.clear()
+    crew.kickoff(inputs={"diagnosis_text": DIAGNOSIS})
+    assert [stage for stage, _ in prompts] == list(STAGES)
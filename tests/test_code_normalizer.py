@@ -0,0 +1,54 @@
+# tests/test_code_normalizer.py
+"""
+Test cases for the ICD-10 code canonicalizer used in front of all lookups.
+"""
+from pathlib import Path
+import pandas as pd
+import pytest
+from src.tools.code_normalizer import ICD10CodeNormalizer
+from src.tools.icd10_hierarchy import ICD10Hierarchy
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+
+@pytest.fixture(scope="module")
+def normalizer():
+    return ICD10CodeNormalizer(ICD10Hierarchy.from_dataframe(pd.read_csv(ICD10_PATH)))
+
+@pytest.mark.parametrize("raw", ["j45.9", "J459", " J45.9 ", "J45,9", "J45.9†"])
+def test_syntactic_variants(normalizer, raw):
+    """Case, whitespace, missing decimal point and markers are canonicalized."""
+    result = normalizer.normalize(raw)
+    assert result.code == "J45.9"
+    assert result.rewrites
+
+def test_valid_code_is_untouched(normalizer):
+    """Codes already in WHO form need no rewrite."""
+    result = normalizer.normalize("I10")
+    assert result.code == "I10"
+    assert not result.changed
+    assert result.rewrites == []
+
+@pytest.mark.parametrize("raw, expected", [
+    ("J45.909", "J45.9"),   # CM extension dropped
+    ("M54.50", "M54.5"),
+    ("J45.20", "J45.9"),    # CM severity class mapped
+    ("F32.A", "F32.9"),
+    ("G89.29", "R52.2"),    # CM-only category mapped
+    ("E11.9", "E11"),       # WHO category without subdivisions in the table
+    ("E11.65", "E11"),
+])
+def test_icd10cm_codes_map_to_who(normalizer, raw, expected):
+    """Common ICD-10-CM forms resolve to their WHO ICD-10 parent."""
+    result = normalizer.normalize(raw)
+    assert result.code == expected
+    assert any(expected in rewrite for rewrite in result.rewrites)
+
+def test_malformed_code_is_reported(normalizer):
+    """Strings that do not look like codes are flagged, not guessed."""
+    result = normalizer.normalize("diabetes")
+    assert not result.well_formed
+    assert result.code == "DIABETES"
+
+def test_results_are_memoized(normalizer):
+    """Repeated suggestions are served from the cache."""
+    assert normalizer.normalize("e119") is normalizer.normalize("e119")
@@ -0,0 +1,62 @@
+# tests/test_icd10_hierarchy.py
+"""
+Test cases for the precomputed ICD-10 hierarchy.
+Runs against the bundled WHO 2019 table.
+"""
+from pathlib import Path
+import pandas as pd
+import pytest
+from src.tools.icd10_hierarchy import ICD10Hierarchy
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+
+@pytest.fixture(scope="module")
+def hierarchy():
+    return ICD10Hierarchy.from_dataframe(pd.read_csv(ICD10_PATH))
+
+def test_parses_chapters_and_blocks(hierarchy):
+    """The free-text chapter/domain blobs become 22 chapters and 211 blocks."""
+    assert len(hierarchy.chapters) == 22
+    assert len(hierarchy.blocks) == 211
+    first = hierarchy.chapters[0]
+    assert (first.numeral, first.range) == ("I", "A00-B99")
+    assert first.title == "Certain infectious and parasitic diseases"
+
+def test_block_of_code(hierarchy):
+    """Block and chapter lookups work for existing and unknown codes."""
+    assert hierarchy.block_of("E11").range == "E10-E14"
+    assert hierarchy.block_of("E11.95").range == "E10-E14"
+    assert hierarchy.chapter_of("E11.95").numeral == "IV"
+    assert hierarchy.block_of("E99") is None
+
+def test_children(hierarchy):
+    """Children of a category, block and chapter."""
+    assert hierarchy.children("J45") == ["J45.0", "J45.1", "J45.8", "J45.9"]
+    assert hierarchy.children("A00-A09")[:3] == ["A00", "A01", "A02"]
+    assert hierarchy.children("I")[0] == "A00-A09"
+    assert hierarchy.children("E11") == []
+
+def test_nearest_ancestor(hierarchy):
+    """Invalid codes resolve to the closest valid code, block or chapter."""
+    assert hierarchy.nearest_ancestor("J45.909")["code"] == "J45.9"
+    assert hierarchy.nearest_ancestor("E11.9") == {
+        "level": "code", "code": "E11", "description": "Type 2 diabetes mellitus"
+    }
+    assert hierarchy.nearest_ancestor("A45.1") == {
+        "level": "block", "code": "A30-A49", "description": "Other bacterial diseases"
+    }
+    assert hierarchy.nearest_ancestor("E17")["level"] == "chapter"
+    assert hierarchy.nearest_ancestor("ZZ9") is None
+
+def test_markers_do_not_hide_codes(hierarchy):
+    """Dagger/asterisk codes (e.g. "A17.0†") are found by their plain code."""
+    assert hierarchy.contains("A17.0")
+    assert hierarchy.definition("A17.0") == "Tuberculous meningitis (G01*)"
+    levels = [node["level"] for node in hierarchy.path("A17.0")]
+    assert levels == ["chapter", "block", "code", "code"]
+
+def test_row_of_points_into_table(hierarchy):
+    """row_of returns the original DataFrame row."""
+    database = pd.read_csv(ICD10_PATH)
+    assert database.iloc[hierarchy.row_of("I10")]["sub-code"] == "I10"
+    assert hierarchy.row_of("XYZ") is None
@@ -0,0 +1,94 @@
+# tests/test_icd10_shared_table.py
+"""
+Test cases for the shared-memory ICD-10 snapshot.
+Checks the mmap'd table against the pandas-loaded WHO 2019 table.
+"""
+import os
+from pathlib import Path
+import pandas as pd
+import pytest
+from src.tools.icd10_hierarchy import ICD10Hierarchy
+from src.tools.icd10_shared_table import SharedICD10Table, ensure_snapshot
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+
+@pytest.fixture(scope="module")
+def database():
+    return pd.read_csv(ICD10_PATH)
+
+@pytest.fixture(scope="module")
+def table(tmp_path_factory):
+    return SharedICD10Table.attach(str(ICD10_PATH), str(tmp_path_factory.mktemp("snapshots")))
+
+def test_rows_match_dataframe(table, database):
+    """Every column of every row round-trips, including embedded line breaks."""
+    assert len(table) == len(database)
+    for i in range(0, len(database), 37):
+        expected = database.iloc[i]
+        row = table.row(i)
+        for column in ("url", "chapter", "domain", "sub-code", "definition"):
+            assert row[column] == expected[column]
+
+def test_hierarchy_matches_dataframe(table, database):
+    """The stored hierarchy answers lookups exactly like the one built from pandas."""
+    built = ICD10Hierarchy.from_dataframe(database)
+    shared = ICD10Hierarchy.from_shared_table(table)
+    assert shared.chapters == built.chapters
+    assert shared.blocks == built.blocks
+    assert list(shared.codes) == built.codes
+    for code in ("E11", "J45.909", "A17.0", "E10-E14", "IV", "A45.1", "ZZ9"):
+        assert shared.children(code) == built.children(code)
+        assert shared.nearest_ancestor(code) == built.nearest_ancestor(code)
+        assert shared.path(code) == built.path(code)
+        assert shared.row_of(code) == built.row_of(code)
+
+def test_snapshot_is_built_once(tmp_path):
+    """A second attach reuses the snapshot; a changed CSV gets a new one."""
+    csv_path = tmp_path / "icd10.csv"
+    csv_path.write_bytes(ICD10_PATH.read_bytes())
+    first = ensure_snapshot(str(csv_path), str(tmp_path))
+    built_at = os.stat(first).st_mtime_ns
+    assert ensure_snapshot(str(csv_path), str(tmp_path)) == first
+    assert os.stat(first).st_mtime_ns == built_at
+
+    os.utime(csv_path, ns=(built_at, built_at + 10**9))
+    assert ensure_snapshot(str(csv_path), str(tmp_path)) != first
+
+def test_stale_snapshots_are_pruned(tmp_path):
+    """Rebuilding for an edited CSV removes the earlier snapshot and its lock."""
+    csv_path = tmp_path / "icd10.csv"
+    csv_path.write_bytes(ICD10_PATH.read_bytes())
+    first = ensure_snapshot(str(csv_path), str(tmp_path))
+    os.utime(csv_path, ns=(0, os.stat(first).st_mtime_ns + 10**9))
+    second = ensure_snapshot(str(csv_path), str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ["icd10.csv", os.path.basename(second), os.path.basename(second) + ".lock"])
+
+def test_corrupt_snapshot_is_rebuilt(tmp_path):
+    """A truncated or overwritten snapshot is rebuilt instead of failing to load."""
+    path = ensure_snapshot(str(ICD10_PATH), str(tmp_path))
+    size, rows = os.path.getsize(path), len(SharedICD10Table(path))
+    for damage in (lambda f: f.truncate(size // 2), lambda f: f.write(b"NOTASNAP")):
+        os.chmod(path, 0o644)
+        with open(path, "r+b") as f:
+            damage(f)
+        with pytest.raises(ValueError):
+            SharedICD10Table(path)
+        table = SharedICD10Table.attach(str(ICD10_PATH), str(tmp_path))
+        assert os.path.getsize(path) == size
+        assert len(table) == rows
+
+@pytest.mark.skipif(not hasattr(os, "geteuid"), reason="POSIX ownership")
+def test_foreign_snapshots_are_not_trusted(tmp_path):
+    """Snapshots reached through symlinks, and shared directories others can write to, are refused."""
+    path = ensure_snapshot(str(ICD10_PATH), str(tmp_path / "own"))
+    link = tmp_path / "link.snap"
+    link.symlink_to(path)
+    with pytest.raises(ValueError):
+        SharedICD10Table(str(link))
+
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        ensure_snapshot(str(ICD10_PATH), str(shared))
@@ -0,0 +1,39 @@
+# tests/test_logging_config.py
+"""
+Test cases for the production log format: records logged during a run, in
+its asyncio task or worker threads, carry the run's task_id.
+"""
+import asyncio
+import json
+import logging
+from logging_config import JsonFormatter, TaskIdFilter, log_task_id
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.addFilter(TaskIdFilter())
+        self.setFormatter(JsonFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+async def test_task_id_follows_the_run():
+    handler = Capture()
+    logger = logging.getLogger("test_logging_config")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    async def run():
+        logger.info("in task")
+        await asyncio.to_thread(logger.info, "in worker thread")
+
+    with log_task_id("t1"):
+        task = asyncio.create_task(run())
+    logger.info("outside")
+    await task
+    logger.removeHandler(handler)
+
+    assert [(line["message"], line.get("task_id")) for line in handler.lines] == [
+        ("outside", None), ("in task", "t1"), ("in worker thread", "t1"),
+    ]
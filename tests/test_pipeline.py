@@ -0,0 +1,131 @@
+# tests/test_pipeline.py
+"""
+Test cases for the speculative validation pipeline: incremental parsing of a
+streamed suggestion response and validation of each code as it arrives.
+"""
+import json
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from routing import Route
+from src.pipeline import SpeculativePipeline
+from src.tools.icd10_database_tool import ICD10DatabaseTool
+from src.tools.suggestion_stream import SuggestionStreamParser
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+
+RESPONSE = json.dumps({
+    "icd10_suggestions": [
+        {"code": "M54.5", "description": "Low back pain"},
+        {"code": "J45.909", "description": "Asthma {unspecified}, \"uncomplicated\""},
+        {"code": "ZZ9.9", "description": "Not a code"},
+    ],
+    "explanation": "Braces { and ] in text are ignored",
+    "who_database_url": "https://icd.who.int/browse10/2019/en",
+}, indent=2)
+
+class FakeSuggestionTool:
+    """Streams RESPONSE in small chunks, recording when each chunk was sent."""
+    def __init__(self, size: int = 5):
+        self.size = size
+        self.events = []
+
+    def stream_suggestions(self, argument, on_suggestion):
+        parser = SuggestionStreamParser()
+        for i in range(0, len(RESPONSE), self.size):
+            self.events.append("chunk")
+            for suggestion in parser.feed(RESPONSE[i:i + self.size]):
+                on_suggestion(suggestion)
+        return parser.document()
+
+class EscalatingSuggestionTool(FakeSuggestionTool):
+    """The cheap model streams RESPONSE (one invalid code); the escalation model answers M54.5 only."""
+    route = Route("suggestion", "azure/gpt-4o-mini", escalate_to="azure/gpt-4o")
+
+    def stream_suggestions(self, argument, on_suggestion, model=None, escalated=False):
+        if not escalated:
+            return super().stream_suggestions(argument, on_suggestion)
+        suggestion = {"code": "M54.5", "description": "Low back pain"}
+        on_suggestion(suggestion)
+        return {"icd10_suggestions": [suggestion]}
+
+class FakeReportingCrew:
+    task_callback = None
+
+    def kickoff(self, inputs):
+        self.inputs = inputs
+        return SimpleNamespace(raw='{"final_report": {}}')
+
+@pytest.mark.parametrize("size", [1, 7, len(RESPONSE)])
+def test_parser_yields_each_suggestion_once(size):
+    """Suggestions are emitted as they close, whatever the chunking; strings may contain braces."""
+    parser = SuggestionStreamParser()
+    found = []
+    for i in range(0, len(RESPONSE), size):
+        found.extend(parser.feed(RESPONSE[i:i + size]))
+    assert found == json.loads(RESPONSE)["icd10_suggestions"]
+    assert parser.document() == json.loads(RESPONSE)
+
+def test_parser_emits_before_stream_ends():
+    """The first suggestion is available once its closing brace has arrived."""
+    parser = SuggestionStreamParser()
+    end_of_first = RESPONSE.index("}") + 1
+    assert parser.feed(RESPONSE[:end_of_first - 1]) == []
+    assert parser.feed(RESPONSE[end_of_first - 1:end_of_first]) == [{"code": "M54.5", "description": "Low back pain"}]
+
+@pytest.mark.parametrize("size", [1, 7])
+def test_parser_keeps_suggestions_with_nested_arrays(size):
+    """Arrays of objects inside a suggestion do not end it early."""
+    response = json.dumps({"icd10_suggestions": [
+        {"code": "E11.9", "alternatives": [{"code": "E11"}, {"code": "E11.8", "notes": ["[x]"]}], "description": "T2DM"},
+        {"code": "M54.5", "description": "Low back pain"},
+    ]})
+    parser = SuggestionStreamParser()
+    found = []
+    for i in range(0, len(response), size):
+        found.extend(parser.feed(response[i:i + size]))
+    assert found == json.loads(response)["icd10_suggestions"]
+
+def test_pipeline_validates_while_streaming(tmp_path, monkeypatch):
+    """Codes are validated mid-stream and reach reporting as structured data."""
+    monkeypatch.setenv("ICD10_SHARED_DIR", str(tmp_path))
+    suggestion_tool = FakeSuggestionTool()
+    reporting_crew = FakeReportingCrew()
+    pipeline = SpeculativePipeline(reporting_crew, suggestion_tool, ICD10DatabaseTool(str(ICD10_PATH)))
+    steps = []
+    pipeline.task_callback = lambda step: (steps.append(step), suggestion_tool.events.append(step.name))
+
+    output = pipeline.kickoff({"diagnosis_text": "Low back pain, asthma"})
+
+    first_validated = suggestion_tool.events.index("validated_code")
+    assert "chunk" in suggestion_tool.events[first_validated:]
+    assert [step.name for step in steps] == ["validated_code"] * 3 + ["medical_diagnosis_task", "validation_task"]
+    assert [record["validation"]["valid"] for record in output.validated_codes] == [True, True, False]
+    assert output.validated_codes[1]["validation"]["code"] == "J45.9"
+    assert output.raw == '{"final_report": {}}'
+    assert reporting_crew.task_callback is pipeline.task_callback
+
+    handed_over = json.loads(reporting_crew.inputs["validated_codes"])
+    assert handed_over["icd10_suggestions"] == output.validated_codes
+    assert reporting_crew.inputs["diagnosis_text"] == "Low back pain, asthma"
+
+def test_escalation_marks_superseded_codes(tmp_path, monkeypatch):
+    """The cheap model's streamed codes are followed by a "superseded_codes" partial when the run escalates."""
+    monkeypatch.setenv("ICD10_SHARED_DIR", str(tmp_path))
+    pipeline = SpeculativePipeline(FakeReportingCrew(), EscalatingSuggestionTool(),
+                                   ICD10DatabaseTool(str(ICD10_PATH)))
+    steps = []
+    pipeline.task_callback = steps.append
+
+    output = pipeline.kickoff({"diagnosis_text": "Low back pain, asthma"})
+
+    names = [step.name for step in steps]
+    assert names == ["validated_code"] * 3 + ["superseded_codes", "validated_code",
+                                              "medical_diagnosis_task", "validation_task"]
+    marker = steps[3].json_dict
+    assert marker["superseded"] == 3
+    assert marker["codes"] == ["M54.5", "J45.909", "ZZ9.9"]
+    assert (marker["model"], marker["escalated_to"]) == ("azure/gpt-4o-mini", "azure/gpt-4o")
+    assert not any(step.json_dict.get("escalated") for step in steps[:3])
+    assert steps[4].json_dict["escalated"] is True
+    assert [record["suggested_code"] for record in output.validated_codes] == ["M54.5"]
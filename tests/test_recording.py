@@ -0,0 +1,83 @@
+# tests/test_recording.py
+"""
+Test cases for the record/replay store.
+Covers the on-disk format and replay matching; no LLM access needed.
+"""
+import litellm
+import pytest
+from src.recording import LLM, TOOL, CrewRecorder, Recording, ReplayMissError, request_key
+
+@pytest.fixture
+def recording():
+    rec = Recording(inputs={"diagnosis_text": "Asthma"})
+    rec.add(LLM, "azure/gpt-4o", request_key(LLM, "azure/gpt-4o", {"messages": ["a"]}), {"id": "first"}, 0.5)
+    rec.add(TOOL, "icd10_database_tool", request_key(TOOL, "icd10_database_tool", {"code": "J45.9"}),
+            {"valid": True}, 0.01)
+    rec.add(LLM, "azure/gpt-4o", request_key(LLM, "azure/gpt-4o", {"messages": ["b"]}), {"id": "second"}, 0.5)
+    rec.final_output = '{"final_report": {}}'
+    return rec
+
+def test_request_key_is_order_independent():
+    """Keys hash the canonical JSON, so dict ordering does not matter."""
+    assert request_key(LLM, "m", {"a": 1, "b": 2}) == request_key(LLM, "m", {"b": 2, "a": 1})
+    assert request_key(LLM, "m", {"a": 1}) != request_key(TOOL, "m", {"a": 1})
+
+def test_save_and_load_roundtrip(recording, tmp_path):
+    """Recordings survive the compressed on-disk format."""
+    path = tmp_path / "run.jsonl.gz"
+    recording.save(str(path))
+    loaded = Recording.load(str(path))
+
+    assert loaded.inputs == {"diagnosis_text": "Asthma"}
+    assert loaded.final_output == recording.final_output
+    assert [e["response"] for e in loaded.entries] == [{"id": "first"}, {"valid": True}, {"id": "second"}]
+
+def test_serve_matches_by_key(recording):
+    """Exact request matches are served regardless of call order."""
+    recording.rewind()
+    key_b = request_key(LLM, "azure/gpt-4o", {"messages": ["b"]})
+    assert recording.serve(LLM, "azure/gpt-4o", key_b) == {"id": "second"}
+    assert recording.stats["fallbacks"] == 0
+
+def test_serve_falls_back_to_call_order(recording):
+    """Drifted prompts get the next unused response for that model."""
+    recording.rewind()
+    assert recording.serve(LLM, "azure/gpt-4o", "unknown") == {"id": "first"}
+    key_a = request_key(LLM, "azure/gpt-4o", {"messages": ["a"]})
+    # "first" was consumed by the fallback, so its exact key is exhausted
+    assert recording.serve(LLM, "azure/gpt-4o", key_a) == {"id": "second"}
+    assert recording.stats["fallbacks"] == 2
+
+def test_strict_replay_raises_on_miss(recording):
+    """Strict replay refuses unmatched calls."""
+    recording.rewind()
+    with pytest.raises(ReplayMissError):
+        recording.serve(LLM, "azure/gpt-4o", "unknown", strict=True)
+
+def test_rewind_allows_repeated_replays(recording):
+    """Each replay consumes responses; rewind restores them."""
+    key = request_key(TOOL, "icd10_database_tool", {"code": "J45.9"})
+    recording.rewind()
+    recording.serve(TOOL, "icd10_database_tool", key)
+    with pytest.raises(ReplayMissError):
+        recording.serve(TOOL, "icd10_database_tool", key)
+    recording.rewind()
+    assert recording.serve(TOOL, "icd10_database_tool", key) == {"valid": True}
+
+def test_streamed_completion_roundtrip(tmp_path):
+    """stream=True completions (pipeline mode) are recorded chunk by chunk and replayed as a stream."""
+    parts = ['{"codes": ', '["M54.5"]}']
+    chunks = [litellm.ModelResponse(stream=True, choices=[{"index": 0, "delta": {"content": part}}])
+              for part in parts]
+    request = {"model": "azure/gpt-4o-mini", "messages": [{"role": "user", "content": "Back pain"}], "stream": True}
+
+    recording = Recording(inputs={"diagnosis_text": "Back pain"}, mode="pipeline")
+    completion = CrewRecorder(recording, mode="record")._wrap_completion(lambda **kwargs: iter(chunks))
+    assert [chunk.choices[0].delta.content for chunk in completion(**request)] == parts
+
+    path = tmp_path / "run.jsonl.gz"
+    recording.save(str(path))
+    loaded = Recording.load(str(path))
+    assert loaded.mode == "pipeline"
+    replayed = CrewRecorder(loaded, mode="replay", strict=True)._wrap_completion(None)(**request)
+    assert [chunk.get("choices")[0].get("delta").get("content") for chunk in replayed] == parts
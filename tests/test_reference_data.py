@@ -0,0 +1,101 @@
+# tests/test_reference_data.py
+"""
+Test cases for versioned, hot-swappable ICD-10 reference data.
+Uses copies of the bundled WHO 2019 table as fake newer releases.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from src.tools.reference_data import ReferenceDataRegistry, ReferenceDataset, version_key
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+HYPERTENSION = "Essential (primary) hypertension"
+
+def write_release(directory: Path, version: str, hypertension: str = HYPERTENSION) -> Path:
+    path = directory / f"icd10_{version}.csv"
+    path.write_text(ICD10_PATH.read_text(encoding="utf-8").replace(HYPERTENSION, hypertension), encoding="utf-8")
+    return path
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ICD10_SHARED_DIR", str(tmp_path / "snapshots"))
+    directory = tmp_path / "data"
+    directory.mkdir()
+    write_release(directory, "2019")
+    return directory
+
+def test_version_ordering():
+    """Versions sort naturally, not lexically."""
+    assert sorted(["2019.10", "2019.9", "2024", "2019"], key=version_key) == ["2019", "2019.9", "2019.10", "2024"]
+
+def test_serves_newest_and_pins(data_dir):
+    """The newest version is active; a pinned version is served inside pin()."""
+    write_release(data_dir, "2024", "Essential hypertension (2024)")
+    registry = ReferenceDataRegistry(str(data_dir))
+    assert registry.active_version == "2024"
+    assert registry.get().hierarchy.definition("I10") == "Essential hypertension (2024)"
+
+    with registry.pin("2019") as dataset:
+        assert dataset.version == "2019"
+        assert registry.get().hierarchy.definition("I10") == HYPERTENSION
+    assert registry.get().version == "2024"
+
+    with pytest.raises(KeyError):
+        registry.get("1999")
+
+def test_refresh_swaps_in_background(data_dir):
+    """A new release is loaded off-thread and swapped in; holders of the old dataset are unaffected."""
+    registry = ReferenceDataRegistry(str(data_dir))
+    in_flight = registry.get()
+
+    write_release(data_dir, "2024", "Essential hypertension (2024)")
+    registry.refresh().join(timeout=30)
+
+    assert registry.active_version == "2024"
+    assert in_flight.hierarchy.definition("I10") == HYPERTENSION
+    assert registry.refresh() is None
+
+def test_fixed_version_is_not_replaced(data_dir):
+    """With an explicit version, newer drops are loadable but not activated by refresh."""
+    registry = ReferenceDataRegistry(str(data_dir), active_version="2019")
+    write_release(data_dir, "2024")
+    assert registry.refresh() is None
+    assert registry.active_version == "2019"
+    assert "2024" in registry.describe()["available"]
+
+def test_reload_changes_data_key(data_dir):
+    """Editing a table gives results validated against it a new cache key, before and after the reload."""
+    registry = ReferenceDataRegistry(str(data_dir))
+    before = registry.data_key()
+    assert before.startswith("2019@") and before == registry.data_key("2019")
+
+    path = write_release(data_dir, "2019", "Essential hypertension (corrected)")
+    os.utime(path, ns=(0, registry.get().signature[1] + 10 ** 9))
+    on_disk = registry.data_key("2019")
+    assert on_disk != before
+    assert registry.data_key() == before  # still serving the old table until it is reloaded
+
+    registry.refresh().join(timeout=30)
+    assert registry.data_key() == on_disk == registry.get().data_key
+    with registry.pin("2019") as dataset:
+        assert dataset.data_key == on_disk
+
+def test_concurrent_loads_build_once(data_dir, monkeypatch):
+    """Runs pinning the same unloaded version wait for one load instead of each rebuilding it."""
+    write_release(data_dir, "2024", "Essential hypertension (2024)")
+    registry = ReferenceDataRegistry(str(data_dir), active_version="2019")
+    builds = []
+    build = ReferenceDataset.load
+
+    def counting_load(version, path):
+        builds.append(version)
+        return build(version, path)
+
+    monkeypatch.setattr(ReferenceDataset, "load", staticmethod(counting_load))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        datasets = list(pool.map(registry.load, ["2024"] * 4))
+    assert builds == ["2024"]
+    assert all(dataset is datasets[0] for dataset in datasets)
+    with registry.pin(datasets[0]) as dataset:
+        assert registry.get() is dataset
@@ -0,0 +1,98 @@
+# tests/test_routing.py
+"""
+Test cases for adaptive model routing: cheap model first, escalation on
+low-confidence ICD-10 validation or failure, and the routing metrics.
+LLM calls are replaced by fakes that answer per model.
+"""
+import json
+from pathlib import Path
+import pytest
+import routing
+from routing import Route, RoutedLLM, RunRouting
+from src.tools.gpt4_suggestion_tool import Gpt4SuggestionTool
+from src.tools.icd10_database_tool import ICD10DatabaseTool
+
+ICD10_PATH = Path(__file__).parent.parent / "src" / "icd10_2019.csv"
+ROUTE = Route("gpt4_suggestion_tool", "azure/gpt-4o-mini", "azure/gpt-4o")
+
+GOOD = {"icd10_suggestions": [{"code": "M54.5", "description": "Low back pain"}]}
+POOR = {"icd10_suggestions": [{"code": "M54.5", "description": "Low back pain"},
+                              {"code": "M54.99", "description": "Lumbar strain"}]}
+
+@pytest.fixture(scope="module")
+def database_tool():
+    return ICD10DatabaseTool(str(ICD10_PATH))
+
+@pytest.fixture
+def suggestion_tool(monkeypatch, database_tool):
+    """Suggestion tool whose completions return `answers[model]` and are recorded."""
+    answers, models = {}, []
+
+    def fake_completion(self, argument, model="azure/gpt-4o", **kwargs):
+        models.append(model)
+        if isinstance(answers[model], Exception):
+            raise answers[model]
+        content = json.dumps(answers[model])
+        return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 100, "completion_tokens": 50}}
+
+    monkeypatch.setattr(Gpt4SuggestionTool, "_completion", fake_completion)
+    monkeypatch.setattr(routing, "routes", {ROUTE.name: ROUTE})
+    tool = Gpt4SuggestionTool(validator=database_tool.check)
+    return tool, answers, models
+
+def test_low_confidence():
+    """Invalid codes and poorly matching descriptions are low confidence."""
+    assert ROUTE.is_low_confidence({"valid": False})
+    assert ROUTE.is_low_confidence({"valid": True, "similarity_score": 0.3})
+    assert not ROUTE.is_low_confidence({"valid": True, "similarity_score": 0.9})
+    assert not ROUTE.is_low_confidence({"valid": True})
+    assert ROUTE.needs_escalation([])
+    assert not Route("x", "azure/gpt-4o-mini").needs_escalation([{"valid": False}])
+
+def test_confident_suggestions_stay_on_cheap_model(suggestion_tool):
+    tool, answers, models = suggestion_tool
+    answers.update({"azure/gpt-4o-mini": GOOD, "azure/gpt-4o": GOOD})
+    state = RunRouting("t1")
+    with routing.bind(state):
+        result = json.loads(tool._run("Low back pain"))
+    assert result == GOOD
+    assert models == ["azure/gpt-4o-mini"]
+    assert state.summary()["escalated"] is False
+
+@pytest.mark.parametrize("cheap", [POOR, TimeoutError("deployment not found")])
+def test_low_confidence_or_failure_escalates(suggestion_tool, cheap):
+    """A low-confidence code or a failed cheap call is answered by the escalation model."""
+    tool, answers, models = suggestion_tool
+    answers.update({"azure/gpt-4o-mini": cheap, "azure/gpt-4o": GOOD})
+    state = RunRouting("t2")
+    with routing.bind(state):
+        result = json.loads(tool._run("Low back pain"))
+    assert result == GOOD
+    assert models == ["azure/gpt-4o-mini", "azure/gpt-4o"]
+    assert list(state.escalations) == [ROUTE.name]
+    # Checking the cheap suggestions is not a validation of the run
+    assert state.validations == []
+
+def test_agent_llm_escalates_after_failed_validation(monkeypatch, database_tool):
+    """A routed agent uses the cheap model until the run's validation finds a bad code."""
+    models = []
+    monkeypatch.setattr(routing.LLM, "call", lambda self, messages, callbacks=[]: models.append(self.model) or "ok")
+    llm = RoutedLLM(Route("reporting_agent", "azure/gpt-4o-mini", "azure/gpt-4o"))
+    messages = [{"role": "user", "content": "report"}]
+    state = RunRouting("t3")
+    with routing.bind(state):
+        llm.call(messages)
+        database_tool._run("M54.5", "Low back pain")
+        llm.call(messages)
+        database_tool._run("Q99.99", "Not a code")
+        llm.call(messages)
+    assert models == ["azure/gpt-4o-mini", "azure/gpt-4o-mini", "azure/gpt-4o"]
+    assert [call.escalated for call in state.calls] == [False, False, True]
+
+    metrics = routing.RoutingMetrics()
+    metrics.record(state)
+    metrics.record(RunRouting("t4"))
+    snapshot = metrics.snapshot()
+    assert snapshot["escalation_rate"] == 0.5
+    assert snapshot["calls_by_model"] == {"azure/gpt-4o-mini": 2, "azure/gpt-4o": 1}
+    assert snapshot["cost_usd"]["per_request"] > 0
@@ -0,0 +1,156 @@
+# tests/test_semantic_cache.py
+"""
+Test cases for the semantic cache: near-duplicate diagnosis texts hit,
+meaning-changing differences never do, and the cache is bounded and persistent.
+"""
+import json
+import os
+from pathlib import Path
+import pytest
+from src import api
+from src.api import RunInput, get_status, run_crew_endpoint
+from src.semantic_cache import SemanticCache, extract_codes
+from src.tools.reference_data import ReferenceDataRegistry
+
+VERSION = "2019"
+
+def report(*codes: str) -> str:
+    return json.dumps({"final_report": {"diagnoses_report": [
+        {"diagnosis": "x", "codes": [{"code": code, "description": "x"} for code in codes]}
+    ]}})
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache()
+    cache.store("low back pain", VERSION, report("M54.5"))
+    cache.store("Type 2 diabetes mellitus", VERSION, report("E11.9"))
+    cache.store("Hypertension", VERSION, report("I10"))
+    cache.store("Lower Back Pain, Osteoarthritis, Fibromyalgia", VERSION, report("M54.5", "M19.90", "M79.7"))
+    cache.store("osteoarthritis of hip", VERSION, report("M16.9"))
+    cache.store("type 2 diabetes with nephropathy", VERSION, report("E11.21"))
+    return cache
+
+def test_extract_codes():
+    assert extract_codes("Final answer: " + report("m54.5", "M54.5", "J45.9")) == ["M54.5", "J45.9"]
+    assert extract_codes('{"report": "ok"}') == []
+    assert extract_codes("not json") == []
+
+@pytest.mark.parametrize("text, codes", [
+    ("LOW back-pain.", ["M54.5"]),
+    ("fibromyalgia; osteoarthritis,\nlower back pain", ["M54.5", "M19.90", "M79.7"]),
+    ("Lower Back Pain", ["M54.5"]),
+    ("low back pains", ["M54.5"]),
+    ("type II diabetes mellitus", ["E11.9"]),
+    ("HTN", ["I10"]),
+    ("Hip osteoarthritis", ["M16.9"]),
+])
+def test_same_diagnoses_hit(cache, text, codes):
+    """Case, punctuation, order, plurals, stopwords and listed abbreviations don't matter."""
+    hit = cache.lookup(text, VERSION)
+    assert hit is not None and hit.entry.codes == codes
+
+@pytest.mark.parametrize("text", [
+    "Type 1 diabetes mellitus",
+    "Hypotension",
+    "type I diabetes mellitus",
+    "lumbago",
+    "Migraine",
+    "upper back pain",
+    "osteoarthritis of hips and knees",
+    "osteoarthritis of knee",
+    "type 2 diabetes with neuropathy",
+    "Lower Back Pain, Osteoarthritis",
+    "Lower Back Pain, Osteoarthritis, Fibromyalgia, Depression",
+])
+def test_different_diagnoses_miss(cache, text):
+    """Look-alikes that differ in a diagnosis, a number, a prefix, a word or the list of diagnoses never hit."""
+    assert cache.lookup(text, VERSION) is None
+
+def test_results_are_per_reference_version(cache):
+    assert cache.lookup("low back pain", "2020") is None
+    assert not cache.store("Fever", VERSION, '{"report": "no codes"}')
+
+def test_least_recently_used_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.store("Asthma", VERSION, report("J45.9"))
+    cache.store("Migraine", VERSION, report("G43.9"))
+    assert cache.lookup("asthma", VERSION)
+    cache.store("Influenza", VERSION, report("J11.1"))
+    assert len(cache) == 2
+    assert cache.lookup("Migraine", VERSION) is None
+    assert cache.lookup("Asthma", VERSION) and cache.lookup("Influenza", VERSION)
+    assert cache.report()["evictions"] == 1
+
+def test_persisted_and_compacted(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    cache = SemanticCache(str(path), max_entries=2)
+    for i, text in enumerate(["Asthma", "Migraine", "Influenza", "Asthma", "Gout"]):
+        cache.store(text, VERSION, report(f"X0{i}"))
+    assert len(path.read_text().splitlines()) <= 4
+
+    reloaded = SemanticCache(str(path), max_entries=2)
+    assert len(reloaded) == 2
+    assert reloaded.lookup("asthma", VERSION).entry.codes == ["X03"]
+    assert reloaded.lookup("gout", VERSION).entry.codes == ["X04"]
+    reloaded.clear()
+    assert not path.exists() and len(reloaded) == 0
+
+def test_report_calibrates_code_agreement():
+    cache = SemanticCache()
+    cache.store("low back pain", VERSION, report("M54.5"))
+    cache.store("Type 2 diabetes mellitus", VERSION, report("E11.9"))
+    cache.store("Hypertension", VERSION, report("I10"))
+    cache.lookup("Low Back Pain.", VERSION)
+    cache.lookup("Type 1 diabetes mellitus", VERSION)
+    cache.store("Low back pain, chronic", VERSION, report("M54.5", "G89.29"))
+
+    summary = cache.report()
+    assert summary["entries"] == 4
+    assert (summary["lookups"], summary["hits"], summary["rejected"]) == (2, 1, 1)
+    assert summary["hit_rate"] == 0.5
+    assert summary["hit_similarity"]["min"] >= cache.threshold
+    agreements = [bucket["mean_code_agreement"] for bucket in summary["calibration"].values()]
+    assert 0.5 in agreements
+
+async def test_cached_result_skips_crew(monkeypatch):
+    """A hit completes the task immediately, without a crew."""
+    cache = SemanticCache()
+    cache.store("low back pain", api.tools.reference_data.data_key(), report("M54.5"))
+    monkeypatch.setattr(api, "semantic_cache", cache)
+    monkeypatch.setattr(api, "AstackcrewCrew", lambda: pytest.fail("crew started for a cached diagnosis"))
+
+    task_id = (await run_crew_endpoint(RunInput(diagnosis_text="Low back pain.")))["task_id"]
+    status = await get_status(task_id)
+    assert status.status == "completed"
+    assert status.result == report("M54.5")
+    assert status.partials[0].subtask_name == "semantic_cache"
+    assert status.partials[0].details["codes"] == ["M54.5"]
+
+async def test_reloaded_table_invalidates_cached_results(monkeypatch, tmp_path):
+    """Results validated against a table are not served once an edited copy is reloaded under its version."""
+    monkeypatch.setenv("ICD10_SHARED_DIR", str(tmp_path / "snapshots"))
+    table = tmp_path / "icd10_2019.csv"
+    table.write_bytes((Path(api.__file__).parent / "icd10_2019.csv").read_bytes())
+    registry = ReferenceDataRegistry.from_path(str(table))
+    cache = SemanticCache()
+    cache.store("low back pain", registry.data_key(), report("M54.5"))
+    monkeypatch.setattr(api.tools, "reference_data", registry)
+    monkeypatch.setattr(api, "semantic_cache", cache)
+    monkeypatch.setattr(api, "checkpoints", None)
+    monkeypatch.setattr(api, "inflight", {})
+    monkeypatch.setattr(api, "AstackcrewCrew", lambda: pytest.fail("crew started for a cached diagnosis"))
+    served = (await run_crew_endpoint(RunInput(diagnosis_text="Low back pain")))["task_id"]
+    assert (await get_status(served)).status == "completed"
+
+    os.utime(table, ns=(0, registry.get().signature[1] + 10 ** 9))
+    registry.refresh().join(timeout=30)
+    started = []
+
+    def crew():
+        started.append(True)
+        raise RuntimeError("no crew in this test")
+    monkeypatch.setattr(api, "AstackcrewCrew", crew)
+    task_id = (await run_crew_endpoint(RunInput(diagnosis_text="Low back pain")))["task_id"]
+    await api.runs[task_id].task
+    assert started == [True]
+    assert (await get_status(task_id)).status == "failed"
@@ -0,0 +1,73 @@
+# tests/test_task_store.py
+"""
+Test cases for the compact task records and pre-rendered /status responses:
+the rendered body matches the TaskStatus model and is only rebuilt after a change.
+"""
+import json
+import pytest
+import task_store
+from src import api
+from src.api import PartialResult, TaskStatus, get_status_endpoint
+from task_store import PartialRecord, StatusResponses, TaskRecord
+
+OUTPUT = '{"icd10_suggestions": [{"code": "M54.5", "description": "Low back pain \\u00e9"}]}'
+
+def make_record(output: str = OUTPUT) -> TaskRecord:
+    record = TaskRecord(progress_summary="0/3 subtasks completed")
+    record.add_partial(PartialRecord("medical_diagnosis_task", output, {"codes": ["M54.5"]}, "2024-01-01T00:00:00"))
+    record.add_partial(PartialRecord("validation_task", "ok", None, "2024-01-01T00:00:01"))
+    return record
+
+@pytest.mark.parametrize("threshold", [10 ** 6, 16])
+def test_render_matches_task_status(monkeypatch, threshold):
+    """Bodies equal TaskStatus's JSON whether or not outputs are compressed."""
+    monkeypatch.setattr(task_store, "COMPRESS_THRESHOLD", threshold)
+    record = make_record()
+    record.update({"status": "completed", "result": "report " * 20})
+
+    expected = TaskStatus(
+        status="completed", result="report " * 20, error=None, progress_summary="0/3 subtasks completed",
+        partials=[PartialResult(subtask_name=p.subtask_name, output=p.output, details=p.details,
+                                timestamp=p.timestamp) for p in record.partials],
+    )
+    assert json.loads(record.render()) == json.loads(expected.model_dump_json())
+    assert record.partials[0].output == OUTPUT
+    assert isinstance(record.partials[0]._json, tuple) == (threshold == 16)
+
+def test_response_cached_until_task_changes():
+    record = make_record()
+    responses = StatusResponses(max_bytes=len(record.render()) + 10)
+    first = responses.get("a", record)
+    assert responses.get("a", record) is first
+    record.update({"progress_summary": "1/3 subtasks completed"})
+    assert json.loads(responses.get("a", record))["progress_summary"] == "1/3 subtasks completed"
+    responses.get("b", make_record())
+    responses.get("a", record)
+    assert (responses.hits, responses.misses) == (1, 4)
+    assert responses.size == len(record.render())
+
+def test_response_cache_bounded_by_bytes():
+    """Least recently polled bodies are dropped to stay under max_bytes; oversized ones are never kept."""
+    records = {task_id: make_record() for task_id in "abc"}
+    body_size = len(records["a"].render())
+    responses = StatusResponses(max_bytes=2 * body_size)
+    for task_id in "abac":
+        responses.get(task_id, records[task_id])
+    assert responses.size == 2 * body_size
+    responses.get("a", records["a"])
+    responses.get("b", records["b"])
+    assert (responses.hits, responses.misses) == (2, 4)
+
+    large = make_record("x" * 3 * body_size)
+    responses.get("d", large)
+    assert responses.size <= 2 * body_size
+    assert responses.get("d", large) == large.render()
+    assert responses.hits == 2
+
+async def test_status_endpoint_serves_rendered_body(monkeypatch):
+    monkeypatch.setattr(api, "tasks", {"t1": make_record()})
+    response = await get_status_endpoint("t1")
+    assert response.media_type == "application/json"
+    body = json.loads(response.body)
+    assert body["status"] == "running"
+    assert [p["subtask_name"] for p in body["partials"]] == ["medical_diagnosis_task", "validation_task"]
@@ -0,0 +1,101 @@
+# tests/test_telemetry.py
+"""
+Test cases for the non-blocking telemetry pipeline.
+Uses the in-memory stub sink so no AgentOps connection is needed.
+"""
+import time
+import pytest
+from src.telemetry import DROP_OLDEST, InMemorySink, TelemetryPipeline
+
+@pytest.fixture
+def sink():
+    return InMemorySink()
+
+def test_events_are_delivered_in_batches(sink):
+    """Queued events are flushed by the worker in batches of at most batch_size."""
+    pipeline = TelemetryPipeline(sink, batch_size=4, flush_interval=0.05)
+    for i in range(10):
+        assert pipeline.emit("subtask_complete", params={"i": i})
+    assert pipeline.flush(timeout=2)
+    pipeline.stop()
+
+    assert [e.params["i"] for e in sink.events] == list(range(10))
+    assert all(len(batch) <= 4 for batch in sink.batches)
+    assert pipeline.stats()["sent"] == 10
+
+def test_emit_does_not_block_on_slow_sink():
+    """A slow backend must not add latency to the producer."""
+    slow_sink = InMemorySink(delay=0.5)
+    pipeline = TelemetryPipeline(slow_sink, batch_size=1, flush_interval=0.01)
+    start = time.perf_counter()
+    for _ in range(5):
+        pipeline.emit("task_completion")
+    assert time.perf_counter() - start < 0.1
+    pipeline.stop(timeout=0.01)
+
+def test_sampling_rate_zero_drops_everything(sink):
+    """With sample_rate=0 nothing is queued unless the caller forces sampling."""
+    pipeline = TelemetryPipeline(sink, sample_rate=0.0, flush_interval=0.01)
+    assert not pipeline.should_sample()
+    assert not pipeline.emit("subtask_complete")
+    assert pipeline.emit("subtask_complete", sampled=True)
+    pipeline.stop()
+
+    assert len(sink.events) == 1
+    assert pipeline.stats()["sampled_out"] == 1
+
+def test_full_queue_drops_newest():
+    """The default policy discards the incoming event when the queue is full."""
+    blocked_sink = InMemorySink(delay=0.3)
+    pipeline = TelemetryPipeline(blocked_sink, max_queue_size=2, batch_size=1, flush_interval=0.01)
+    results = [pipeline.emit("e", params={"i": i}) for i in range(10)]
+    assert not all(results)
+    assert pipeline.stats()["dropped"] > 0
+    pipeline.stop(timeout=0.01)
+
+def test_drops_are_not_logged_per_event(caplog):
+    """A saturated queue warns once per interval, not once per dropped event."""
+    blocked_sink = InMemorySink(delay=0.3)
+    pipeline = TelemetryPipeline(blocked_sink, max_queue_size=1, batch_size=1, flush_interval=0.01)
+    with caplog.at_level("WARNING", logger="src.telemetry"):
+        for i in range(20):
+            pipeline.emit("e", params={"i": i})
+    pipeline.stop(timeout=0.01)
+    assert pipeline.stats()["dropped"] > 1
+    assert len([r for r in caplog.records if "queue full" in r.getMessage()]) == 1
+
+def test_full_queue_drops_oldest():
+    """drop_oldest keeps the most recent events."""
+    sink = InMemorySink()
+    pipeline = TelemetryPipeline(sink, max_queue_size=3, batch_size=10, flush_interval=0.2,
+                                 drop_policy=DROP_OLDEST)
+    for i in range(10):
+        assert pipeline.emit("e", params={"i": i})
+    pipeline.stop()
+
+    delivered = [e.params["i"] for e in sink.events]
+    assert delivered[-1] == 9
+    assert pipeline.stats()["dropped"] > 0
+
+def test_sink_errors_are_contained():
+    """Failures in the sink are counted, never raised to the producer."""
+    pipeline = TelemetryPipeline(InMemorySink(fail=True), flush_interval=0.01)
+    pipeline.emit("e")
+    assert pipeline.flush(timeout=2)
+    pipeline.stop()
+    assert pipeline.stats()["errors"] == 1
+
+def test_invalid_configuration():
+    """Out-of-range sampling rates and unknown drop policies are rejected."""
+    with pytest.raises(ValueError):
+        TelemetryPipeline(InMemorySink(), sample_rate=1.5)
+    with pytest.raises(ValueError):
+        TelemetryPipeline(InMemorySink(), drop_policy="block")
+
+def test_sink_from_env(monkeypatch):
+    """TELEMETRY_SINK=memory keeps events in process; unknown sinks are rejected."""
+    monkeypatch.setenv("TELEMETRY_SINK", "memory")
+    assert isinstance(TelemetryPipeline.from_env().sink, InMemorySink)
+    monkeypatch.setenv("TELEMETRY_SINK", "kafka")
+    with pytest.raises(ValueError):
+        TelemetryPipeline.from_env()